@@ -15,8 +15,6 @@ if os.path.exists('/app'):
 else:
     USERS_FILE = Path(__file__).parent.parent / 'data' / 'users.json'
 
-USERS_FILE.parent.mkdir(exist_ok=True)
-
 class AuthManager:
     """Менеджер аутентификации с хранением в JSON"""
     
@@ -1,42 +1,188 @@
+import asyncio
 import io
-import zipfile
-from typing import List
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 from fastapi import UploadFile
-from api.services.task_service import TaskService
-from .processors.async_white_processor import AsyncWhiteProcessor
-from .processors.async_interior_processor import AsyncInteriorProcessor
+from core.config import config
+from api.services.task_service import AsyncTaskService
+from api.services.task_events import task_event_bus
+from api.services.webhook_service import WebhookService
+from api.repositories import AsyncWebhookDeliveryRepository
 from .logging import CustomLogger
+from . import metrics
+from . import deadline
+
+
+# Канал уведомлений об отмене задач (payload — ID задачи)
+CANCEL_CHANNEL = "task_cancellations"
+
+# Обработка файлов задач, выполняемых этим воркером: task_id -> asyncio.Task
+_running: Dict[str, asyncio.Task] = {}
+
+
+class TaskOwnershipLost(Exception):
+    """Задачу подхватил другой воркер (отметки этого воркера устарели) или она отменена"""
+
+
+def worker_id() -> str:
+    """Идентификатор воркера (вычисляется при вызове: после fork у воркера свой PID)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _seconds_until(deadline_at: Optional[datetime]) -> Optional[float]:
+    """Остаток времени до дедлайна задачи (None — дедлайна нет)"""
+    if deadline_at is None:
+        return None
+    if deadline_at.tzinfo is None:
+        deadline_at = deadline_at.replace(tzinfo=timezone.utc)
+    return (deadline_at - datetime.now(timezone.utc)).total_seconds()
+
+
+def cancel_running(task_id: Optional[str]) -> bool:
+    """
+    Отменить обработку задачи, если она выполняется в этом воркере: прерываются
+    запросы к внешним сервисам, освобождаются слоты семафоров, оставшиеся файлы
+    не обрабатываются. Обработчик уведомлений канала task_cancellations.
+    """
+    job = _running.get(task_id) if task_id else None
+    if job is None or job.done():
+        return False
+    job.cancel()
+    return True
 
 
 class BackgroundProcessor:
-    """Обработчик фоновых задач"""
+    """
+    Обработчик фоновых задач.
+    
+    Итог каждого файла сохраняется в task_files по мере обработки, а воркер
+    отмечается в задаче (heartbeat). Задачу упавшего воркера подхватывает другой
+    (resume_task) и обрабатывает только незавершённые файлы; retry-failed так же
+    повторяет только файлы с ошибкой. Итоговый архив собирается из сохранённых
+    результатов всех файлов.
+    
+    Дедлайн задачи (deadline_at) ограничивает обработку файлов и запросы
+    к внешним сервисам; отправка webhook под него не попадает.
+    """
     
-    def __init__(self, task_service: TaskService):
+    def __init__(self, task_service: AsyncTaskService):
         self.task_service = task_service
     
-    async def process_task(self, task_id: str, files: List[UploadFile], white_bg: bool):
-        """Обрабатывает задачу в фоновом режиме"""
-        task = self.task_service.get_task(task_id)
+    async def process_task(self, task_id: str, files: List[UploadFile], white_bg: bool, callback_url: Optional[str] = None, reuse_assets: bool = False, scenes: int = 1):
+        """
+        Обрабатывает задачу в фоновом режиме.
+        reuse_assets — брать готовые изображения из библиотеки по артикулу,
+        scenes — сколько сцен генерировать для каждого файла интерьера.
+        """
+        processing_type = "white" if white_bg else "interior"
+        metrics.TASKS_QUEUED.labels(processing_type).dec()
+        
+        task = await self.task_service.get_task(task_id)
+        if not task or task["status"] == "cancelled":
+            return
+        
+        await self._run(
+            task_id, list(enumerate(files)), task["total_files"], white_bg, callback_url, reuse_assets, scenes,
+            task["deadline_at"]
+        )
+    
+    async def resume_task(self, task_id: str, queued: bool = False):
+        """
+        Продолжить задачу с необработанных файлов: после падения воркера
+        или по запросу retry-failed (queued — задача учтена в photo_tasks_queued).
+        """
+        task = await self.task_service.get_task(task_id)
         if not task:
             return
         
+        white_bg = task["white_bg"]
+        processing_type = "white" if white_bg else "interior"
+        if queued:
+            metrics.TASKS_QUEUED.labels(processing_type).dec()
+        if task["status"] == "cancelled":
+            return
+        
+        owner = worker_id()
+        if task["resume_count"] > config.app.task_max_resumes:
+            await self._fail(
+                task_id, owner, white_bg, task["callback_url"], task["total_files"], CustomLogger(processing_type),
+                f"Ошибка фоновой обработки: задача прерывалась {task['resume_count']} раз, "
+                f"повторите необработанные файлы через retry-failed"
+            )
+            return
+        if not await self.task_service.has_files(task_id):
+            await self._fail(
+                task_id, owner, white_bg, task["callback_url"], task["total_files"], CustomLogger(processing_type),
+                "Ошибка фоновой обработки: входные файлы задачи не сохранены, отправьте файлы повторно"
+            )
+            return
+        
+        files = await self.task_service.get_pending_files(task_id)
+        await self._run(
+            task_id, files, task["total_files"], white_bg, task["callback_url"], task["reuse_assets"], task["scenes"],
+            task["deadline_at"]
+        )
+    
+    async def _run(
+        self,
+        task_id: str,
+        files: List[Tuple[int, UploadFile]],
+        total_files: int,
+        white_bg: bool,
+        callback_url: Optional[str],
+        reuse_assets: bool,
+        scenes: int,
+        deadline_at: Optional[datetime] = None
+    ):
+        """Обработать файлы задачи (индекс в задаче, файл) и собрать результат"""
         processing_type = "white" if white_bg else "interior"
         logger = CustomLogger(processing_type)
-        self.task_service.update_task_status(task_id, "processing")
+        owner = worker_id()
+        done_before = total_files - len(files)
+        
+        running = _running.get(task_id)
+        if running is not None and not running.done():
+            logger.warning(f"Задача {task_id} уже обрабатывается этим воркером")
+            return
+        
+        metrics.TASKS_IN_PROGRESS.labels(processing_type).inc()
+        job = heartbeat = None
+        started = time.perf_counter()
+        # Длительность фиксируется до отправки webhook, чтобы не учитывать доставку
+        status, duration = "failed", None
         
         try:
             logger.info(f"Начало фоновой обработки задачи {task_id}")
-            logger.info(f"Файлов для обработки: {len(files)}")
+            logger.info(f"Файлов для обработки: {len(files)} из {total_files}")
             
+            # Процессоры тянут openai, aiohttp и Pillow — импортируются при первой задаче
+            # (или заранее: прогрев после запуска воркера, режим SERVER_PRELOAD)
             if white_bg:
-                processor = AsyncWhiteProcessor()
+                from .processors.async_white_processor import AsyncWhiteProcessor
+                processor = AsyncWhiteProcessor(reuse_assets=reuse_assets)
             else:
-                processor = AsyncInteriorProcessor()
+                from .processors.async_interior_processor import AsyncInteriorProcessor
+                processor = AsyncInteriorProcessor(reuse_assets=reuse_assets, scenes=scenes)
             
-            zip_buffer = await self._process_with_progress(processor, files, task_id, logger)
+            # Обработка файлов — отдельная asyncio-задача, чтобы её можно было отменить
+            # (cancel_running), не прерывая запрос, в котором выполняется фоновая задача.
+            # Она регистрируется до первого обращения к БД: отмена, пришедшая до захвата
+            # задачи, не теряется. Задача копирует контекст с дедлайном задачи, а не запроса
+            with deadline.budget(_seconds_until(deadline_at), inherit=False):
+                job = asyncio.create_task(
+                    self._process_with_progress(processor, files, done_before, total_files, task_id, owner, logger)
+                )
+                _running[task_id] = job
+                heartbeat = asyncio.create_task(self._heartbeat(task_id, owner, logger, job))
+            zip_buffer = await job
             
-            self.task_service.set_task_result(task_id, zip_buffer)
-            self.task_service.update_task_status(task_id, "completed", progress=100)
+            if not await self.task_service.set_task_result(task_id, zip_buffer, owner=owner):
+                raise TaskOwnershipLost(task_id)
+            await task_event_bus.publish(task_id, "status", {"status": "completed", "progress": 100})
+            status, duration = "completed", time.perf_counter() - started
             
             logger.info(f"Фоновая обработка завершена успешно: {task_id}")
             
@@ -45,54 +191,172 @@ class BackgroundProcessor:
                 processed_count=len(files),
                 task_id=task_id,
                 processing_type=processing_type_name,
-                total_files=len(files)
+                total_files=total_files
             )
             
+            if callback_url:
+                await self._notify(task_id, callback_url, "completed", logger, total_files=total_files)
+        
+        except (TaskOwnershipLost, asyncio.CancelledError):
+            if asyncio.current_task().cancelling():
+                # Останавливается сам воркер — задачу продолжит другой
+                raise
+            duration = time.perf_counter() - started
+            status = await self._stopped(task_id, callback_url, total_files, logger)
+        
         except Exception as e:
-            error_msg = f"Ошибка фоновой обработки: {str(e)}"
-            logger.error(error_msg)
-            self.task_service.set_task_error(task_id, error_msg)
-            
-            processing_type_name = "white_background" if white_bg else "interior"
-            logger.finish_error(
-                error=error_msg,
-                task_id=task_id,
-                processing_type=processing_type_name,
-                total_files=len(files)
+            duration = duration or time.perf_counter() - started
+            status = await self._fail(
+                task_id, owner, white_bg, callback_url, total_files, logger, f"Ошибка фоновой обработки: {str(e)}"
+            )
+        finally:
+            if job is not None and _running.get(task_id) is job:
+                del _running[task_id]
+            if heartbeat is not None:
+                heartbeat.cancel()
+            for _, file in files:
+                await file.close()
+            metrics.TASKS_IN_PROGRESS.labels(processing_type).dec()
+            metrics.TASK_DURATION_SECONDS.labels(processing_type, status).observe(
+                duration or time.perf_counter() - started
             )
     
-    async def _process_with_progress(self, processor, files: List[UploadFile], task_id: str, logger: CustomLogger) -> io.BytesIO:
-        """Обрабатывает файлы с обновлением прогресса"""
-        total_files = len(files)
-        processed_files = []
+    async def _fail(
+        self,
+        task_id: str,
+        owner: str,
+        white_bg: bool,
+        callback_url: Optional[str],
+        total_files: int,
+        logger: CustomLogger,
+        error_msg: str
+    ) -> str:
+        """
+        Завершить задачу с ошибкой: статус, событие, лог и webhook. Задачу, которую
+        за это время отменили или подхватил другой воркер, не трогает. Возвращает итоговый статус.
+        """
+        logger.error(error_msg)
+        if not await self.task_service.set_task_error(task_id, error_msg, owner=owner):
+            return await self._stopped(task_id, callback_url, total_files, logger)
+        await task_event_bus.publish(task_id, "status", {"status": "failed", "error": error_msg})
+        
+        processing_type_name = "white_background" if white_bg else "interior"
+        logger.finish_error(
+            error=error_msg,
+            task_id=task_id,
+            processing_type=processing_type_name,
+            total_files=total_files
+        )
         
-        for i, file in enumerate(files):
+        if callback_url:
+            await self._notify(task_id, callback_url, "failed", logger, error=error_msg, total_files=total_files)
+        return "failed"
+    
+    async def _stopped(self, task_id: str, callback_url: Optional[str], total_files: int, logger: CustomLogger) -> str:
+        """Обработка остановлена: задачу отменили (webhook) или подхватил другой воркер (статус не трогаем)"""
+        status = await self._stopped_status(task_id)
+        if status == "cancelled":
+            logger.warning(f"Задача {task_id} отменена, обработка остановлена")
+            if callback_url:
+                await self._notify(task_id, callback_url, "cancelled", logger, total_files=total_files)
+        else:
+            logger.warning(f"Задача {task_id} подхвачена другим воркером, обработка остановлена")
+        return status
+    
+    async def _stopped_status(self, task_id: str) -> str:
+        """Почему остановлена обработка: cancelled — задача отменена, interrupted — подхвачена другим воркером"""
+        try:
+            task = await self.task_service.get_task_status(task_id)
+        except Exception:
+            return "interrupted"
+        return "cancelled" if task and task["status"] == "cancelled" else "interrupted"
+    
+    async def _heartbeat(self, task_id: str, owner: str, logger: CustomLogger, job: asyncio.Task):
+        """
+        Периодически отмечать задачу, пока воркер её обрабатывает. Если задачу
+        отменили или подхватил другой воркер, обработка останавливается — даже
+        когда уведомление об отмене не дошло до воркера.
+        """
+        while True:
+            await asyncio.sleep(config.app.task_heartbeat_seconds)
             try:
-                progress = int((i / total_files) * 100)
-                self.task_service.update_task_status(
-                    task_id, 
-                    "processing", 
-                    progress=progress,
-                    processed_files=i
-                )
-                
-                logger.info(f"Обработка файла {i+1}/{total_files}: {file.filename}")
-                
-                result = await processor.process_single(file)
-
-                # process_single всегда возвращает (bytes, filename)
-                processed_data, filename = result
-                processed_files.append((filename, processed_data))
-                
-                logger.debug(f"Успешно обработан: {file.filename}")
-                
+                if not await self.task_service.touch_task(task_id, owner):
+                    logger.warning(f"Задача {task_id} отменена или подхвачена другим воркером")
+                    job.cancel()
+                    return
             except Exception as e:
-                logger.error(f"Ошибка обработки файла {file.filename}: {e}")
+                logger.warning(f"Не удалось отметить задачу {task_id}: {e}")
+    
+    async def _notify(self, task_id: str, callback_url: str, status: str, logger: CustomLogger, error: Optional[str] = None, **extra):
+        """Отправить webhook о завершении задачи (ошибки доставки не влияют на задачу)"""
+        webhook_service = WebhookService(delivery_repo=AsyncWebhookDeliveryRepository())
+        payload = webhook_service.build_payload(task_id, status, error=error, **extra)
+        try:
+            await webhook_service.deliver(task_id, callback_url, payload, logger)
+        except Exception as e:
+            logger.error(f"Ошибка отправки webhook для задачи {task_id}: {e}")
+    
+    async def _process_with_progress(
+        self,
+        processor,
+        files: List[Tuple[int, UploadFile]],
+        done_before: int,
+        total_files: int,
+        task_id: str,
+        owner: str,
+        logger: CustomLogger
+    ) -> io.BytesIO:
+        """
+        Обрабатывает файлы, сохраняя итог каждого файла, с обновлением прогресса
+        в БД и публикацией событий
+        """
+        
+        async def on_progress(progress: int, current: int, total: int, filename: Optional[str] = None, error: Optional[str] = None, outputs: Optional[List[Tuple[str, bytes]]] = None):
+            file_index = files[current - 1][0]
+            if not await self.task_service.save_file_outcome(task_id, file_index, owner, outputs or [], error):
+                raise TaskOwnershipLost(task_id)
+            
+            processed = done_before + current
+            progress = int(processed / total_files * 100)
+            if not await self.task_service.update_task_status(
+                task_id,
+                "processing",
+                owner=owner,
+                progress=progress,
+                processed_files=processed
+            ):
+                raise TaskOwnershipLost(task_id)
+            await task_event_bus.publish(task_id, "file", {
+                "filename": filename,
+                "ok": error is None,
+                "error": error,
+                "progress": progress,
+                "processed_files": processed,
+                "total_files": total_files,
+            })
+        
+        # Захват задачи: не отменена и не обрабатывается другим воркером
+        # (исходный запуск, claim_stale и retry-failed не обрабатывают её одновременно)
+        if not await self.task_service.update_task_status(
+            task_id,
+            "processing",
+            owner=owner,
+            worker_id=owner,
+            heartbeat_at=datetime.now(timezone.utc),
+            processed_files=done_before,
+            progress=int(done_before / total_files * 100) if total_files else 0
+        ):
+            raise TaskOwnershipLost(task_id)
+        await task_event_bus.publish(task_id, "status", {"status": "processing", "total_files": total_files})
         
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, file_data in processed_files:
-                zip_file.writestr(filename, file_data)
+        # Готовые части файлов, обработанных в прошлый раз частично (retry-failed), не повторяются
+        previous = await self.task_service.get_partial_results(task_id, [file_index for file_index, _ in files])
         
-        zip_buffer.seek(0)
-        return zip_buffer
\ No newline at end of file
+        processor.set_progress_callback(on_progress)
+        processed_files = await processor.process_files(
+            [file for _, file in files], logger, [previous.get(file_index, []) for file_index, _ in files]
+        )
+        if done_before:
+            # Часть файлов обработана в прошлых запусках — архив собирается из сохранённых результатов
+            processed_files = await self.task_service.get_file_results(task_id)
+        return await processor.create_zip_response(processed_files)
@@ -0,0 +1,128 @@
+"""
+Дедлайны обработки: бюджет времени запроса или задачи для всех стадий.
+
+Дедлайн хранится в contextvar и наследуется корутинами и asyncio-задачами,
+созданными внутри (create_task и gather копируют контекст). Синхронный запрос
+получает его из заголовка `X-Deadline-Seconds` (или REQUEST_DEADLINE_SECONDS),
+фоновая задача — из параметра deadline_seconds: он хранится в задаче как
+абсолютное время и действует и после продолжения на другом воркере.
+Запросы к внешним сервисам получают таймаут min(собственный, остаток бюджета)
+и прерываются по его исчерпании; слоты семафоров и файлы пакета, для которых
+бюджета уже нет, не начинаются.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from core.config import config
+
+# Момент дедлайна по time.monotonic() (None — без дедлайна)
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени запроса или задачи исчерпан"""
+    
+    def __init__(self, stage: str = ""):
+        super().__init__(f"Deadline exceeded before {stage}" if stage else "Deadline exceeded")
+        self.stage = stage
+
+
+def remaining() -> Optional[float]:
+    """Остаток бюджета в секундах (None — дедлайна нет)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check(stage: str = "") -> None:
+    """Не начинать стадию, если бюджет исчерпан"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(stage)
+
+
+def timeout(default: float, stage: str = "") -> float:
+    """
+    Таймаут внешнего запроса: собственный, но не больше остатка бюджета.
+    Если он меньше default, срабатывание таймаута означает исчерпание бюджета.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded(stage)
+    return min(default, left)
+
+
+@contextmanager
+def budget(seconds: Optional[float], inherit: bool = True) -> Iterator[None]:
+    """
+    Дедлайн через seconds секунд на время блока (None — без ограничения).
+    С inherit внешний дедлайн не продлевается: действует более ранний. Фоновая
+    задача задаёт inherit=False, чтобы не наследовать дедлайн запроса, в котором запущена.
+    """
+    deadline = None if seconds is None else time.monotonic() + seconds
+    outer = _deadline.get() if inherit else None
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@asynccontextmanager
+async def limit(stage: str = "") -> AsyncIterator[None]:
+    """Прервать ожидание в блоке (запрос, семафор) по исчерпании бюджета"""
+    left = remaining()
+    if left is None:
+        yield
+        return
+    if left <= 0:
+        raise DeadlineExceeded(stage)
+    
+    timer = asyncio.timeout(left)
+    try:
+        async with timer:
+            yield
+    except DeadlineExceeded:
+        raise
+    except TimeoutError as e:
+        # Собственный таймаут клиента, сработавший раньше дедлайна, не подменяется
+        if timer.expired():
+            raise DeadlineExceeded(stage) from e
+        raise
+
+
+def _requested_seconds(scope: Scope) -> Optional[float]:
+    """Бюджет запроса: заголовок X-Deadline-Seconds или значение по умолчанию"""
+    value = Headers(scope=scope).get("x-deadline-seconds")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = 0
+        if seconds > 0:
+            return seconds
+    return config.app.request_deadline_seconds or None
+
+
+class DeadlineMiddleware:
+    """ASGI-middleware: дедлайн запроса из заголовка X-Deadline-Seconds"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        seconds = _requested_seconds(scope) if scope["type"] == "http" else None
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+        
+        with budget(seconds):
+            await self.app(scope, receive, send)
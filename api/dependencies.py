@@ -4,38 +4,38 @@
 from typing import Optional
 from uuid import UUID
 from fastapi import HTTPException, status, Depends, Header
-from api.services.auth_service import AuthService
-from api.services.task_service import TaskService
-from api.repositories import UserRepository, TaskRepository
+from api.services.auth_service import AsyncAuthService
+from api.services.task_service import AsyncTaskService
+from api.repositories import AsyncUserRepository, AsyncTaskRepository
 
 
-def get_user_repository() -> UserRepository:
+def get_user_repository() -> AsyncUserRepository:
     """Получить репозиторий пользователей"""
-    return UserRepository()
+    return AsyncUserRepository()
 
 
-def get_task_repository() -> TaskRepository:
+def get_task_repository() -> AsyncTaskRepository:
     """Получить репозиторий задач"""
-    return TaskRepository()
+    return AsyncTaskRepository()
 
 
 def get_auth_service(
-    user_repo: UserRepository = Depends(get_user_repository)
-) -> AuthService:
+    user_repo: AsyncUserRepository = Depends(get_user_repository)
+) -> AsyncAuthService:
     """Получить сервис аутентификации"""
-    return AuthService(user_repo=user_repo)
+    return AsyncAuthService(user_repo=user_repo)
 
 
 def get_task_service(
-    task_repo: TaskRepository = Depends(get_task_repository)
-) -> TaskService:
+    task_repo: AsyncTaskRepository = Depends(get_task_repository)
+) -> AsyncTaskService:
     """Получить сервис задач"""
-    return TaskService(task_repo=task_repo)
+    return AsyncTaskService(task_repo=task_repo)
 
 
 async def verify_user(
     x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ) -> dict:
     """Проверить пользователя по UUID из заголовка"""
     if not x_user_id:
@@ -54,7 +54,7 @@ async def verify_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = auth_service.verify_user(user_id)
+    user = await auth_service.verify_user(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -4,7 +4,7 @@ Handlers для аутентификации и управления польз
 from typing import List
 from uuid import UUID
 from fastapi import HTTPException, Depends
-from api.services.auth_service import AuthService
+from api.services.auth_service import AsyncAuthService
 from api.dependencies import verify_user, verify_admin, get_auth_service
 from api.models.auth_schemas import UserCreate, UserResponse, UserUpdate
 
@@ -12,7 +12,7 @@ from api.models.auth_schemas import UserCreate, UserResponse, UserUpdate
 class AuthHandler:
     """Handler для работы с аутентификацией"""
     
-    def __init__(self, auth_service: AuthService):
+    def __init__(self, auth_service: AsyncAuthService):
         self.auth_service = auth_service
     
     async def get_current_user(self, user: dict = Depends(verify_user)) -> UserResponse:
@@ -26,7 +26,7 @@ class AuthHandler:
     ) -> UserResponse:
         """Создать нового пользователя (только для админов)"""
         try:
-            user = self.auth_service.create_user(
+            user = await self.auth_service.create_user(
                 username=user_data.username,
                 is_admin=user_data.is_admin,
                 rate_limit=user_data.rate_limit
@@ -40,7 +40,7 @@ class AuthHandler:
         current_user: dict = Depends(verify_admin)
     ) -> List[UserResponse]:
         """Получить список всех пользователей (только для админов)"""
-        users = self.auth_service.get_all_users()
+        users = await self.auth_service.get_all_users()
         return [UserResponse(**user) for user in users]
     
     async def get_user(
@@ -49,7 +49,7 @@ class AuthHandler:
         current_user: dict = Depends(verify_admin)
     ) -> UserResponse:
         """Получить пользователя по ID (только для админов)"""
-        user = self.auth_service.get_user(user_id)
+        user = await self.auth_service.get_user(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return UserResponse(**user)
@@ -63,7 +63,7 @@ class AuthHandler:
         """Обновить пользователя (только для админов)"""
         try:
             updates = user_data.model_dump(exclude_unset=True)
-            user = self.auth_service.update_user(user_id, updates, current_user)
+            user = await self.auth_service.update_user(user_id, updates, current_user)
             return UserResponse(**user)
         except (ValueError, PermissionError) as e:
             raise HTTPException(status_code=400, detail=str(e))
@@ -75,7 +75,7 @@ class AuthHandler:
     ) -> dict:
         """Удалить пользователя (только для админов)"""
         try:
-            success = self.auth_service.delete_user(user_id, current_user)
+            success = await self.auth_service.delete_user(user_id, current_user)
             if not success:
                 raise HTTPException(status_code=404, detail="User not found")
             return {"message": "User deleted successfully"}
@@ -1,20 +1,67 @@
 """
 Handlers для обработки изображений
 """
-from typing import List
+import asyncio
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException, BackgroundTasks
+from PIL import Image
 from core.config import config
-from api.services.task_service import TaskService
+from api.services.task_service import AsyncTaskService
+from api.services.webhook_service import validate_callback_url
 from api.models.schemas import ProcessingResponse
+from api import metrics
+
+# Сигнатуры поддерживаемых форматов: (префикс, смещение, формат Pillow, MIME)
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", 0, "JPEG", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "PNG", "image/png"),
+    (b"WEBP", 8, "WEBP", "image/webp"),
+]
+
+
+def _sniff_image_format(head: bytes) -> Optional[Tuple[str, str]]:
+    """Определяет формат по magic bytes, возвращает (формат Pillow, MIME)"""
+    for signature, offset, image_format, content_type in _IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if image_format == "WEBP" and not head.startswith(b"RIFF"):
+                continue
+            return image_format, content_type
+    return None
+
+
+def _inspect_image_header(fp: BinaryIO) -> Tuple[str, int, int]:
+    """
+    Читает только заголовок изображения, возвращает (MIME, ширина, высота).
+    Пиксельные данные не декодируются.
+    """
+    fp.seek(0)
+    sniffed = _sniff_image_format(fp.read(16))
+    if not sniffed:
+        raise ValueError("unrecognized image signature")
+    
+    image_format, content_type = sniffed
+    fp.seek(0)
+    try:
+        with Image.open(fp, formats=[image_format]) as img:
+            width, height = img.size
+    except Image.DecompressionBombError as e:
+        raise ValueError(str(e))
+    except Exception as e:
+        raise ValueError(f"cannot parse image header: {e}")
+    finally:
+        fp.seek(0)
+    
+    return content_type, width, height
 
 
 class ProcessingHandler:
     """Handler для обработки изображений"""
     
-    def __init__(self, task_service: TaskService):
+    def __init__(self, task_service: AsyncTaskService):
         self.task_service = task_service
     
-    async def validate_files(self, files: List[UploadFile]) -> List[UploadFile]:
+    @staticmethod
+    async def validate_files(files: List[UploadFile]) -> List[UploadFile]:
         """Валидация файлов"""
         if not files:
             raise HTTPException(status_code=400, detail="No files provided")
@@ -25,47 +72,94 @@ class ProcessingHandler:
                 detail=f"Too many files. Maximum {config.app.max_files_count} files allowed"
             )
         
-        validated_files = []
-        for file in files:
-            content = await file.read()
-            await file.seek(0)
-            
-            if len(content) > config.app.max_file_size:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File {file.filename} is too large. Maximum size is {config.app.max_file_size} bytes"
-                )
-            
-            if file.content_type not in config.app.allowed_content_types:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File {file.filename} has unsupported content type. Allowed: {', '.join(config.app.allowed_content_types)}"
-                )
-            
-            if len(content) == 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File {file.filename} is empty"
-                )
-            
-            validated_files.append(file)
+        await asyncio.gather(*(ProcessingHandler._validate_file(file) for file in files))
+        return list(files)
+    
+    @staticmethod
+    async def _validate_file(file: UploadFile) -> None:
+        """Проверяет размер, сигнатуру и размеры изображения без чтения файла целиком"""
+        size = file.size
+        if size is None:
+            file.file.seek(0, 2)
+            size = file.file.tell()
+            file.file.seek(0)
+        
+        if size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File {file.filename} is empty"
+            )
         
-        return validated_files
+        if size > config.app.max_file_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File {file.filename} is too large. Maximum size is {config.app.max_file_size} bytes"
+            )
+        
+        try:
+            content_type, width, height = await asyncio.to_thread(_inspect_image_header, file.file)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File {file.filename} is not a valid image: {e}"
+            )
+        
+        if content_type not in config.app.allowed_content_types:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File {file.filename} has unsupported content type. Allowed: {', '.join(config.app.allowed_content_types)}"
+            )
+        
+        if max(width, height) > config.app.max_image_side or width * height > config.app.max_image_pixels:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"File {file.filename} is too large: {width}x{height}. "
+                    f"Maximum side is {config.app.max_image_side} px, "
+                    f"maximum {config.app.max_image_pixels} pixels"
+                )
+            )
     
     async def process_parallel(
         self,
         background_tasks: BackgroundTasks,
         white_bg: bool,
-        files: List[UploadFile]
+        files: List[UploadFile],
+        callback_url: Optional[str] = None,
+        reuse_assets: bool = False,
+        scenes: int = 1,
+        deadline_seconds: Optional[int] = None
     ) -> ProcessingResponse:
-        """Запустить параллельную обработку"""
+        """Запустить параллельную обработку (deadline_seconds — дедлайн задачи, по умолчанию TASK_DEADLINE_SECONDS)"""
         from api.background_processor import BackgroundProcessor
+        from api.processors.async_interior_processor import AsyncInteriorProcessor
+        
+        if scenes > 1:
+            if white_bg:
+                raise HTTPException(status_code=400, detail="Multiple scenes are supported only for interior processing")
+            if scenes > AsyncInteriorProcessor.total_scenes():
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Too many scenes. Maximum {AsyncInteriorProcessor.total_scenes()} scenes allowed"
+                )
+        
+        if callback_url:
+            try:
+                callback_url = await validate_callback_url(callback_url)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
         validated_files = await self.validate_files(files)
         
-        task = self.task_service.create_task(
+        # Входы сохраняются вместе с задачей: её можно продолжить на другом воркере
+        task = await self.task_service.create_task(
             white_bg=white_bg,
-            total_files=len(validated_files)
+            total_files=len(validated_files),
+            callback_url=callback_url or None,
+            reuse_assets=reuse_assets,
+            scenes=scenes,
+            files=validated_files,
+            deadline_seconds=deadline_seconds or config.app.task_deadline_seconds or None
         )
         
         processor = BackgroundProcessor(task_service=self.task_service)
@@ -73,7 +167,11 @@ class ProcessingHandler:
             processor.process_task,
             task["task_id"],
             validated_files,
-            white_bg
+            white_bg,
+            callback_url or None,
+            reuse_assets,
+            scenes
         )
+        metrics.TASKS_QUEUED.labels("white" if white_bg else "interior").inc()
         
         return ProcessingResponse(task_id=task["task_id"])
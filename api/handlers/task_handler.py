@@ -1,45 +1,159 @@
 """
 Handlers для работы с задачами
 """
-from typing import Optional
-from fastapi import HTTPException, Depends
-from api.services.task_service import TaskService
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, Depends, BackgroundTasks
+from core.config import config
+from api.services.task_service import AsyncTaskService
+from api.services.task_events import task_event_bus
 from api.dependencies import verify_user
-from api.models.schemas import TaskStatusResponse
+from api.models.schemas import ProcessingResponse, TaskStatusResponse
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+_FINAL_STATUSES = {"completed", "failed", "cancelled"}
 
 
 class TaskHandler:
     """Handler для работы с задачами"""
     
-    def __init__(self, task_service: TaskService):
+    def __init__(self, task_service: AsyncTaskService):
         self.task_service = task_service
     
     async def get_task_status(self, task_id: str, user: dict = Depends(verify_user)) -> TaskStatusResponse:
         """Получить статус задачи"""
-        task = self.task_service.get_task(task_id)
+        task = await self.task_service.get_task_status(task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
+        return self._to_status_response(task)
+    
+    async def stream_task_events(self, task_id: str) -> AsyncIterator[Optional[dict]]:
+        """
+        Поток событий задачи: снимок статуса, затем прогресс и результаты по файлам
+        до финального статуса. None — heartbeat.
+        """
+        # Подписываемся до чтения снимка, чтобы не потерять события между ними
+        with task_event_bus.subscribe(task_id) as queue:
+            task = await self.task_service.get_task_status(task_id)
+            if not task:
+                raise HTTPException(status_code=404, detail="Task not found")
+            
+            yield self._snapshot_event(task)
+            if task["status"] in _FINAL_STATUSES:
+                return
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=config.app.task_events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # NOTIFY мог потеряться при переподключении слушателя — сверяемся с БД
+                    task = await self.task_service.get_task_status(task_id)
+                    if not task or task["status"] in _FINAL_STATUSES:
+                        if task:
+                            yield self._snapshot_event(task)
+                        return
+                    yield None
+                    continue
+                
+                yield event
+                if event["event"] == "status" and event["data"].get("status") in _FINAL_STATUSES:
+                    return
+    
+    @staticmethod
+    def _snapshot_event(task: dict) -> dict:
+        """Событие с полным статусом задачи"""
+        return {
+            "task_id": task["task_id"],
+            "event": "status",
+            "data": TaskHandler._to_status_response(task).model_dump(mode="json"),
+        }
+    
+    @staticmethod
+    def _to_status_response(task: dict) -> TaskStatusResponse:
+        """Преобразовать статус задачи в ответ API"""
         return TaskStatusResponse(
             task_id=task["task_id"],
             status=task["status"],
             progress=task["progress"],
             processed_files=task["processed_files"],
             total_files=task["total_files"],
-            error=task.get("error")
+            error=task.get("error"),
+            has_result=task["has_result"],
+            result_size=task["result_size"],
+            failed_files=task.get("failed_files") or 0
         )
     
+    async def cancel_task(self, task_id: str) -> TaskStatusResponse:
+        """
+        Отменить задачу: обработка прерывается в воркере, который её выполняет
+        (уведомление task_cancellations), необработанные файлы отбрасываются.
+        Итоги уже обработанных файлов сохраняются — остальные можно обработать через retry-failed.
+        """
+        from api.background_processor import CANCEL_CHANNEL, cancel_running
+        
+        task = await self.task_service.get_task_status(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        
+        if task["status"] in _FINAL_STATUSES or not await self.task_service.cancel_task(task_id):
+            raise HTTPException(status_code=409, detail="Task is already finished")
+        
+        if not cancel_running(task_id):
+            try:
+                await task_event_bus.notify(CANCEL_CHANNEL, task_id)
+            except Exception as e:
+                # Воркер всё равно остановит обработку при следующей отметке heartbeat
+                logger.warning(f"Failed to notify cancellation of task {task_id}: {e}")
+        await task_event_bus.publish(task_id, "status", {"status": "cancelled", "error": "Task cancelled"})
+        
+        return await self.get_task_status(task_id)
+    
+    async def retry_failed(self, task_id: str, background_tasks: BackgroundTasks, deadline_seconds: Optional[int] = None) -> ProcessingResponse:
+        """
+        Повторить обработку файлов задачи с ошибкой (и не обработанных до сбоя задачи).
+        Результаты остальных файлов берутся из сохранённых, архив собирается заново.
+        """
+        from api.background_processor import BackgroundProcessor
+        
+        task = await self.task_service.get_task_status(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        
+        if task["status"] not in _FINAL_STATUSES:
+            raise HTTPException(status_code=409, detail="Task is still processing")
+        
+        pending = await self.task_service.reopen_failed_files(
+            task_id, deadline_seconds or config.app.task_deadline_seconds or None
+        )
+        if pending is None:
+            raise HTTPException(status_code=409, detail="Task is still processing")
+        if pending == 0:
+            raise HTTPException(status_code=400, detail="Task has no failed files")
+        
+        processor = BackgroundProcessor(task_service=self.task_service)
+        background_tasks.add_task(processor.resume_task, task_id, True)
+        metrics.TASKS_QUEUED.labels("white" if task["white_bg"] else "interior").inc()
+        metrics.TASKS_RESUMED.labels("retry").inc()
+        await task_event_bus.publish(task_id, "status", {"status": "pending", "retry_files": pending})
+        
+        return ProcessingResponse(task_id=task_id)
+    
     async def download_task_result(self, task_id: str, user: dict = Depends(verify_user)):
         """Скачать результат задачи"""
-        task = self.task_service.get_task(task_id)
+        task = await self.task_service.get_task_status(task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
         if task["status"] != "completed":
             raise HTTPException(status_code=400, detail="Task is not completed")
         
-        if "result" not in task or task["result"] is None:
+        result = await self.task_service.get_task_result(task_id) if task["has_result"] else None
+        if result is None:
             raise HTTPException(status_code=404, detail="Task result not found")
         
-        return task["result"]
+        return result
 
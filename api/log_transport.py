@@ -0,0 +1,237 @@
+"""
+Транспорт логов Poradock: общий на процесс клиент, кольцевой буфер и фоновая отправка.
+
+CustomLogger только кладёт записи в буфер, поэтому отправка логов не добавляет
+задержку обработке изображений. Поток-отправитель забирает записи пачками и
+передаёт их клиенту `log.Log`. У клиента нет пакетного API (только методы
+info/…/finish_log на одну запись), поэтому пачка — это единица выборки из
+буфера, а не одного запроса: каждая запись по-прежнему отправляется отдельным
+вызовом, пачки лишь убирают эти вызовы из пути обработки. При заполнении
+буфера debug отбрасываются, info сэмплируются, warning и выше сохраняются всегда.
+"""
+import atexit
+import logging
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+from core.config import config
+
+logger = logging.getLogger(__name__)
+
+_LEVELS = {
+    "debug": 10,
+    "info": 20,
+    "warning": 30,
+    "error": 40,
+    "critical": 50,
+    # Итоговые записи обработки важнее любых сообщений
+    "finish_success": 60,
+    "finish_warning": 60,
+    "finish_error": 60,
+    "finish_log": 60,
+}
+
+# Доля заполнения буфера, после которой включается сэмплирование
+_HIGH_WATERMARK = 0.8
+
+Record = Tuple[str, tuple, dict]
+
+
+class InMemoryLog:
+    """Замена клиента `log.Log` для тестов и локального запуска: хранит вызовы в памяти"""
+    
+    def __init__(self, *args, **kwargs):
+        self.records: List[Record] = []
+        self._lock = threading.Lock()
+    
+    def _record(self, method: str, *args, **kwargs):
+        with self._lock:
+            self.records.append((method, args, kwargs))
+    
+    def __getattr__(self, method: str):
+        if method not in _LEVELS:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._record(method, *args, **kwargs)
+    
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+
+class LogTransport:
+    """Кольцевой буфер записей с фоновой пакетной отправкой в клиент логирования"""
+    
+    def __init__(self, client: Any, buffer_size: int, batch_size: int, flush_interval: float, pressure_sample_rate: float):
+        self.client = client
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pressure_sample_rate = pressure_sample_rate
+        
+        self.dropped = 0
+        self._buffer: Deque[Record] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+    
+    def submit(self, method: str, *args, **kwargs) -> bool:
+        """Положить запись в буфер (не блокирует), возвращает False, если запись отброшена"""
+        level = _LEVELS[method]
+        with self._lock:
+            fill = len(self._buffer) / self.buffer_size
+            if level < _LEVELS["warning"]:
+                if fill >= 1 or (fill >= _HIGH_WATERMARK and (level < _LEVELS["info"] or random.random() >= self.pressure_sample_rate)):
+                    self.dropped += 1
+                    return False
+            elif fill >= 1:
+                # Буфер полон: важная запись вытесняет самую старую
+                self.dropped += 1
+            
+            self._buffer.append((method, args, kwargs))
+            pending = len(self._buffer)
+        
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+    
+    def flush(self) -> None:
+        """Отправить всё накопленное в текущем потоке"""
+        while self._send_batch():
+            pass
+    
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Остановить поток-отправитель, дослав буфер"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+    
+    def _ensure_started(self) -> None:
+        """Запустить поток-отправитель (заново — в дочернем процессе после fork)"""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="log-transport", daemon=True)
+            self._thread.start()
+    
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def _take_batch(self) -> List[Record]:
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+        
+        if dropped:
+            batch.append(("warning", (f"Log transport dropped {dropped} records under pressure",), {}))
+        return batch
+    
+    def _send_batch(self) -> bool:
+        """
+        Отправить одну пачку (по вызову клиента на запись — пакетного метода у `log.Log` нет),
+        возвращает True, если буфер ещё не пуст
+        """
+        batch = self._take_batch()
+        if not batch:
+            return False
+        
+        for method, args, kwargs in batch:
+            try:
+                getattr(self.client, method)(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Failed to ship log record {method}: {e}")
+        
+        return len(batch) >= self.batch_size
+    
+    # Интерфейс клиента `log.Log`: вызовы только ставятся в очередь
+    
+    def info(self, msg: str):
+        self.submit("info", msg)
+    
+    def debug(self, msg: str):
+        self.submit("debug", msg)
+    
+    def warning(self, msg: str):
+        self.submit("warning", msg)
+    
+    def error(self, msg: str):
+        self.submit("error", msg)
+    
+    def critical(self, msg: str):
+        self.submit("critical", msg)
+    
+    def finish_success(self, period_from, period_to, **kwargs):
+        self.submit("finish_success", period_from, period_to, **kwargs)
+    
+    def finish_warning(self, period_from, period_to, **kwargs):
+        self.submit("finish_warning", period_from, period_to, **kwargs)
+    
+    def finish_error(self, period_from, period_to, **kwargs):
+        self.submit("finish_error", period_from, period_to, **kwargs)
+    
+    def finish_log(self, period_from, period_to, status, **kwargs):
+        self.submit("finish_log", period_from, period_to, status=status, **kwargs)
+
+
+_transport: Optional[LogTransport] = None
+_transport_lock = threading.Lock()
+
+
+def _create_client(token: str) -> Any:
+    """Клиент Poradock Logging API (импортируется лениво: в тестах пакет может отсутствовать)"""
+    from log import Log
+    return Log(token=token, auto_host=True)
+
+
+def get_log_transport() -> LogTransport:
+    """Общий на процесс транспорт логов"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = LogTransport(
+                    client=_create_client(config.app.log_token),
+                    buffer_size=config.app.log_buffer_size,
+                    batch_size=config.app.log_batch_size,
+                    flush_interval=config.app.log_flush_interval_seconds,
+                    pressure_sample_rate=config.app.log_pressure_sample_rate,
+                )
+                atexit.register(_transport.shutdown)
+    return _transport
+
+
+def shutdown_log_transport() -> None:
+    """Дослать буфер и остановить отправку, если транспорт создавался"""
+    if _transport is not None:
+        _transport.shutdown()
+
+
+def _reset_after_fork() -> None:
+    """В дочернем процессе (режим preload-then-fork) поток отправки родителя не существует"""
+    global _transport, _transport_lock
+    _transport = None
+    _transport_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_log_transport(transport: Optional[LogTransport]) -> None:
+    """Подменить транспорт (например, LogTransport(InMemoryLog(), ...) в тестах)"""
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
-from log import Log
 from core.config import config
+from api.log_transport import get_log_transport
 
 class CustomLogger:
     """Кастомный логгер для API с поддержкой двух типов обработки"""
@@ -16,7 +16,8 @@ class CustomLogger:
             self.logger = logging.getLogger(f"photo_processing.{processing_type}")
             self._use_std_logging = True
         else:
-            self.logger = Log(token=token, auto_host=True)
+            # Общий на процесс транспорт: вызовы только ставятся в очередь на отправку
+            self.logger = get_log_transport()
             self._use_std_logging = False
     
     def info(self, msg: str):
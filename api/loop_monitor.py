@@ -0,0 +1,173 @@
+"""
+Мониторинг задержки event loop и обнаружение блокирующих вызовов.
+
+В event loop каждые `interval` секунд планируется отметка (call_later); разница
+между фактическим и плановым временем срабатывания — задержка цикла. Отдельный
+поток-сторож следит за временем последней отметки: если цикл не отвечает дольше
+порога, он снимает стек потока event loop, то есть ровно тот код, который его
+блокирует (синхронный SQLAlchemy, Pillow, zip, разбор CSV и т.п.).
+Монитор работает в каждом воркере отдельно.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from core.config import config
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько кадров стека хранить для каждого блокирующего вызова
+_STACK_LIMIT = 40
+
+
+def _culprit(stack: List[traceback.FrameSummary]) -> str:
+    """Самый глубокий кадр кода приложения (не библиотек) — по нему группируются блокировки"""
+    for frame in reversed(stack):
+        if "site-packages" not in frame.filename and "/lib/python" not in frame.filename:
+            return f"{os.path.relpath(frame.filename)}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """Замер задержки event loop и поток-сторож, снимающий стек при блокировке"""
+    
+    def __init__(self, interval: float, block_threshold: float, max_offenders: int):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        
+        self._last_beat = 0.0
+        self._expected_at = 0.0
+        self._current_block: Optional[dict] = None
+        self._recent_lags: Deque[float] = deque(maxlen=600)
+        self.offenders: Deque[dict] = deque(maxlen=max_offenders)
+        self.by_location: Dict[str, dict] = {}
+    
+    def start(self) -> None:
+        """Запустить мониторинг текущего event loop"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._last_beat = time.monotonic()
+        self._schedule()
+        
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+    
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        self._loop = None
+    
+    def _schedule(self) -> None:
+        self._expected_at = time.monotonic() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._beat)
+    
+    def _beat(self) -> None:
+        """Отметка из event loop: фиксирует задержку и закрывает текущую блокировку"""
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected_at)
+        metrics.EVENT_LOOP_LAG_SECONDS.observe(lag)
+        metrics.EVENT_LOOP_LAG_CURRENT.set(lag)
+        
+        with self._lock:
+            self._last_beat = now
+            self._recent_lags.append(lag)
+            if self._current_block is not None:
+                self._current_block["blocked_seconds"] = round(lag, 3)
+                self._current_block["ongoing"] = False
+                location = self.by_location[self._current_block["culprit"]]
+                location["max_seconds"] = max(location["max_seconds"], self._current_block["blocked_seconds"])
+                self._current_block = None
+        
+        if not self._stopped.is_set():
+            self._schedule()
+    
+    def _watch(self) -> None:
+        """Поток-сторож: снимает стек event loop, если отметки нет дольше порога"""
+        poll = max(0.01, min(self.block_threshold / 4, 0.05))
+        while not self._stopped.wait(poll):
+            with self._lock:
+                stalled = time.monotonic() - self._last_beat - self.interval
+                if stalled < self.block_threshold or self._current_block is not None:
+                    if self._current_block is not None:
+                        self._current_block["blocked_seconds"] = round(stalled, 3)
+                    continue
+            
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=_STACK_LIMIT)
+            self._record_block(stack, stalled)
+    
+    def _record_block(self, stack: List[traceback.FrameSummary], stalled: float) -> None:
+        culprit = _culprit(stack)
+        block = {
+            "detected_at": time.time(),
+            "blocked_seconds": round(stalled, 3),
+            "ongoing": True,
+            "culprit": culprit,
+            "stack": [f"{f.filename}:{f.lineno} in {f.name}" + (f": {f.line}" if f.line else "") for f in stack],
+        }
+        
+        with self._lock:
+            self._current_block = block
+            self.offenders.append(block)
+            location = self.by_location.setdefault(culprit, {"count": 0, "max_seconds": 0.0, "last_seen": 0.0})
+            location["count"] += 1
+            location["last_seen"] = block["detected_at"]
+        
+        metrics.EVENT_LOOP_BLOCKS.inc()
+        logger.warning(f"Event loop blocked for more than {self.block_threshold:.2f}s at {culprit}")
+    
+    def report(self) -> dict:
+        """Состояние монитора этого воркера (перцентили — по последним 600 отметкам)"""
+        with self._lock:
+            lags = sorted(self._recent_lags)
+            offenders = [dict(block) for block in reversed(self.offenders)]
+            locations = sorted(
+                ({"culprit": culprit, **stats} for culprit, stats in self.by_location.items()),
+                key=lambda item: item["count"],
+                reverse=True,
+            )
+        
+        def percentile(pct: float) -> float:
+            return round(lags[min(len(lags) - 1, int(len(lags) * pct))], 4) if lags else 0.0
+        
+        return {
+            "pid": os.getpid(),
+            "interval_seconds": self.interval,
+            "block_threshold_seconds": self.block_threshold,
+            "lag_p50_seconds": percentile(0.5),
+            "lag_p99_seconds": percentile(0.99),
+            "lag_max_seconds": round(lags[-1], 4) if lags else 0.0,
+            "top_locations": locations,
+            "recent_blocks": offenders,
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=config.app.loop_monitor_interval_seconds,
+    block_threshold=config.app.loop_block_threshold_seconds,
+    max_offenders=config.app.loop_monitor_max_offenders,
+)
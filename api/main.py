@@ -1,14 +1,27 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 import asyncio
 import logging
+from typing import Awaitable
 
 from core.config import config
-from api.services.task_service import TaskService
-from api.repositories import TaskRepository
-from database.db_session import get_db
+from api.services.task_service import TaskService, AsyncTaskService
+from api.services.auth_service import AsyncAuthService
+from api.services.task_events import task_event_bus
+from api.services.category_service import category_service, CHANNEL as CATEGORY_CHANNEL
+from api.repositories import TaskRepository, AsyncTaskRepository, AsyncUserRepository, AsyncWebhookDeliveryRepository, AsyncProfileRepository, AsyncGenerationRepository
+from database.db_session import get_async_read_db, dispose_engines
 from api.routers import auth_router, admin_router, processing_router
+from api import metrics
+from api.log_transport import shutdown_log_transport
+from api.profiling import ProfilingMiddleware
+from api.deadline import DeadlineMiddleware, DeadlineExceeded
+from api.loop_monitor import loop_monitor
+from api.startup import StartupTimer, warm_up
+from api.background_processor import BackgroundProcessor, worker_id, cancel_running, CANCEL_CHANNEL
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,6 +29,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Инициализация воркера: каталоги, снимок категорий, шина событий, фоновые задачи.
+    Импорт модуля ничего из этого не делает, поэтому приложение можно импортировать
+    в мастере и порождать воркеров через fork (api/serve.py).
+    """
+    timer = StartupTimer()
+    logger.info("Starting application...")
+    config.app.ensure_dirs()
+    try:
+        await category_service.load()
+    except Exception as e:
+        # Снимок будет загружен при первом обращении или следующей сверке версии
+        logger.error(f"Failed to load categories on startup: {e}")
+    category_service.start()
+    
+    background = [
+        asyncio.create_task(periodic_cleanup()),
+        asyncio.create_task(periodic_last_used_flush()),
+        asyncio.create_task(periodic_task_recovery()),
+    ]
+    task_event_bus.add_channel_listener(CATEGORY_CHANNEL, category_service.request_refresh)
+    task_event_bus.add_channel_listener(CANCEL_CHANNEL, cancel_running)
+    task_event_bus.start()
+    if config.app.loop_monitor_enabled:
+        loop_monitor.start()
+    timer.ready()
+    if config.app.processor_warmup:
+        background.append(asyncio.create_task(asyncio.to_thread(warm_up)))
+    
+    yield
+    
+    # Сбрасываем накопленные отметки last_used, останавливаем шину событий и закрываем пул соединений
+    for task in background:
+        task.cancel()
+    try:
+        await AsyncAuthService(user_repo=AsyncUserRepository()).flush_last_used()
+    except Exception as e:
+        logger.error(f"Error flushing last_used on shutdown: {e}")
+    
+    loop_monitor.stop()
+    await task_event_bus.stop()
+    await category_service.stop()
+    await dispose_engines()
+    metrics.mark_process_dead()
+    await asyncio.to_thread(shutdown_log_transport)
+
+
 app = FastAPI(
     title="Image Processing API",
     description="API для обработки изображений",
@@ -23,8 +86,9 @@ app = FastAPI(
     openapi_url="/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
-    root_path="/photo_processing",
-    servers=[{"url": "/photo_processing"}]
+    root_path=config.app.root_path,
+    servers=[{"url": config.app.root_path}],
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -33,18 +97,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(DeadlineMiddleware)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    """Бюджет времени запроса (X-Deadline-Seconds) исчерпан до получения результата"""
+    metrics.DEADLINE_EXCEEDED.labels("request").inc()
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(processing_router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Запускаем периодическую очистку старых задач"""
-    logger.info("Starting application...")
-    asyncio.create_task(periodic_cleanup())
+async def _cleanup_step(name: str, cleanup: Awaitable[int]) -> None:
+    """Дополнительный шаг очистки: сбой одного шага не отменяет остальные"""
+    try:
+        deleted = await cleanup
+        if deleted > 0:
+            logger.info(f"Cleaned up {deleted} {name}")
+    except Exception as e:
+        logger.error(f"Error cleaning up {name}: {e}")
 
 
 async def periodic_cleanup():
@@ -55,19 +132,84 @@ async def periodic_cleanup():
     while True:
         await asyncio.sleep(config.app.task_cleanup_interval_hours * 3600)
         try:
-            deleted = task_service.cleanup_old_tasks(config.app.task_max_age_hours)
-            if deleted > 0:
-                logger.info(f"Cleaned up {deleted} old tasks")
+            stats = await asyncio.to_thread(
+                task_service.cleanup_old_tasks,
+                config.app.task_max_age_hours,
+                config.app.task_cleanup_batch_size,
+                config.app.task_cleanup_interval_hours
+            )
+            if stats is None:
+                logger.info("Cleanup skipped: another worker already ran it this interval")
+                continue
+            if stats["rows"] > 0:
+                metrics.CLEANUP_DELETED_TASKS.inc(stats["rows"])
+                metrics.CLEANUP_RECLAIMED_BYTES.inc(stats["bytes"])
+                logger.info(
+                    f"Cleaned up {stats['rows']} old tasks, "
+                    f"reclaimed {stats['bytes']} bytes in {stats['batches']} batches"
+                )
+        except Exception as e:
+            # Интервал освобождён сервисом: очистку задач повторит следующая проверка
+            logger.error(f"Error during task cleanup: {e}")
+        
+        await _cleanup_step(
+            "old webhook delivery records",
+            AsyncWebhookDeliveryRepository.cleanup_old(config.app.task_max_age_hours),
+        )
+        await _cleanup_step(
+            "old request profiles",
+            AsyncProfileRepository.cleanup_old(config.app.task_max_age_hours),
+        )
+        await _cleanup_step(
+            "old interior generations",
+            AsyncGenerationRepository.cleanup_old(config.app.interior_dedup_max_age_hours),
+        )
+
+
+async def periodic_last_used_flush():
+    """Периодическая запись last_used пользователей"""
+    auth_service = AsyncAuthService(user_repo=AsyncUserRepository())
+    
+    while True:
+        await asyncio.sleep(config.app.last_used_flush_interval_seconds)
+        try:
+            await auth_service.flush_last_used()
         except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+            logger.error(f"Error flushing last_used: {e}")
+
+
+async def periodic_task_recovery():
+    """
+    Подхват задач, воркер которых перестал отмечаться (упал или был перезапущен):
+    задача продолжается с необработанных файлов
+    """
+    task_service = AsyncTaskService(task_repo=AsyncTaskRepository())
+    processor = BackgroundProcessor(task_service=task_service)
+    running = set()
+    
+    while True:
+        await asyncio.sleep(config.app.task_recovery_interval_seconds)
+        try:
+            while len(running) < config.app.task_recovery_concurrency:
+                task_id = await task_service.claim_stale_task(config.app.task_stale_seconds, worker_id())
+                if task_id is None:
+                    break
+                
+                logger.warning(f"Resuming stale task {task_id}")
+                metrics.TASKS_RESUMED.labels("stale").inc()
+                job = asyncio.create_task(processor.resume_task(task_id))
+                running.add(job)
+                job.add_done_callback(running.discard)
+        except Exception as e:
+            logger.error(f"Error during task recovery: {e}")
 
 
 @app.get("/health", tags=["sys"])
 async def health_check():
     """Health check endpoint с проверкой БД"""
     try:
-        with get_db() as db:
-            db.execute(text("SELECT 1"))
+        async with get_async_read_db() as db:
+            await db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected"
@@ -81,6 +223,13 @@ async def health_check():
         }
 
 
+@app.get("/metrics", tags=["sys"], include_in_schema=False)
+async def metrics_endpoint():
+    """Метрики Prometheus (агрегированные по воркерам при PROMETHEUS_MULTIPROC_DIR)"""
+    content, content_type = await asyncio.to_thread(metrics.render_latest)
+    return Response(content=content, media_type=content_type)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,229 @@
+"""
+Метрики Prometheus: стадии обработки, внешние сервисы, очереди и задачи.
+
+При заданной переменной PROMETHEUS_MULTIPROC_DIR метрики пишутся в общий каталог
+и агрегируются по всем воркерам uvicorn (multiprocess mode prometheus_client).
+Каталог нужно очищать перед запуском воркеров.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Tuple
+from api import deadline
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+_TASK_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "photo_stage_duration_seconds",
+    "Длительность стадий обработки изображения",
+    ["pipeline", "stage"],
+    buckets=_STAGE_BUCKETS,
+)
+
+UPSTREAM_REQUESTS = Counter(
+    "photo_upstream_requests_total",
+    "Запросы к внешним сервисам по исходу (ok, rate_limited, http_error, timeout, network_error)",
+    ["upstream", "outcome"],
+)
+
+UPSTREAM_SECONDS = Histogram(
+    "photo_upstream_request_duration_seconds",
+    "Длительность запросов к внешним сервисам",
+    ["upstream"],
+    buckets=_STAGE_BUCKETS,
+)
+
+FILES_IN_FLIGHT = Gauge(
+    "photo_files_in_flight",
+    "Изображения, обрабатываемые в данный момент",
+    ["pipeline"],
+    multiprocess_mode="livesum",
+)
+
+TASKS_QUEUED = Gauge(
+    "photo_tasks_queued",
+    "Задачи, принятые, но ещё не начавшие обработку",
+    ["pipeline"],
+    multiprocess_mode="livesum",
+)
+
+TASKS_IN_PROGRESS = Gauge(
+    "photo_tasks_in_progress",
+    "Задачи в обработке",
+    ["pipeline"],
+    multiprocess_mode="livesum",
+)
+
+SEMAPHORE_WAIT_SECONDS = Histogram(
+    "photo_semaphore_wait_seconds",
+    "Ожидание слота семафора перед обращением к внешнему сервису",
+    ["pipeline"],
+    buckets=_STAGE_BUCKETS,
+)
+
+TASK_DURATION_SECONDS = Histogram(
+    "photo_task_duration_seconds",
+    "Длительность фоновых задач",
+    ["pipeline", "status"],
+    buckets=_TASK_BUCKETS,
+)
+
+FILES_PROCESSED = Counter(
+    "photo_files_processed_total",
+    "Обработанные изображения по результату",
+    ["pipeline", "result"],
+)
+
+BYTES_RECEIVED = Counter(
+    "photo_bytes_received_total",
+    "Объём загруженных изображений",
+    ["pipeline"],
+)
+
+BYTES_PRODUCED = Counter(
+    "photo_bytes_produced_total",
+    "Объём результатов обработки",
+    ["pipeline"],
+)
+
+TASKS_RESUMED = Counter(
+    "photo_tasks_resumed_total",
+    "Задачи, продолженные с необработанных файлов (stale — воркер упал, retry — retry-failed)",
+    ["reason"],
+)
+
+DEADLINE_EXCEEDED = Counter(
+    "photo_deadline_exceeded_total",
+    "Работа, прерванная или пропущенная по дедлайну (request — синхронный запрос, white/interior — файл задачи)",
+    ["scope"],
+)
+
+CLEANUP_DELETED_TASKS = Counter(
+    "photo_cleanup_deleted_tasks_total",
+    "Задачи, удалённые периодической очисткой",
+)
+
+CLEANUP_RECLAIMED_BYTES = Counter(
+    "photo_cleanup_reclaimed_bytes_total",
+    "Объём result_data, освобождённый периодической очисткой",
+)
+
+LLM_TOKENS = Counter(
+    "photo_llm_tokens_total",
+    "Токены LLM по типу (prompt, cached_prompt, completion)",
+    ["upstream", "kind"],
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "photo_event_loop_lag_seconds",
+    "Задержка срабатывания отметок event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+EVENT_LOOP_LAG_CURRENT = Gauge(
+    "photo_event_loop_lag_current_seconds",
+    "Последняя замеренная задержка event loop по воркерам",
+    multiprocess_mode="liveall",
+)
+
+EVENT_LOOP_BLOCKS = Counter(
+    "photo_event_loop_blocks_total",
+    "Блокировки event loop дольше порога LOOP_BLOCK_THRESHOLD_SECONDS",
+)
+
+INTERIOR_DEDUP_LOOKUPS = Counter(
+    "photo_interior_dedup_lookups_total",
+    "Поиск почти совпадающей генерации интерьера по результату (hit, miss, error)",
+    ["result"],
+)
+
+ASSET_LIBRARY_LOOKUPS = Counter(
+    "photo_asset_library_lookups_total",
+    "Поиск готового изображения в библиотеке по артикулу (hit, miss, error)",
+    ["pipeline", "result"],
+)
+
+WORKER_STARTUP_SECONDS = Gauge(
+    "photo_worker_startup_seconds",
+    "Время запуска воркера по фазам (boot, startup, ready, warmup)",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+
+
+@contextmanager
+def observe_stage(pipeline: str, stage: str):
+    """Замерить длительность стадии обработки"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def semaphore_slot(semaphore: asyncio.Semaphore, pipeline: str):
+    """Занять слот семафора, замерив время ожидания (ожидание ограничено дедлайном)"""
+    started = time.perf_counter()
+    async with deadline.limit(f"{pipeline} slot"):
+        await semaphore.acquire()
+    try:
+        SEMAPHORE_WAIT_SECONDS.labels(pipeline).observe(time.perf_counter() - started)
+        yield
+    finally:
+        semaphore.release()
+
+
+def record_upstream(upstream: str, seconds: float, status_code: Optional[int] = None, outcome: Optional[str] = None) -> None:
+    """Учесть запрос к внешнему сервису (outcome выводится из status_code, если не задан)"""
+    if outcome is None:
+        if status_code == 429:
+            outcome = "rate_limited"
+        elif status_code is not None and status_code >= 400:
+            outcome = "http_error"
+        else:
+            outcome = "ok"
+    
+    UPSTREAM_REQUESTS.labels(upstream, outcome).inc()
+    UPSTREAM_SECONDS.labels(upstream).observe(seconds)
+
+
+def record_llm_usage(upstream: str, usage) -> None:
+    """Учесть токены из usage ответа chat completions (cached_prompt — из кэша префикса)"""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(upstream, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(upstream, "completion").inc(usage.completion_tokens or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        LLM_TOKENS.labels(upstream, "cached_prompt").inc(cached)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Сериализовать метрики (в multiprocess mode — агрегированные по воркерам)"""
+    if _MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Удалить live-gauge воркера при остановке (по умолчанию — текущего)"""
+    if _MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
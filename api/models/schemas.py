@@ -8,6 +8,7 @@ class TaskStatus(str, Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class ProcessingResponse(BaseModel):
     task_id: str = Field(..., description="ID задачи для отслеживания статуса")
@@ -21,6 +22,70 @@ class TaskStatusResponse(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     error: Optional[str] = None
+    has_result: bool = False
+    result_size: Optional[int] = None
+    failed_files: int = 0
+    deadline_at: Optional[datetime] = None
+
+class WebhookDeliveryResponse(BaseModel):
+    id: int
+    task_id: str
+    url: str
+    event: str
+    attempt: int
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    duration_ms: int
+    delivered: bool
+    created_at: Optional[str] = None
+
+class RequestProfileResponse(BaseModel):
+    id: str
+    user_id: str
+    method: str
+    path: str
+    task_id: Optional[str] = None
+    status_code: Optional[int] = None
+    duration_ms: int
+    created_at: Optional[str] = None
+
+class LoopBlockLocation(BaseModel):
+    culprit: str
+    count: int
+    max_seconds: float
+    last_seen: float
+
+class LoopBlock(BaseModel):
+    detected_at: float
+    blocked_seconds: float
+    ongoing: bool
+    culprit: str
+    stack: List[str]
+
+class EventLoopReport(BaseModel):
+    pid: int
+    interval_seconds: float
+    block_threshold_seconds: float
+    lag_p50_seconds: float
+    lag_p99_seconds: float
+    lag_max_seconds: float
+    top_locations: List[LoopBlockLocation]
+    recent_blocks: List[LoopBlock]
+
+class GeneratedAssetResponse(BaseModel):
+    id: int
+    sku: str
+    processing_type: str
+    scene_index: int
+    source_hash: str = ""
+    suffix: str
+    content_type: str
+    source_filename: Optional[str] = None
+    main_category: Optional[str] = None
+    subcategory: Optional[str] = None
+    size_bytes: int
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
 
 class ImageResponse(BaseModel):
     filename: str
@@ -1,27 +1,96 @@
 import asyncio
 import zipfile 
 import io
-from typing import List, Tuple, Optional, Callable
+from typing import List, Tuple, Optional, Callable, Awaitable
 from fastapi import UploadFile
 from ..logging import CustomLogger
+from ..services.asset_service import AssetService
+from .. import metrics
+from .. import deadline
+from ..deadline import DeadlineExceeded
+
+class PartialFailure(Exception):
+    """
+    Файл обработан не полностью: outputs — готовые результаты [(bytes, filename)],
+    сообщение — что не удалось. Итог файла сохраняется с ошибкой (retry-failed
+    повторяет его) вместе с готовыми результатами.
+    """
+    
+    def __init__(self, message: str, outputs: List[Tuple[bytes, str]]):
+        super().__init__(message)
+        self.outputs = outputs
+
 
 class AsyncBaseProcessor:
     """Базовый асинхронный класс для обработчиков изображений"""
     
-    def __init__(self, processing_type: str):
+    def __init__(self, processing_type: str, reuse_assets: bool = False):
         self.processing_type = processing_type
         self.semaphore = asyncio.Semaphore(5)
-        self.progress_callback: Optional[Callable] = None
+        self.progress_callback: Optional[Callable[..., Awaitable[None]]] = None
+        # Отдавать готовые изображения из библиотеки по артикулу вместо повторной генерации
+        self.reuse_assets = reuse_assets
+        self.asset_service = AssetService()
     
-    def set_progress_callback(self, callback: Callable):
-        """Устанавливает callback для отслеживания прогресса"""
+    def set_progress_callback(self, callback: Callable[..., Awaitable[None]]):
+        """
+        Устанавливает callback для отслеживания прогресса.
+        
+        Вызывается как callback(progress, current, total, filename=..., error=..., outputs=...)
+        после каждого обработанного файла; outputs — результаты файла [(имя, данные)].
+        """
         self.progress_callback = callback
     
-    async def _update_progress(self, current: int, total: int):
+    async def _update_progress(self, current: int, total: int, **details):
         """Обновляет прогресс обработки"""
         if self.progress_callback:
             progress = int((current / total) * 100)
-            await self.progress_callback(progress, current, total)
+            await self.progress_callback(progress, current, total, **details)
+    
+    async def process_files(
+        self,
+        files: List[UploadFile],
+        logger: CustomLogger,
+        previous: Optional[List[List[Tuple[str, bytes]]]] = None
+    ) -> List[Tuple[str, bytes]]:
+        """
+        Последовательно обрабатывает файлы, сообщая о каждом через progress_callback.
+        После исчерпания дедлайна оставшиеся файлы не обрабатываются и завершаются
+        ошибкой (их можно повторить через retry-failed).
+        previous — сохранённые результаты каждого файла [(имя, данные)] от прошлой
+        частично неудачной обработки: готовые части не обрабатываются повторно.
+        """
+        total_files = len(files)
+        processed_files = []
+        
+        for i, file in enumerate(files):
+            error = None
+            outputs = []
+            try:
+                deadline.check(f"processing {file.filename}")
+                logger.info(f"Обработка файла {i+1}/{total_files}: {file.filename}")
+                
+                results = await self._process_file(file, previous[i] if previous else [])
+                outputs = [(filename, processed_data) for processed_data, filename in results]
+                processed_files.extend(outputs)
+                
+                logger.debug(f"Успешно обработан: {file.filename}")
+            except PartialFailure as e:
+                error = str(e)
+                outputs = [(filename, processed_data) for processed_data, filename in e.outputs]
+                processed_files.extend(outputs)
+                logger.warning(f"Файл {file.filename} обработан частично: {e}")
+            except DeadlineExceeded as e:
+                error = str(e)
+                logger.warning(f"Файл {file.filename} не обработан: {e}")
+                metrics.DEADLINE_EXCEEDED.labels(self.processing_type).inc()
+            except Exception as e:
+                error = str(e)
+                logger.error(f"Ошибка обработки файла {file.filename}: {e}")
+            
+            await self._update_progress(i + 1, total_files, filename=file.filename, error=error, outputs=outputs)
+        
+        return processed_files
     
     async def save_uploaded_file(self, file: UploadFile) -> bytes:
         """Сохраняет загруженный файл в память"""
@@ -32,13 +101,22 @@ class AsyncBaseProcessor:
         """Создает zip-архив с обработанными файлами"""
         zip_buffer = io.BytesIO()
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, file_data in processed_files:
-                zip_file.writestr(filename, file_data)
+        with metrics.observe_stage(self.processing_type, "zip"):
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for filename, file_data in processed_files:
+                    zip_file.writestr(filename, file_data)
         
         zip_buffer.seek(0)
         return zip_buffer
     
+    async def _process_file(self, file: UploadFile, previous: List[Tuple[str, bytes]]) -> List[Tuple[bytes, str]]:
+        """
+        Результаты обработки файла в пакете (по умолчанию — одно изображение;
+        previous не бывает — при ошибке результата нет)
+        """
+        # process_single всегда возвращает (bytes, filename)
+        return [await self.process_single(file)]
+    
     async def process_single(self, file: UploadFile) -> Tuple[bytes, str]:
         """Обрабатывает одно изображение"""
         raise NotImplementedError("Subclasses must implement process_single")
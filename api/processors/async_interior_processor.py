@@ -1,21 +1,80 @@
 import io
-from typing import List, Tuple
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
 from fastapi import UploadFile
 import asyncio
 from PIL import Image
 
-from .async_base import AsyncBaseProcessor
-from interior.async_ai_client import AsyncAIClient, get_product_from_sheet_by_code, extract_six_digit_code
+from .async_base import AsyncBaseProcessor, PartialFailure
+from interior.async_ai_client import AsyncAIClient, get_product_from_sheet_by_code, encode_image_url
+from interior.sku import extract_six_digit_code
 from interior.config import Config
 from ..logging import CustomLogger
+from .. import metrics
+from ..services.generation_index import Fingerprint, generation_index
+from core.config import config
 from interior.image_processor import ImageProcessor
 
+
+# Имя результата сцены при нескольких сценах: {имя}_{suffix}_scene{N}.jpg
+_SCENE_FILENAME = re.compile(r"_scene(\d+)\.jpg$")
+
+
+class ScenesFailed(Exception):
+    """Часть сцен не сгенерирована: outputs — готовые сцены [(scene_index, bytes, filename)]"""
+
+    def __init__(self, failed: List[int], outputs: List[Tuple[int, bytes, str]], error: Exception):
+        super().__init__(f"Scenes {','.join(str(scene_index) for scene_index in failed)} failed: {error}")
+        self.failed = failed
+        self.outputs = outputs
+
+
+@dataclass
+class _PreparedInput:
+    """Вход, подготовленный один раз для всех сцен: 3:4, уменьшенный под генерацию"""
+    image: Image.Image
+    generate_image_url: str
+    fingerprint: Optional[Fingerprint] = None
+
+
+@dataclass
+class _Category:
+    main_category: Optional[str] = None
+    subcategory: Optional[str] = None
+    product_name: Optional[str] = None
+    use_custom_prompt: bool = False
+
+    @property
+    def suffix(self) -> str:
+        return "processed" if self.use_custom_prompt else f"in_{self.main_category.lower()}"
+
+
+@dataclass
+class _SceneResult:
+    """Изображение одной сцены и его источник: generated, library, reused или saved"""
+    data: bytes
+    suffix: str
+    main_category: Optional[str]
+    subcategory: Optional[str]
+    source: str
+    # Имя результата, сохранённого прошлой обработкой файла (source=saved)
+    filename: Optional[str] = None
+
+
 class AsyncInteriorProcessor(AsyncBaseProcessor):
     """Асинхронный обработчик для интерьеров"""
 
-    def __init__(self):
-        super().__init__("interior")
+    def __init__(self, reuse_assets: bool = False, scenes: int = 1):
+        super().__init__("interior", reuse_assets=reuse_assets)
         self.ai_client = AsyncAIClient()
+        # Сколько сцен генерировать для каждого файла пакетной обработки (сцены 0..scenes-1)
+        self.scenes = scenes
+
+    @classmethod
+    def total_scenes(cls) -> int:
+        """Размер пула сцен: максимум из обоих — индекс подходит для обоих через %"""
+        return max(len(cls._INDOOR_ACCENTS), len(cls._OUTDOOR_ACCENTS))
 
     async def process_single(self, file: UploadFile, scene_index: int = 0) -> Tuple[bytes, str]:
         """
@@ -24,23 +83,172 @@ class AsyncInteriorProcessor(AsyncBaseProcessor):
         variant=2 — тёплый насыщенный стиль.
         Возвращает (bytes, filename) — одно изображение.
         """
+        _, processed_bytes, output_filename = (await self.process_scenes(file, [scene_index]))[0]
+        return processed_bytes, output_filename
+
+    async def _process_file(self, file: UploadFile, previous: List[Tuple[str, bytes]]) -> List[Tuple[bytes, str]]:
+        """
+        Пакетная обработка: все запрошенные сцены файла. Сцены, сохранённые прошлой
+        частично неудачной обработкой (previous), не генерируются повторно.
+        """
+        saved = {}
+        for filename, data in previous:
+            match = _SCENE_FILENAME.search(filename)
+            if match:
+                saved[int(match.group(1))] = (data, filename)
+
+        try:
+            results = await self.process_scenes(file, list(range(self.scenes)), saved)
+        except ScenesFailed as e:
+            outputs = [(processed_bytes, output_filename) for _, processed_bytes, output_filename in e.outputs]
+            raise PartialFailure(str(e), outputs) from e
+        return [(processed_bytes, output_filename) for _, processed_bytes, output_filename in results]
+
+    async def process_scenes(
+        self,
+        file: UploadFile,
+        scene_indices: Sequence[int],
+        saved: Optional[Dict[int, Tuple[bytes, str]]] = None
+    ) -> List[Tuple[int, bytes, str]]:
+        """
+        Обрабатывает изображение для нескольких сцен.
+        Декодирование, приведение к 3:4 и определение категории выполняются один раз,
+        генерации отсутствующих сцен идут параллельно. Возвращает [(scene_index, bytes, filename)]
+        в порядке scene_indices. Если не удалась часть сцен — ScenesFailed с готовыми,
+        если ни одной — исключение генерации. Для нескольких сцен к имени добавляется _scene{N}.
+        saved — готовые сцены {scene_index: (bytes, filename)}, они отдаются как есть.
+        """
         logger = CustomLogger("interior")
-        img_proc = ImageProcessor()
         processing_type_name = "interior"
+        metrics.FILES_IN_FLIGHT.labels("interior").inc()
+        failures_counted = False
         try:
-            logger.info(f"Начало обработки интерьера: {file.filename} (scene_index={scene_index})")
+            logger.info(f"Начало обработки интерьера: {file.filename} (scene_indices={list(scene_indices)})")
+
+            code = extract_six_digit_code(filename=file.filename)
+            results: Dict[int, _SceneResult] = {
+                scene_index: _SceneResult(data, "", None, None, "saved", filename)
+                for scene_index, (data, filename) in (saved or {}).items()
+                if scene_index in scene_indices
+            }
+
+            # 0. Сцены артикула, которые уже есть в библиотеке, отдаём без обработки
+            if code and self.reuse_assets:
+                for scene_index in scene_indices:
+                    if scene_index in results:
+                        continue
+                    asset = await self.asset_service.find(code, "interior", scene_index, logger)
+                    if asset:
+                        results[scene_index] = _SceneResult(
+                            asset.result_data, asset.suffix, asset.main_category, asset.subcategory, "library"
+                        )
+                        logger.info(f"{processing_type_name} | Из библиотеки по артикулу {code}: {file.filename} scene_index={scene_index}")
+
+            missing = [scene_index for scene_index in scene_indices if scene_index not in results]
+            errors: List[Exception] = []
+            if missing:
+                prepared = await self._prepare_input(file)
+
+                # 1. Почти совпадающий вход с той же сценой уже генерировался — берём готовый результат
+                if prepared.fingerprint is not None:
+                    for scene_index in missing:
+                        reused = await self._find_reusable(prepared.fingerprint, scene_index, logger)
+                        if reused:
+                            suffix = "processed" if reused.use_custom_prompt else f"in_{(reused.main_category or 'interior').lower()}"
+                            results[scene_index] = _SceneResult(
+                                reused.result_data, suffix, reused.main_category, reused.subcategory, "reused"
+                            )
+                            logger.info(
+                                f"{processing_type_name} | Переиспользована генерация #{reused.id} "
+                                f"(расстояние {reused.distance}) для {file.filename} scene_index={scene_index}"
+                            )
+                            await self._store_asset(code, scene_index, results[scene_index], file.filename, logger)
+                    missing = [scene_index for scene_index in missing if scene_index not in results]
+
+                # 2. Определяем категорию один раз и генерируем недостающие сцены параллельно
+                if missing:
+                    category = await self._categorize(file.filename, code, prepared.image, logger)
+                    logger.info(f"Категория для {file.filename}: {category.main_category} - {category.subcategory}, scene_indices={missing}")
+
+                    generated = await asyncio.gather(
+                        *(self._generate_scene(prepared, category, scene_index, logger) for scene_index in missing),
+                        return_exceptions=True,
+                    )
+                    for scene_index, outcome in zip(missing, generated):
+                        if isinstance(outcome, Exception):
+                            errors.append(outcome)
+                            logger.error(f"{processing_type_name} | Ошибка генерации {file.filename} scene_index={scene_index}: {outcome}")
+                            metrics.FILES_PROCESSED.labels("interior", "failed").inc()
+                            continue
+                        results[scene_index] = _SceneResult(
+                            outcome, category.suffix, category.main_category, category.subcategory, "generated"
+                        )
+                        await self._store_asset(code, scene_index, results[scene_index], file.filename, logger)
+                        if prepared.fingerprint is not None:
+                            await self._remember_generation(
+                                prepared.fingerprint, scene_index, outcome,
+                                category.main_category, category.subcategory, category.use_custom_prompt, logger
+                            )
+
+            if not results:
+                failures_counted = True
+                raise errors[0]
+
+            name_base = file.filename.rsplit('.', 1)[0]
+            outputs = []
+            for scene_index in scene_indices:
+                result = results.get(scene_index)
+                if result is None:
+                    continue
+                scene_part = f"_scene{scene_index}" if len(scene_indices) > 1 else ""
+                outputs.append((scene_index, result.data, result.filename or f"{name_base}_{result.suffix}{scene_part}.jpg"))
+                if result.source != "saved":
+                    metrics.FILES_PROCESSED.labels("interior", "ok" if result.source == "generated" else result.source).inc()
+                    metrics.BYTES_PRODUCED.labels("interior").inc(len(result.data))
+
+            first = next(iter(results.values()))
+            logger.info(f"{processing_type_name} | Успешно обработан: {file.filename} scene_indices={sorted(results)}")
+            logger.finish_success(
+                filename=file.filename,
+                processing_type=processing_type_name,
+                category=first.main_category,
+                subcategory=first.subcategory,
+                scenes={scene_index: result.source for scene_index, result in results.items()},
+                failed_scenes=len(errors),
+            )
+            failed = [scene_index for scene_index in scene_indices if scene_index not in results]
+            if failed:
+                raise ScenesFailed(failed, outputs, errors[0])
+            return outputs
+
+        except ScenesFailed:
+            raise
+        except Exception as e:
+            logger.error(f"{processing_type_name} | Ошибка при обработке {file.filename}: {e}")
+            logger.finish_error(processing_type=processing_type_name, error=str(e))
+            if not failures_counted:
+                metrics.FILES_PROCESSED.labels("interior", "failed").inc()
+            raise
+        finally:
+            metrics.FILES_IN_FLIGHT.labels("interior").dec()
+
+    async def _prepare_input(self, file: UploadFile) -> _PreparedInput:
+        """Читает файл, выравнивает ориентацию и приводит к 3:4 под профиль генерации"""
+        img_proc = ImageProcessor()
 
-            # 1. Читаем файл
-            image_data = await self.save_uploaded_file(file)
+        image_data = await self.save_uploaded_file(file)
+        metrics.BYTES_RECEIVED.labels("interior").inc(len(image_data))
 
-            # 2. Открываем, выравниваем ориентацию, конвертируем в RGB
-            with Image.open(io.BytesIO(image_data)) as img:
+        # Открываем, выравниваем ориентацию, конвертируем в RGB
+        with Image.open(io.BytesIO(image_data)) as img:
+            with metrics.observe_stage("interior", "decode"):
                 orientation = img_proc.get_image_orientation(img)
                 img = img_proc.apply_orientation(img, orientation)
                 if img.mode != 'RGB':
                     img = img.convert('RGB')
 
-                # 3. Форматируем в 3:4 с бордюрами
+            # Форматируем в 3:4 с бордюрами
+            with metrics.observe_stage("interior", "pad_resize"):
                 width, height = img.size
                 target_ratio = 3 / 4
                 current_ratio = width / height
@@ -52,90 +260,123 @@ class AsyncInteriorProcessor(AsyncBaseProcessor):
                     new_width = int(height * target_ratio)
                 img_3_4 = img_proc.extend_with_border_color(img, new_width, new_height)
 
-                # Ресайз до 1200px по длинной стороне — Gemini не нужно больше,
-                # меньший файл снижает нагрузку CPU и ускоряет передачу.
-                MAX_SIDE = 1200
-                w, h = img_3_4.size
-                if max(w, h) > MAX_SIDE:
-                    scale = MAX_SIDE / max(w, h)
-                    img_3_4 = img_3_4.resize(
-                        (int(w * scale), int(h * scale)),
-                        Image.LANCZOS
-                    )
+                # Профиль генерации: Gemini не нужно больше GENERATE_MAX_SIDE по длинной
+                # стороне, меньший файл снижает нагрузку CPU и ускоряет передачу.
+                img_3_4 = img_proc.fit_to_max_side(img_3_4, Config.GENERATE_MAX_SIDE)
+                generate_image_url = encode_image_url(
+                    img_proc.encode_jpeg(img_3_4, Config.GENERATE_QUALITY)
+                )
 
-                buf_3_4 = io.BytesIO()
-                img_3_4.save(buf_3_4, format="JPEG", quality=85)
-                img_3_4_bytes = buf_3_4.getvalue()
+        prepared = _PreparedInput(image=img_3_4, generate_image_url=generate_image_url)
+        if config.app.interior_dedup_enabled:
+            with metrics.observe_stage("interior", "dedup_lookup"):
+                prepared.fingerprint = Fingerprint.of(img_3_4)
+        return prepared
 
-            # 4. Определяем категорию (Google Sheets → AI fallback)
-            product_name = None
-            subcategory = None
-            main_category = None
-            use_custom_prompt = False
+    async def _categorize(self, filename: str, code: Optional[str], image: Image.Image, logger: CustomLogger) -> _Category:
+        """Определяет категорию (Google Sheets → AI fallback)"""
+        category = _Category()
 
-            code = extract_six_digit_code(filename=file.filename)
-            if code:
+        if code:
+            with metrics.observe_stage("interior", "sheet_lookup"):
                 sheet_row = await get_product_from_sheet_by_code(code, logger)
-                if sheet_row:
-                    subcategory, product_name = sheet_row
-                    use_custom_prompt = True
-                    logger.info(f"Из Google Sheets: Категория={subcategory}, Номенклатура={product_name} для кода {code}")
-                else:
-                    logger.info(f"Код {code} не найден в Google Sheets. Используется определение через AI.")
-                    async with self.semaphore:
-                        main_category, subcategory = await self.ai_client.analyze_thematic_subcategory(
-                            img_3_4_bytes, logger
-                        )
+            if sheet_row:
+                category.subcategory, category.product_name = sheet_row
+                category.use_custom_prompt = True
+                logger.info(f"Из Google Sheets: Категория={category.subcategory}, Номенклатура={category.product_name} для кода {code}")
             else:
-                logger.info("В имени файла не найден 6-значный код. Используется определение через AI.")
-                async with self.semaphore:
-                    main_category, subcategory = await self.ai_client.analyze_thematic_subcategory(
-                        img_3_4_bytes, logger
+                logger.info(f"Код {code} не найден в Google Sheets. Используется определение через AI.")
+        else:
+            logger.info("В имени файла не найден 6-значный код. Используется определение через AI.")
+
+        if not category.use_custom_prompt:
+            img_proc = ImageProcessor()
+            # Для категоризации хватает уменьшенной копии — меньше байт и токенов
+            categorize_image_url = encode_image_url(
+                img_proc.encode_jpeg(
+                    img_proc.fit_to_max_side(image, Config.CATEGORIZE_MAX_SIDE),
+                    Config.CATEGORIZE_QUALITY
+                )
+            )
+            async with metrics.semaphore_slot(self.semaphore, "interior"):
+                with metrics.observe_stage("interior", "categorize"):
+                    category.main_category, category.subcategory = await self.ai_client.analyze_thematic_subcategory(
+                        categorize_image_url, logger
                     )
+        return category
 
-            # 5. Строим промпт под нужный вариант
-            prompt = self._generate_context_prompt(
-                main_category=main_category if not use_custom_prompt else None,
-                subcategory=subcategory,
-                product_name=product_name,
-                use_custom=use_custom_prompt,
-                scene_index=scene_index,
-            )
-            logger.info(f"Категория для {file.filename}: {main_category} - {subcategory}, scene_index={scene_index}")
+    async def _generate_scene(self, prepared: _PreparedInput, category: _Category, scene_index: int, logger: CustomLogger) -> bytes:
+        """Генерирует одну сцену и обрезает результат до 3:4"""
+        img_proc = ImageProcessor()
 
-            # 6. Генерируем одно изображение
-            async with self.semaphore:
+        # Строим промпт под нужную сцену
+        prompt = self._generate_context_prompt(
+            main_category=category.main_category if not category.use_custom_prompt else None,
+            subcategory=category.subcategory,
+            product_name=category.product_name,
+            use_custom=category.use_custom_prompt,
+            scene_index=scene_index,
+        )
+
+        async with metrics.semaphore_slot(self.semaphore, "interior"):
+            with metrics.observe_stage("interior", "generate"):
                 raw_data = await self.ai_client.edit_image_with_gemini(
-                    img_3_4_bytes, prompt, logger
+                    prepared.generate_image_url, prompt, logger
                 )
 
-            if not raw_data:
-                raise Exception(f"Image generation failed for scene_index={scene_index}")
+        if not raw_data:
+            raise Exception(f"Image generation failed for scene_index={scene_index}")
 
-            # 7. Кроп до 3:4 и сохранение
+        # Кроп до 3:4 и сохранение
+        with metrics.observe_stage("interior", "crop_encode"):
             processed_image = Image.open(io.BytesIO(raw_data))
             cropped_image = img_proc.crop_to_3_4(processed_image)
             output_buffer = io.BytesIO()
             cropped_image.save(output_buffer, format="JPEG", quality=95)
-            processed_bytes = output_buffer.getvalue()
-
-            name_base = file.filename.rsplit('.', 1)[0]
-            suffix = "processed" if use_custom_prompt else f"in_{main_category.lower()}"
-            output_filename = f"{name_base}_{suffix}.jpg"
+            return output_buffer.getvalue()
+
+    async def _store_asset(self, code: Optional[str], scene_index: int, result: _SceneResult, filename: str, logger: CustomLogger) -> None:
+        """Сохранить сцену в библиотеку изображений артикула"""
+        if code:
+            await self.asset_service.store(
+                code, "interior", scene_index, result.data, result.suffix, "image/jpeg", logger,
+                source_filename=filename,
+                main_category=result.main_category,
+                subcategory=result.subcategory,
+            )
 
-            logger.info(f"{processing_type_name} | Успешно обработан: {file.filename} scene_index={scene_index}")
-            logger.finish_success(
-                filename=file.filename,
-                processing_type=processing_type_name,
-                category=main_category,
+    @staticmethod
+    async def _find_reusable(fingerprint: Fingerprint, scene_index: int, logger: CustomLogger):
+        """Поиск почти-дубликата (сбой индекса не мешает обычной генерации)"""
+        try:
+            reused = await generation_index.find(fingerprint, scene_index)
+        except Exception as e:
+            logger.warning(f"Поиск в индексе генераций не удался: {e}")
+            metrics.INTERIOR_DEDUP_LOOKUPS.labels("error").inc()
+            return None
+        metrics.INTERIOR_DEDUP_LOOKUPS.labels("hit" if reused else "miss").inc()
+        return reused
+
+    @staticmethod
+    async def _remember_generation(
+        fingerprint: Fingerprint,
+        scene_index: int,
+        processed_bytes: bytes,
+        main_category: str | None,
+        subcategory: str | None,
+        use_custom_prompt: bool,
+        logger: CustomLogger,
+    ) -> None:
+        """Сохранить генерацию в индекс (сбой сохранения не влияет на результат)"""
+        try:
+            await generation_index.add(
+                fingerprint, scene_index, processed_bytes,
+                main_category=main_category,
                 subcategory=subcategory,
+                use_custom_prompt=use_custom_prompt,
             )
-            return processed_bytes, output_filename
-
         except Exception as e:
-            logger.error(f"{processing_type_name} | Ошибка при обработке {file.filename}: {e}")
-            logger.finish_error(processing_type=processing_type_name, error=str(e))
-            raise
+            logger.warning(f"Не удалось сохранить генерацию в индекс: {e}")
 
     # ── Цветовые акценты освещения ───────────────────────────────────────────
     # Для интерьерных товаров — варьируется характер света.
@@ -5,37 +5,74 @@ import asyncio
 
 from .async_base import AsyncBaseProcessor
 from white.async_pixian_client import AsyncPixianClient
+from white.config import Config
+from white.image_preprocessor import ImagePreprocessor
+from interior.sku import extract_six_digit_code
+from ..services.asset_service import hash_source
 from ..logging import CustomLogger
+from .. import metrics
 
 class AsyncWhiteProcessor(AsyncBaseProcessor):
     """Асинхронный обработчик для белого фона"""
     
-    def __init__(self):
-        super().__init__("white")
+    # Окончание имени выходного файла
+    _SUFFIX = "white_test"
+    
+    def __init__(self, reuse_assets: bool = False):
+        super().__init__("white", reuse_assets=reuse_assets)
         self.pixian_client = AsyncPixianClient()
     
     async def process_single(self, file: UploadFile) -> Tuple[bytes, str]:
         """Обрабатывает одно изображение"""
         logger = CustomLogger("white")
         processing_type_name = "white_background"
+        metrics.FILES_IN_FLIGHT.labels("white").inc()
 
         try:
             logger.info(f"Начало обработки белого фона: {file.filename}")
             
             # Читаем файл
             image_data = await self.save_uploaded_file(file)
+            metrics.BYTES_RECEIVED.labels("white").inc(len(image_data))
+            
+            # Вырезка зависит от фотографии: у артикула их может быть несколько
+            sku = extract_six_digit_code(filename=file.filename)
+            input_hash = hash_source(image_data) if sku else ""
+            if sku and self.reuse_assets:
+                asset = await self.asset_service.find(sku, "white", 0, logger, source_hash=input_hash)
+                if asset:
+                    output_filename = f"{file.filename.split('.')[0]}_{asset.suffix}.png"
+                    logger.info(f"{processing_type_name} | Из библиотеки по артикулу {sku}: {file.filename}")
+                    logger.finish_success(
+                        filename=file.filename,
+                        processing_type=processing_type_name,
+                        processed_filename=output_filename,
+                        asset_id=asset.id,
+                    )
+                    metrics.FILES_PROCESSED.labels("white", "library").inc()
+                    return asset.result_data, output_filename
+            
+            with metrics.observe_stage("white", "preprocess"):
+                image_data, content_type = await self._prepare_for_upload(image_data, file.filename, logger)
             
             # Обрабатываем с ограничением параллелизма
-            async with self.semaphore:
-                success, processed_data, error_msg = await self.pixian_client.remove_background(
-                    image_data, logger
-                )
+            async with metrics.semaphore_slot(self.semaphore, "white"):
+                with metrics.observe_stage("white", "pixian"):
+                    success, processed_data, error_msg = await self.pixian_client.remove_background(
+                        image_data, logger, content_type=content_type
+                    )
             
             if not success:
                 logger.error(f"Ошибка обработки {file.filename}: {error_msg}")
                 raise Exception(f"Processing failed: {error_msg}")
             
-            output_filename = f"{file.filename.split('.')[0]}_white_test.png"
+            if sku:
+                await self.asset_service.store(
+                    sku, "white", 0, processed_data, self._SUFFIX, "image/png", logger,
+                    source_filename=file.filename, source_hash=input_hash,
+                )
+            
+            output_filename = f"{file.filename.split('.')[0]}_{self._SUFFIX}.png"
             logger.info(f"{processing_type_name} | Успешно обработан: {file.filename}")
             logger.finish_success(
                 filename=file.filename,
@@ -43,6 +80,8 @@ class AsyncWhiteProcessor(AsyncBaseProcessor):
                 processed_filename=output_filename
 
             )
+            metrics.FILES_PROCESSED.labels("white", "ok").inc()
+            metrics.BYTES_PRODUCED.labels("white").inc(len(processed_data))
             
             return processed_data, output_filename
             
@@ -52,7 +91,29 @@ class AsyncWhiteProcessor(AsyncBaseProcessor):
                 processing_type=processing_type_name,
                 error=str(e)
             )
+            metrics.FILES_PROCESSED.labels("white", "failed").inc()
             raise
+        finally:
+            metrics.FILES_IN_FLIGHT.labels("white").dec()
+    
+    async def _prepare_for_upload(self, image_data: bytes, filename: str, logger: CustomLogger) -> Tuple[bytes, str]:
+        """Уменьшает и перекодирует изображение перед отправкой в Pixian"""
+        if not Config.PREPROCESS:
+            return image_data, "image/jpeg"
+        
+        try:
+            prepared, content_type = await asyncio.to_thread(
+                ImagePreprocessor.prepare_for_upload,
+                image_data,
+                Config.TARGET_SIZE,
+                Config.UPLOAD_QUALITY
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить {filename} к загрузке, отправляется оригинал: {e}")
+            return image_data, "image/jpeg"
+        
+        logger.debug(f"Подготовка {filename}: {len(image_data)} -> {len(prepared)} байт ({content_type})")
+        return prepared, content_type
     
     async def process_batch(self, files: List[UploadFile]) -> io.BytesIO:
         """Обрабатывает батч файлов"""
@@ -0,0 +1,154 @@
+"""
+Профилирование отдельных запросов по требованию администратора.
+
+Запрос с заголовком `X-Profile: 1` (или параметром `?profile=1`) от администратора
+выполняется под сэмплирующим профайлером pyinstrument в async-режиме: время
+ожидания в await учитывается в стеке корутины, которая ждёт. Профиль снимается
+до завершения фоновых задач запроса (BackgroundTasks выполняются внутри ответа),
+поэтому для /processing/parallel в него попадает и обработка файлов.
+ID профиля возвращается в заголовке `X-Profile-Id`; выгрузки в форматах
+speedscope и collapsed stacks доступны через /api/v1/admin/profiles.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.config import config
+from api.repositories import AsyncProfileRepository, AsyncUserRepository
+from api.services.auth_service import AsyncAuthService
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт JSON-ответа читать в поисках task_id
+_MAX_CAPTURED_BODY = 4096
+
+
+def _profile_requested(scope: Scope) -> bool:
+    if Headers(scope=scope).get("x-profile", "").lower() in ("1", "true"):
+        return True
+    return QueryParams(scope.get("query_string", b"")).get("profile", "").lower() in ("1", "true")
+
+
+async def _admin_id(scope: Scope) -> Optional[UUID]:
+    """ID пользователя, если запрос сделан администратором"""
+    try:
+        user_id = UUID(Headers(scope=scope).get("x-user-id", ""))
+    except ValueError:
+        return None
+    
+    user = await AsyncAuthService(user_repo=AsyncUserRepository()).verify_user(user_id)
+    if not user or not user.get("is_admin"):
+        return None
+    return user_id
+
+
+def _frame_label(frame: Any) -> str:
+    label = frame.function or frame.identifier
+    if frame.file_path_short:
+        label = f"{label} ({frame.file_path_short}:{frame.line_no})"
+    # ';' разделяет кадры в collapsed stacks
+    return label.replace(";", ":")
+
+
+def render_collapsed(session: Any) -> str:
+    """Collapsed stacks (формат flamegraph.pl): "кадр;кадр;кадр вес_в_мкс" на строку"""
+    root = session.root_frame()
+    if root is None:
+        return ""
+    
+    lines: List[str] = []
+    stack: List[Tuple[Any, List[str]]] = [(root, [])]
+    while stack:
+        frame, path = stack.pop()
+        path = path + [_frame_label(frame)]
+        self_time = frame.time - sum(child.time for child in frame.children)
+        weight = round(self_time * 1_000_000)
+        if weight > 0:
+            lines.append(f"{';'.join(path)} {weight}")
+        stack.extend((child, path) for child in frame.children)
+    
+    return "\n".join(lines) + "\n"
+
+
+def render_speedscope(session: Any) -> bytes:
+    from pyinstrument.renderers import SpeedscopeRenderer
+    return SpeedscopeRenderer().render(session).encode("utf-8")
+
+
+def _task_id_from_body(body: bytes) -> Optional[str]:
+    try:
+        task_id = json.loads(body).get("task_id")
+    except (ValueError, AttributeError):
+        return None
+    return task_id if isinstance(task_id, str) else None
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware: профилирует запросы администратора с флагом профилирования"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not config.app.profiling_enabled or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+        
+        user_id = await _admin_id(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+        
+        # pyinstrument импортируется только при профилировании
+        from pyinstrument import Profiler
+        
+        profile_id = str(uuid.uuid4())
+        response = {"status_code": None, "is_json": False, "body": b""}
+        
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status_code"] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Profile-Id", profile_id)
+                response["is_json"] = headers.get("content-type", "").startswith("application/json")
+            elif message["type"] == "http.response.body" and response["is_json"]:
+                if len(response["body"]) < _MAX_CAPTURED_BODY:
+                    response["body"] += message.get("body", b"")[:_MAX_CAPTURED_BODY]
+            await send(message)
+        
+        profiler = Profiler(interval=config.app.profile_interval_seconds, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            await self._store(profile_id, user_id, scope, session, duration_ms, response)
+    
+    @staticmethod
+    async def _store(profile_id: str, user_id: UUID, scope: Scope, session: Any, duration_ms: int, response: dict) -> None:
+        """Сохранить профиль (сбой сохранения не влияет на запрос)"""
+        try:
+            speedscope, collapsed = await asyncio.to_thread(
+                lambda: (render_speedscope(session), render_collapsed(session))
+            )
+            await AsyncProfileRepository.save(
+                profile_id=profile_id,
+                user_id=user_id,
+                method=scope["method"],
+                path=scope["path"],
+                status_code=response["status_code"],
+                task_id=_task_id_from_body(response["body"]) if response["body"] else None,
+                duration_ms=duration_ms,
+                speedscope=speedscope,
+                collapsed=collapsed,
+            )
+            logger.info(f"Saved profile {profile_id} for {scope['method']} {scope['path']} ({duration_ms} ms)")
+        except Exception as e:
+            logger.error(f"Failed to store profile {profile_id}: {e}")
@@ -1,9 +1,26 @@
 """
 Репозитории для работы с БД
 """
-from .user_repo import UserRepository
-from .task_repo import TaskRepository
-from .category_repo import CategoryRepository
+from .user_repo import UserRepository, AsyncUserRepository
+from .task_repo import TaskRepository, AsyncTaskRepository
+from .task_file_repo import AsyncTaskFileRepository
+from .category_repo import CategoryRepository, AsyncCategoryRepository
+from .webhook_repo import AsyncWebhookDeliveryRepository
+from .profile_repo import AsyncProfileRepository
+from .generation_repo import AsyncGenerationRepository
+from .asset_repo import AsyncAssetRepository
 
-__all__ = ["UserRepository", "TaskRepository", "CategoryRepository"]
+__all__ = [
+    "UserRepository",
+    "TaskRepository",
+    "CategoryRepository",
+    "AsyncUserRepository",
+    "AsyncTaskRepository",
+    "AsyncTaskFileRepository",
+    "AsyncCategoryRepository",
+    "AsyncWebhookDeliveryRepository",
+    "AsyncProfileRepository",
+    "AsyncGenerationRepository",
+    "AsyncAssetRepository",
+]
 
@@ -0,0 +1,114 @@
+"""
+Репозиторий библиотеки сгенерированных изображений
+"""
+from typing import List, Optional
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import undefer
+from database.models import GeneratedAsset
+from database.db_session import get_async_db, get_async_read_db
+
+
+class AsyncAssetRepository:
+    """Асинхронный репозиторий библиотеки изображений (asyncpg)"""
+    
+    @staticmethod
+    async def upsert(
+        sku: str,
+        processing_type: str,
+        scene_index: int,
+        suffix: str,
+        content_type: str,
+        result_data: bytes,
+        source_filename: Optional[str] = None,
+        main_category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        source_hash: str = ""
+    ) -> int:
+        """Сохранить изображение (повторная генерация заменяет прежнюю), вернуть ID"""
+        now = datetime.now(timezone.utc)
+        values = dict(
+            suffix=suffix,
+            content_type=content_type,
+            source_filename=source_filename,
+            main_category=main_category,
+            subcategory=subcategory,
+            size_bytes=len(result_data),
+            result_data=result_data,
+            updated_at=now,
+        )
+        statement = insert(GeneratedAsset).values(
+            sku=sku,
+            processing_type=processing_type,
+            scene_index=scene_index,
+            source_hash=source_hash,
+            created_at=now,
+            **values
+        )
+        statement = statement.on_conflict_do_update(
+            constraint="uq_generated_assets_key",
+            set_=values,
+        ).returning(GeneratedAsset.id)
+        
+        async with get_async_db() as db:
+            return (await db.execute(statement)).scalar_one()
+    
+    @staticmethod
+    async def get(
+        sku: str,
+        processing_type: str,
+        scene_index: int,
+        source_hash: Optional[str] = None
+    ) -> Optional[GeneratedAsset]:
+        """
+        Изображение по артикулу, типу обработки и сцене.
+        Без source_hash — последнее обновлённое среди фото артикула.
+        """
+        query = (
+            select(GeneratedAsset)
+            .options(undefer(GeneratedAsset.result_data))
+            .where(
+                GeneratedAsset.sku == sku,
+                GeneratedAsset.processing_type == processing_type,
+                GeneratedAsset.scene_index == scene_index,
+            )
+            .order_by(GeneratedAsset.updated_at.desc())
+            .limit(1)
+        )
+        if source_hash is not None:
+            query = query.where(GeneratedAsset.source_hash == source_hash)
+        
+        async with get_async_read_db() as db:
+            asset = (await db.execute(query)).scalar_one_or_none()
+            if asset:
+                db.expunge(asset)
+            return asset
+    
+    @staticmethod
+    async def list_by_sku(sku: str, processing_type: Optional[str] = None) -> List[GeneratedAsset]:
+        """Изображения артикула без данных"""
+        query = (
+            select(GeneratedAsset)
+            .where(GeneratedAsset.sku == sku)
+            .order_by(GeneratedAsset.processing_type, GeneratedAsset.scene_index, GeneratedAsset.updated_at)
+        )
+        if processing_type:
+            query = query.where(GeneratedAsset.processing_type == processing_type)
+        
+        async with get_async_read_db() as db:
+            assets = (await db.execute(query)).scalars().all()
+            for asset in assets:
+                db.expunge(asset)
+            return list(assets)
+    
+    @staticmethod
+    async def delete_by_sku(sku: str, processing_type: Optional[str] = None) -> int:
+        """Удалить изображения артикула (например, неудачные генерации)"""
+        statement = delete(GeneratedAsset).where(GeneratedAsset.sku == sku)
+        if processing_type:
+            statement = statement.where(GeneratedAsset.processing_type == processing_type)
+        
+        async with get_async_db() as db:
+            result = await db.execute(statement.execution_options(synchronize_session=False))
+            return result.rowcount
@@ -2,8 +2,9 @@
 Репозиторий для работы с тематическими категориями
 """
 from typing import Dict, List
-from database.models import ThematicCategory
-from database.db_session import get_db
+from sqlalchemy import select
+from database.models import ThematicCategory, CategoryVersion
+from database.db_session import get_db, get_async_read_db
 
 
 class CategoryRepository:
@@ -33,6 +34,12 @@ class CategoryRepository:
             
             return {cat.subcategory: cat.description for cat in categories}
     
+    @staticmethod
+    def get_version() -> int:
+        """Текущая версия справочника категорий (0, если строки версии нет)"""
+        with get_db() as db:
+            return db.execute(select(CategoryVersion.version).where(CategoryVersion.id == 1)).scalar() or 0
+    
     @staticmethod
     def create(main_category: str, subcategory: str, description: str) -> ThematicCategory:
         """Создать новую категорию"""
@@ -47,3 +54,26 @@ class CategoryRepository:
             db.refresh(category)
             return category
 
+
+class AsyncCategoryRepository:
+    """Асинхронный репозиторий для работы с категориями (asyncpg)"""
+    
+    @staticmethod
+    async def get_all() -> Dict[str, Dict[str, str]]:
+        """Получить все категории в формате {main_category: {subcategory: description}}"""
+        async with get_async_read_db() as db:
+            categories = (await db.execute(select(ThematicCategory))).scalars().all()
+            
+            result = {}
+            for cat in categories:
+                result.setdefault(cat.main_category, {})[cat.subcategory] = cat.description
+            
+            return result
+    
+    @staticmethod
+    async def get_version() -> int:
+        """Текущая версия справочника категорий (0, если строки версии нет)"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(CategoryVersion.version).where(CategoryVersion.id == 1)
+            )).scalar() or 0
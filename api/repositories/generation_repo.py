@@ -0,0 +1,80 @@
+"""
+Репозиторий результатов генерации интерьеров (индекс почти-дубликатов)
+"""
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, select, delete
+from sqlalchemy.orm import undefer
+from database.models import InteriorGeneration
+from database.db_session import get_async_db, get_async_read_db
+
+
+class AsyncGenerationRepository:
+    """Асинхронный репозиторий результатов генерации (asyncpg)"""
+    
+    @staticmethod
+    async def add(
+        dhash: int,
+        color: int,
+        scene_index: int,
+        result_data: bytes,
+        main_category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        use_custom_prompt: bool = False
+    ) -> int:
+        """Сохранить результат генерации, вернуть его ID"""
+        async with get_async_db() as db:
+            result = await db.execute(
+                insert(InteriorGeneration).values(
+                    dhash=dhash,
+                    color=color,
+                    scene_index=scene_index,
+                    main_category=main_category,
+                    subcategory=subcategory,
+                    use_custom_prompt=use_custom_prompt,
+                    result_data=result_data,
+                    created_at=datetime.now(timezone.utc),
+                ).returning(InteriorGeneration.id)
+            )
+            return result.scalar_one()
+    
+    @staticmethod
+    async def list_since(last_id: int) -> List[Tuple[int, int, int, int]]:
+        """Хэши записей с ID больше last_id: (id, dhash, color, scene_index)"""
+        async with get_async_read_db() as db:
+            result = await db.execute(
+                select(
+                    InteriorGeneration.id,
+                    InteriorGeneration.dhash,
+                    InteriorGeneration.color,
+                    InteriorGeneration.scene_index,
+                )
+                .where(InteriorGeneration.id > last_id)
+                .order_by(InteriorGeneration.id)
+            )
+            return [tuple(row) for row in result.all()]
+    
+    @staticmethod
+    async def get(generation_id: int) -> Optional[InteriorGeneration]:
+        """Запись вместе с изображением"""
+        async with get_async_read_db() as db:
+            generation = (await db.execute(
+                select(InteriorGeneration)
+                .options(undefer(InteriorGeneration.result_data))
+                .where(InteriorGeneration.id == generation_id)
+            )).scalar_one_or_none()
+            if generation:
+                db.expunge(generation)
+            return generation
+    
+    @staticmethod
+    async def cleanup_old(max_age_hours: int) -> int:
+        """Удалить старые результаты генерации"""
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        async with get_async_db() as db:
+            result = await db.execute(
+                delete(InteriorGeneration)
+                .where(InteriorGeneration.created_at < cutoff_time)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount
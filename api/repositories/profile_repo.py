@@ -0,0 +1,81 @@
+"""
+Репозиторий профилей запросов
+"""
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+from sqlalchemy import insert, select, delete
+from database.models import RequestProfile
+from database.db_session import get_async_db, get_async_read_db
+
+
+class AsyncProfileRepository:
+    """Асинхронный репозиторий профилей запросов (asyncpg)"""
+    
+    @staticmethod
+    async def save(
+        profile_id: str,
+        user_id: UUID,
+        method: str,
+        path: str,
+        duration_ms: int,
+        speedscope: bytes,
+        collapsed: str,
+        status_code: Optional[int] = None,
+        task_id: Optional[str] = None
+    ) -> None:
+        """Сохранить профиль"""
+        async with get_async_db() as db:
+            await db.execute(insert(RequestProfile).values(
+                id=profile_id,
+                user_id=user_id,
+                method=method,
+                path=path,
+                task_id=task_id,
+                status_code=status_code,
+                duration_ms=duration_ms,
+                speedscope=speedscope,
+                collapsed=collapsed,
+                created_at=datetime.now(timezone.utc),
+            ))
+    
+    @staticmethod
+    async def list_recent(limit: int = 50, task_id: Optional[str] = None) -> List[RequestProfile]:
+        """Последние профили без выгрузок"""
+        query = select(RequestProfile).order_by(RequestProfile.created_at.desc()).limit(limit)
+        if task_id:
+            query = query.where(RequestProfile.task_id == task_id)
+        
+        async with get_async_read_db() as db:
+            profiles = (await db.execute(query)).scalars().all()
+            for profile in profiles:
+                db.expunge(profile)
+            return list(profiles)
+    
+    @staticmethod
+    async def get_speedscope(profile_id: str) -> Optional[bytes]:
+        """Профиль в формате speedscope (JSON)"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(RequestProfile.speedscope).where(RequestProfile.id == profile_id)
+            )).scalar_one_or_none()
+    
+    @staticmethod
+    async def get_collapsed(profile_id: str) -> Optional[str]:
+        """Профиль в формате collapsed stacks (для flamegraph.pl / speedscope)"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(RequestProfile.collapsed).where(RequestProfile.id == profile_id)
+            )).scalar_one_or_none()
+    
+    @staticmethod
+    async def cleanup_old(max_age_hours: int) -> int:
+        """Удалить старые профили"""
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        async with get_async_db() as db:
+            result = await db.execute(
+                delete(RequestProfile)
+                .where(RequestProfile.created_at < cutoff_time)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount
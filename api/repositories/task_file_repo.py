@@ -0,0 +1,151 @@
+"""
+Репозиторий файлов задач: входы и результаты обработки по каждому файлу
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, delete, insert, func
+from database.models import Task, TaskFile, TaskFileResult
+from database.db_session import get_async_db, get_async_read_db
+
+# Статусы задачи, после которых можно повторить обработку файлов с ошибкой
+_FINAL_STATUSES = ("completed", "failed", "cancelled")
+# Статусы задачи, в которых воркер сохраняет итоги файлов
+_ACTIVE_STATUSES = ("pending", "processing")
+
+
+class AsyncTaskFileRepository:
+    """Асинхронный репозиторий файлов задач (asyncpg)"""
+    
+    @staticmethod
+    async def has_files(task_id: str) -> bool:
+        """Сохранены ли файлы задачи (задачи, созданные до чекпоинтов, их не имеют)"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(TaskFile.file_index).where(TaskFile.task_id == task_id).limit(1)
+            )).first() is not None
+    
+    @staticmethod
+    async def list_pending(task_id: str) -> List[Tuple[int, str]]:
+        """Необработанные файлы задачи: (индекс, имя) по порядку"""
+        async with get_async_read_db() as db:
+            rows = (await db.execute(
+                select(TaskFile.file_index, TaskFile.filename)
+                .where(TaskFile.task_id == task_id, TaskFile.status == "pending")
+                .order_by(TaskFile.file_index)
+            )).all()
+            return [(row.file_index, row.filename) for row in rows]
+    
+    @staticmethod
+    async def get_input(task_id: str, file_index: int) -> Optional[bytes]:
+        """Входной файл задачи"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(TaskFile.input_data).where(TaskFile.task_id == task_id, TaskFile.file_index == file_index)
+            )).scalar_one_or_none()
+    
+    @staticmethod
+    async def save_outcome(
+        task_id: str,
+        file_index: int,
+        worker_id: str,
+        outputs: List[Tuple[str, bytes]],
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Сохранить итог обработки файла: результаты или ошибку.
+        Вход успешно обработанного файла удаляется. Сохраняет только воркер,
+        владеющий незавершённой задачей; False — задачу подхватил другой воркер
+        или она отменена.
+        """
+        values = {"status": "failed" if error else "completed", "error": error, "updated_at": datetime.now(timezone.utc)}
+        if not error:
+            values["input_data"] = None
+        owned = select(Task.id).where(
+            Task.id == task_id, Task.worker_id == worker_id, Task.status.in_(_ACTIVE_STATUSES)
+        ).exists()
+        
+        async with get_async_db() as db:
+            result = await db.execute(
+                update(TaskFile)
+                .where(TaskFile.task_id == task_id, TaskFile.file_index == file_index, owned)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                return False
+            
+            await db.execute(
+                delete(TaskFileResult)
+                .where(TaskFileResult.task_id == task_id, TaskFileResult.file_index == file_index)
+                .execution_options(synchronize_session=False)
+            )
+            if outputs:
+                await db.execute(insert(TaskFileResult), [
+                    {"task_id": task_id, "file_index": file_index, "position": position, "filename": filename, "result_data": data}
+                    for position, (filename, data) in enumerate(outputs)
+                ])
+            return True
+    
+    @staticmethod
+    async def get_results(task_id: str) -> List[Tuple[str, bytes]]:
+        """Результаты всех обработанных файлов задачи: (имя, данные) по порядку файлов"""
+        async with get_async_read_db() as db:
+            rows = (await db.execute(
+                select(TaskFileResult.filename, TaskFileResult.result_data)
+                .where(TaskFileResult.task_id == task_id)
+                .order_by(TaskFileResult.file_index, TaskFileResult.position)
+            )).all()
+            return [(row.filename, row.result_data) for row in rows]
+    
+    @staticmethod
+    async def get_file_results(task_id: str, file_indices: List[int]) -> Dict[int, List[Tuple[str, bytes]]]:
+        """Сохранённые результаты файлов задачи: {индекс: [(имя, данные)]} (у частично обработанных файлов)"""
+        async with get_async_read_db() as db:
+            rows = (await db.execute(
+                select(TaskFileResult.file_index, TaskFileResult.filename, TaskFileResult.result_data)
+                .where(TaskFileResult.task_id == task_id, TaskFileResult.file_index.in_(file_indices))
+                .order_by(TaskFileResult.file_index, TaskFileResult.position)
+            )).all()
+            results: Dict[int, List[Tuple[str, bytes]]] = {}
+            for row in rows:
+                results.setdefault(row.file_index, []).append((row.filename, row.result_data))
+            return results
+    
+    @staticmethod
+    async def reopen_failed(task_id: str, deadline_seconds: Optional[int] = None) -> Optional[int]:
+        """
+        Вернуть завершённую задачу в очередь для повторной обработки файлов с ошибкой
+        (и файлов, до которых обработка не дошла). Возвращает число файлов к обработке
+        или None, если задача не найдена или ещё выполняется. При 0 задача не меняется.
+        Прежний дедлайн задачи заменяется новым (deadline_seconds от текущего момента) или снимается.
+        """
+        now = datetime.now(timezone.utc)
+        deadline_at = now + timedelta(seconds=deadline_seconds) if deadline_seconds else None
+        async with get_async_db() as db:
+            reopened = (await db.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.status.in_(_FINAL_STATUSES))
+                .values(
+                    status="pending", error=None, end_time=None, worker_id=None,
+                    heartbeat_at=now, resume_count=0, deadline_at=deadline_at
+                )
+                .returning(Task.id)
+                .execution_options(synchronize_session=False)
+            )).first()
+            if reopened is None:
+                return None
+            
+            await db.execute(
+                update(TaskFile)
+                .where(TaskFile.task_id == task_id, TaskFile.status == "failed")
+                .values(status="pending", error=None, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            pending = (await db.execute(
+                select(func.count())
+                .select_from(TaskFile)
+                .where(TaskFile.task_id == task_id, TaskFile.status == "pending")
+            )).scalar_one()
+            if pending == 0:
+                await db.rollback()
+            return pending
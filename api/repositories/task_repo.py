@@ -1,12 +1,129 @@
 """
 Репозиторий для работы с задачами
 """
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
 from uuid import UUID
 import uuid
 from datetime import datetime, timedelta, timezone
-from database.models import Task
-from database.db_session import get_db
+from sqlalchemy import insert, update, delete, select, func, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database.models import Task, TaskFile, MaintenanceRun
+from database.db_session import get_engine, get_db, get_read_db, get_async_db, get_async_read_db
+
+# Колонки, которые возвращаются из UPDATE ... RETURNING (без result_data)
+_TASK_COLUMNS = (
+    Task.id,
+    Task.status,
+    Task.white_bg,
+    Task.progress,
+    Task.processed_files,
+    Task.total_files,
+    Task.start_time,
+    Task.end_time,
+    Task.error,
+    Task.callback_url,
+    Task.reuse_assets,
+    Task.scenes,
+    Task.worker_id,
+    Task.heartbeat_at,
+    Task.resume_count,
+    Task.deadline_at,
+)
+
+_UPDATABLE_FIELDS = {column.key for column in _TASK_COLUMNS} - {"id"}
+
+# Имя работы очистки в maintenance_runs: за интервал её выполняет один воркер кластера
+_CLEANUP_JOB = "task_cleanup"
+
+# Статусы задач, которые обрабатываются воркером (и должны отмечаться heartbeat)
+_ACTIVE_STATUSES = ("pending", "processing")
+
+
+def _task_from_row(row) -> Optional[Task]:
+    """Собрать отсоединённый Task из строки RETURNING"""
+    return Task(**row._mapping) if row else None
+
+
+def _status_query(task_id: str):
+    """SELECT статуса задачи без result_data"""
+    failed_files = (
+        select(func.count())
+        .select_from(TaskFile)
+        .where(TaskFile.task_id == Task.id, TaskFile.status == "failed")
+        .correlate(Task)
+        .scalar_subquery()
+    )
+    return select(
+        *_TASK_COLUMNS,
+        Task.result_data.isnot(None).label("has_result"),
+        func.octet_length(Task.result_data).label("result_size"),
+        failed_files.label("failed_files"),
+    ).where(Task.id == task_id)
+
+
+def _new_task_values(
+    white_bg: bool,
+    total_files: int,
+    callback_url: Optional[str] = None,
+    reuse_assets: bool = False,
+    scenes: int = 1,
+    deadline_seconds: Optional[int] = None
+) -> dict:
+    """Значения новой задачи (deadline_seconds — дедлайн от момента создания)"""
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "white_bg": white_bg,
+        "total_files": total_files,
+        "callback_url": callback_url,
+        "reuse_assets": reuse_assets,
+        "scenes": scenes,
+        "status": "pending",
+        "progress": 0,
+        "processed_files": 0,
+        "start_time": now,
+        "heartbeat_at": now,
+        "resume_count": 0,
+        "deadline_at": now + timedelta(seconds=deadline_seconds) if deadline_seconds else None,
+    }
+
+
+def _owned_by(worker_id: str):
+    """Задача не завершена и не захвачена другим воркером"""
+    return and_(
+        Task.status.in_(_ACTIVE_STATUSES),
+        or_(Task.worker_id.is_(None), Task.worker_id == worker_id),
+    )
+
+
+def _update_returning_query(task_id: str, values: dict):
+    """UPDATE ... RETURNING по явным колонкам"""
+    return (
+        update(Task)
+        .where(Task.id == task_id)
+        .values(**values)
+        .returning(*_TASK_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_query(task_id: str):
+    """DELETE задачи по ID"""
+    return (
+        delete(Task)
+        .where(Task.id == task_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _result_values() -> dict:
+    """Поля, обновляемые вместе с результатом"""
+    return {"status": "completed", "progress": 100, "end_time": datetime.now(timezone.utc)}
+
+
+def _error_values(error: str) -> dict:
+    """Поля, обновляемые при ошибке"""
+    return {"error": error, "status": "failed", "end_time": datetime.now(timezone.utc)}
 
 
 class TaskRepository:
@@ -15,105 +132,287 @@ class TaskRepository:
     @staticmethod
     def get_by_id(task_id: str) -> Optional[Task]:
         """Получить задачу по ID"""
-        with get_db() as db:
+        with get_read_db() as db:
             task = db.query(Task).filter(Task.id == task_id).first()
             if task:
                 db.expunge(task)
             return task
     
     @staticmethod
-    def create(white_bg: bool, total_files: int) -> Task:
+    def get_status(task_id: str) -> Optional[dict]:
+        """Получить статус задачи без загрузки result_data"""
+        with get_read_db() as db:
+            row = db.execute(_status_query(task_id)).first()
+            return dict(row._mapping) if row else None
+    
+    @staticmethod
+    def get_result(task_id: str) -> Optional[bytes]:
+        """Получить архив результата задачи"""
+        with get_read_db() as db:
+            return db.execute(
+                select(Task.result_data).where(Task.id == task_id)
+            ).scalar_one_or_none()
+    
+    @staticmethod
+    def create(white_bg: bool, total_files: int, callback_url: Optional[str] = None, reuse_assets: bool = False, scenes: int = 1) -> Task:
         """Создать новую задачу"""
+        values = _new_task_values(white_bg, total_files, callback_url, reuse_assets, scenes)
+        
         with get_db() as db:
-            task = Task(
-                id=str(uuid.uuid4()),
-                white_bg=white_bg,
-                total_files=total_files,
-                status="pending",
-                progress=0,
-                processed_files=0,
-                start_time=datetime.now(timezone.utc)
-            )
-            db.add(task)
-            db.commit()
-            db.refresh(task)
-            db.expunge(task)
-            return task
+            db.execute(insert(Task).values(**values))
+        
+        return Task(**values)
+    
+    @staticmethod
+    def _update_returning(task_id: str, values: dict) -> Optional[Task]:
+        """UPDATE ... RETURNING одним запросом"""
+        with get_db() as db:
+            return _task_from_row(db.execute(_update_returning_query(task_id, values)).first())
     
     @staticmethod
     def update(task_id: str, **kwargs) -> Optional[Task]:
         """Обновить задачу"""
-        with get_db() as db:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if not task:
-                return None
-            
-            for key, value in kwargs.items():
-                if hasattr(task, key) and key != "result_data":
-                    setattr(task, key, value)
-            
-            db.commit()
-            db.refresh(task)
-            db.expunge(task)
-            return task
+        values = {key: value for key, value in kwargs.items() if key in _UPDATABLE_FIELDS}
+        if not values:
+            return TaskRepository.get_by_id(task_id)
+        
+        return TaskRepository._update_returning(task_id, values)
     
     @staticmethod
     def set_result(task_id: str, result_data: bytes) -> Optional[Task]:
-        """Установить результат задачи"""
-        with get_db() as db:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if not task:
-                return None
-            
-            task.result_data = result_data
-            task.end_time = datetime.now(timezone.utc)
-            db.commit()
-            db.refresh(task)
-            db.expunge(task)
-            return task
+        """Установить результат и завершить задачу"""
+        return TaskRepository._update_returning(task_id, {"result_data": result_data, **_result_values()})
     
     @staticmethod
     def set_error(task_id: str, error: str) -> Optional[Task]:
         """Установить ошибку задачи"""
-        with get_db() as db:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if not task:
-                return None
-            
-            task.error = error
-            task.status = "failed"
-            task.end_time = datetime.now(timezone.utc)
-            db.commit()
-            db.refresh(task)
-            db.expunge(task)
-            return task
+        return TaskRepository._update_returning(task_id, _error_values(error))
     
     @staticmethod
     def delete(task_id: str) -> bool:
         """Удалить задачу"""
         with get_db() as db:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            if not task:
-                return False
-            
-            db.delete(task)
-            db.commit()
-            return True
+            return db.execute(_delete_query(task_id)).rowcount > 0
     
     @staticmethod
-    def cleanup_old(max_age_hours: int = 24) -> int:
-        """Очистить старые задачи, возвращает количество удаленных"""
-        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    def claim_cleanup(interval_hours: float) -> Optional[datetime]:
+        """
+        Занять запуск очистки на интервал: отметить время запуска, если с прошлого
+        прошло не меньше interval_hours. Возвращает отмеченное время; None — очистку
+        уже выполнил другой воркер.
+        """
+        now = func.now()
+        statement = pg_insert(MaintenanceRun).values(job=_CLEANUP_JOB, last_run_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[MaintenanceRun.job],
+            set_={"last_run_at": now},
+            where=MaintenanceRun.last_run_at <= now - timedelta(hours=interval_hours),
+        ).returning(MaintenanceRun.last_run_at)
         
         with get_db() as db:
-            old_tasks = db.query(Task).filter(
-                Task.end_time.isnot(None),
-                Task.end_time < cutoff_time
-            ).all()
-            
-            count = len(old_tasks)
-            for task in old_tasks:
-                db.delete(task)
-            db.commit()
-            return count
+            return db.execute(statement).scalar_one_or_none()
+    
+    @staticmethod
+    def release_cleanup(claimed_at: datetime) -> bool:
+        """
+        Вернуть интервал после неудачной очистки: следующая проверка любого воркера
+        снова её запустит. Запуск, занятый позже другим воркером, не трогается.
+        """
+        statement = delete(MaintenanceRun).where(
+            MaintenanceRun.job == _CLEANUP_JOB,
+            MaintenanceRun.last_run_at == claimed_at,
+        )
+        with get_db() as db:
+            return db.execute(statement).rowcount > 0
+    
+    @staticmethod
+    def cleanup_old(max_age_hours: int = 24, batch_size: int = 500) -> dict:
+        """
+        Удалить старые задачи пачками по batch_size строк.
+        
+        Возвращает {"rows", "bytes", "batches"}.
+        """
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        expired_ids = (
+            select(Task.id)
+            .where(Task.end_time.isnot(None), Task.end_time < cutoff_time)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            delete(Task)
+            .where(Task.id.in_(expired_ids))
+            .returning(func.coalesce(func.octet_length(Task.result_data), 0))
+        )
+        
+        stats = {"rows": 0, "bytes": 0, "batches": 0}
+        
+        with get_engine().connect() as conn:
+            while True:
+                sizes = conn.execute(stmt).scalars().all()
+                conn.commit()
+                if not sizes:
+                    break
+                
+                stats["rows"] += len(sizes)
+                stats["bytes"] += sum(sizes)
+                stats["batches"] += 1
+                if len(sizes) < batch_size:
+                    break
+        
+        return stats
 
+
+class AsyncTaskRepository:
+    """Асинхронный репозиторий для работы с задачами (asyncpg)"""
+    
+    @staticmethod
+    async def get_by_id(task_id: str) -> Optional[Task]:
+        """Получить задачу по ID"""
+        async with get_async_read_db() as db:
+            task = (await db.execute(select(Task).where(Task.id == task_id))).scalars().first()
+            if task:
+                db.expunge(task)
+            return task
+    
+    @staticmethod
+    async def get_status(task_id: str) -> Optional[dict]:
+        """Получить статус задачи без загрузки result_data"""
+        async with get_async_read_db() as db:
+            row = (await db.execute(_status_query(task_id))).first()
+            return dict(row._mapping) if row else None
+    
+    @staticmethod
+    async def get_result(task_id: str) -> Optional[bytes]:
+        """Получить архив результата задачи"""
+        async with get_async_read_db() as db:
+            return (await db.execute(
+                select(Task.result_data).where(Task.id == task_id)
+            )).scalar_one_or_none()
+    
+    @staticmethod
+    async def create(
+        white_bg: bool,
+        total_files: int,
+        callback_url: Optional[str] = None,
+        reuse_assets: bool = False,
+        scenes: int = 1,
+        inputs: Optional[AsyncIterator[Tuple[str, bytes]]] = None,
+        deadline_seconds: Optional[int] = None
+    ) -> Task:
+        """
+        Создать новую задачу.
+        inputs — (имя, содержимое) входных файлов: сохраняются в task_files в той же
+        транзакции по одному, чтобы задачу можно было продолжить на другом воркере.
+        """
+        values = _new_task_values(white_bg, total_files, callback_url, reuse_assets, scenes, deadline_seconds)
+        
+        async with get_async_db() as db:
+            await db.execute(insert(Task).values(**values))
+            if inputs is not None:
+                file_index = 0
+                async for filename, input_data in inputs:
+                    await db.execute(insert(TaskFile).values(
+                        task_id=values["id"],
+                        file_index=file_index,
+                        filename=filename,
+                        status="pending",
+                        input_data=input_data,
+                        updated_at=values["start_time"],
+                    ))
+                    file_index += 1
+        
+        return Task(**values)
+    
+    @staticmethod
+    async def _update_returning(task_id: str, values: dict, owner: Optional[str] = None) -> Optional[Task]:
+        """UPDATE ... RETURNING одним запросом (с owner — только задачи, которыми владеет воркер owner)"""
+        statement = _update_returning_query(task_id, values)
+        if owner is not None:
+            statement = statement.where(_owned_by(owner))
+        async with get_async_db() as db:
+            return _task_from_row((await db.execute(statement)).first())
+    
+    @staticmethod
+    async def update(task_id: str, owner: Optional[str] = None, **kwargs) -> Optional[Task]:
+        """
+        Обновить задачу. С owner обновляется только незавершённая задача, которой
+        не владеет другой воркер; None — задача отменена или подхвачена другим воркером.
+        """
+        values = {key: value for key, value in kwargs.items() if key in _UPDATABLE_FIELDS}
+        if not values:
+            return await AsyncTaskRepository.get_by_id(task_id)
+        
+        return await AsyncTaskRepository._update_returning(task_id, values, owner)
+    
+    @staticmethod
+    async def set_result(task_id: str, result_data: bytes, owner: Optional[str] = None) -> Optional[Task]:
+        """Установить результат и завершить задачу (owner — как в update)"""
+        return await AsyncTaskRepository._update_returning(
+            task_id, {"result_data": result_data, **_result_values()}, owner
+        )
+    
+    @staticmethod
+    async def set_error(task_id: str, error: str, owner: Optional[str] = None) -> Optional[Task]:
+        """Установить ошибку задачи (owner — как в update)"""
+        return await AsyncTaskRepository._update_returning(task_id, _error_values(error), owner)
+    
+    @staticmethod
+    async def delete(task_id: str) -> bool:
+        """Удалить задачу"""
+        async with get_async_db() as db:
+            return (await db.execute(_delete_query(task_id))).rowcount > 0
+    
+    @staticmethod
+    async def cancel(task_id: str) -> Optional[Task]:
+        """Отменить незавершённую задачу (None — задачи нет или она уже завершена)"""
+        return await AsyncTaskRepository._update_returning_active(task_id, {
+            "status": "cancelled",
+            "error": "Task cancelled",
+            "end_time": datetime.now(timezone.utc),
+        })
+    
+    @staticmethod
+    async def _update_returning_active(task_id: str, values: dict) -> Optional[Task]:
+        """UPDATE ... RETURNING только для незавершённой задачи"""
+        async with get_async_db() as db:
+            return _task_from_row((await db.execute(
+                _update_returning_query(task_id, values).where(Task.status.in_(_ACTIVE_STATUSES))
+            )).first())
+    
+    @staticmethod
+    async def touch(task_id: str, worker_id: str) -> bool:
+        """Отметка heartbeat; False — задачу подхватил другой воркер или она отменена"""
+        async with get_async_db() as db:
+            result = await db.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.worker_id == worker_id, Task.status.in_(_ACTIVE_STATUSES))
+                .values(heartbeat_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount > 0
+    
+    @staticmethod
+    async def claim_stale(stale_seconds: int, worker_id: str) -> Optional[str]:
+        """
+        Захватить одну незавершённую задачу, heartbeat которой старше stale_seconds
+        (её воркер упал или был перезапущен). Возвращает ID задачи или None.
+        """
+        now = datetime.now(timezone.utc)
+        stale_id = (
+            select(Task.id)
+            .where(Task.status.in_(_ACTIVE_STATUSES), Task.heartbeat_at < now - timedelta(seconds=stale_seconds))
+            .order_by(Task.heartbeat_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with get_async_db() as db:
+            return (await db.execute(
+                update(Task)
+                .where(Task.id == stale_id)
+                .values(worker_id=worker_id, heartbeat_at=now, resume_count=Task.resume_count + 1)
+                .returning(Task.id)
+                .execution_options(synchronize_session=False)
+            )).scalar_one_or_none()
@@ -1,11 +1,12 @@
 """
 Репозиторий для работы с пользователями
 """
-from typing import Optional, List
+from typing import Optional, List, Dict
 from uuid import UUID
 from datetime import datetime, timezone
+from sqlalchemy import update, delete, select
 from database.models import User
-from database.db_session import get_db
+from database.db_session import get_db, get_async_db, get_async_read_db
 
 
 class UserRepository:
@@ -80,6 +81,18 @@ class UserRepository:
                 user.last_used = datetime.now(timezone.utc)
                 db.commit()
     
+    @staticmethod
+    def update_last_used_bulk(last_used: Dict[UUID, datetime]) -> None:
+        """Обновить время последнего использования для нескольких пользователей одним запросом"""
+        if not last_used:
+            return
+        
+        with get_db() as db:
+            db.execute(
+                update(User),
+                [{"id": user_id, "last_used": used_at} for user_id, used_at in last_used.items()]
+            )
+    
     @staticmethod
     def delete(user_id: UUID) -> bool:
         """Удалить пользователя"""
@@ -92,3 +105,90 @@ class UserRepository:
             db.commit()
             return True
 
+
+class AsyncUserRepository:
+    """Асинхронный репозиторий для работы с пользователями (asyncpg)"""
+    
+    @staticmethod
+    async def get_by_id(user_id: UUID) -> Optional[User]:
+        """Получить пользователя по ID"""
+        async with get_async_read_db() as db:
+            user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+            if user:
+                db.expunge(user)
+            return user
+    
+    @staticmethod
+    async def get_by_username(username: str) -> Optional[User]:
+        """Получить пользователя по username"""
+        async with get_async_read_db() as db:
+            user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+            if user:
+                db.expunge(user)
+            return user
+    
+    @staticmethod
+    async def get_all() -> List[User]:
+        """Получить всех пользователей"""
+        async with get_async_read_db() as db:
+            users = (await db.execute(select(User))).scalars().all()
+            for user in users:
+                db.expunge(user)
+            return list(users)
+    
+    @staticmethod
+    async def create(username: str, is_admin: bool = False, rate_limit: int = 100) -> User:
+        """Создать нового пользователя"""
+        async with get_async_db() as db:
+            user = User(
+                username=username,
+                is_admin=is_admin,
+                rate_limit=rate_limit,
+                is_active=True
+            )
+            db.add(user)
+            await db.flush()
+            db.expunge(user)
+            return user
+    
+    @staticmethod
+    async def update(user_id: UUID, **kwargs) -> Optional[User]:
+        """Обновить пользователя"""
+        values = {key: value for key, value in kwargs.items() if hasattr(User, key)}
+        if not values:
+            return await AsyncUserRepository.get_by_id(user_id)
+        
+        async with get_async_db() as db:
+            user = (await db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(**values)
+                .returning(User)
+                .execution_options(synchronize_session=False)
+            )).scalars().first()
+            if user:
+                db.expunge(user)
+            return user
+    
+    @staticmethod
+    async def update_last_used_bulk(last_used: Dict[UUID, datetime]) -> None:
+        """Обновить время последнего использования для нескольких пользователей одним запросом"""
+        if not last_used:
+            return
+        
+        async with get_async_db() as db:
+            await db.execute(
+                update(User),
+                [{"id": user_id, "last_used": used_at} for user_id, used_at in last_used.items()]
+            )
+    
+    @staticmethod
+    async def delete(user_id: UUID) -> bool:
+        """Удалить пользователя"""
+        async with get_async_db() as db:
+            result = await db.execute(
+                delete(User)
+                .where(User.id == user_id)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount > 0
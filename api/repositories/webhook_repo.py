@@ -0,0 +1,63 @@
+"""
+Репозиторий журнала доставки webhook
+"""
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, select, delete
+from database.models import WebhookDelivery
+from database.db_session import get_async_db, get_async_read_db
+
+
+class AsyncWebhookDeliveryRepository:
+    """Асинхронный репозиторий журнала доставки webhook (asyncpg)"""
+    
+    @staticmethod
+    async def log_attempt(
+        task_id: str,
+        url: str,
+        event: str,
+        attempt: int,
+        duration_ms: int,
+        delivered: bool,
+        status_code: Optional[int] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """Записать попытку доставки"""
+        async with get_async_db() as db:
+            await db.execute(insert(WebhookDelivery).values(
+                task_id=task_id,
+                url=url,
+                event=event,
+                attempt=attempt,
+                status_code=status_code,
+                error=error,
+                duration_ms=duration_ms,
+                delivered=delivered,
+                created_at=datetime.now(timezone.utc),
+            ))
+    
+    @staticmethod
+    async def get_by_task(task_id: str) -> List[WebhookDelivery]:
+        """Получить попытки доставки по задаче"""
+        async with get_async_read_db() as db:
+            deliveries = (await db.execute(
+                select(WebhookDelivery)
+                .where(WebhookDelivery.task_id == task_id)
+                .order_by(WebhookDelivery.id)
+            )).scalars().all()
+            
+            for delivery in deliveries:
+                db.expunge(delivery)
+            return list(deliveries)
+    
+    @staticmethod
+    async def cleanup_old(max_age_hours: int) -> int:
+        """Удалить старые записи журнала"""
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        async with get_async_db() as db:
+            result = await db.execute(
+                delete(WebhookDelivery)
+                .where(WebhookDelivery.created_at < cutoff_time)
+                .execution_options(synchronize_session=False)
+            )
+            return result.rowcount
@@ -1,12 +1,16 @@
 """
 Роутер для административных операций
 """
-from typing import List
+from typing import List, Literal, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from api.services.auth_service import AuthService
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from api.services.auth_service import AsyncAuthService
 from api.dependencies import verify_admin, get_auth_service
 from api.models.auth_schemas import UserCreate, UserResponse, UserUpdate
+from api.models.schemas import WebhookDeliveryResponse, RequestProfileResponse, EventLoopReport
+from api.repositories import AsyncWebhookDeliveryRepository, AsyncProfileRepository, AsyncAssetRepository
+from api.loop_monitor import loop_monitor
 
 router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
 
@@ -15,11 +19,11 @@ router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
 async def create_user(
     user_data: UserCreate,
     admin: dict = Depends(verify_admin),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ):
     """Создание нового пользователя системы"""
     try:
-        user = auth_service.create_user(
+        user = await auth_service.create_user(
             username=user_data.username,
             is_admin=user_data.is_admin,
             rate_limit=user_data.rate_limit
@@ -32,10 +36,10 @@ async def create_user(
 @router.get("/users", response_model=List[UserResponse])
 async def list_users(
     admin: dict = Depends(verify_admin),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ):
     """Получение списка всех пользователей системы"""
-    users = auth_service.get_all_users()
+    users = await auth_service.get_all_users()
     return [UserResponse(**user) for user in users]
 
 
@@ -43,10 +47,10 @@ async def list_users(
 async def get_user(
     user_id: UUID,
     admin: dict = Depends(verify_admin),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ):
     """Получить пользователя по ID"""
-    user = auth_service.get_user(user_id)
+    user = await auth_service.get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return UserResponse(**user)
@@ -57,12 +61,12 @@ async def update_user(
     user_id: UUID,
     user_data: UserUpdate,
     admin: dict = Depends(verify_admin),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ):
     """Обновление данных пользователя"""
     try:
         updates = user_data.model_dump(exclude_unset=True)
-        user = auth_service.update_user(user_id, updates, admin)
+        user = await auth_service.update_user(user_id, updates, admin)
         return UserResponse(**user)
     except (ValueError, PermissionError) as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -72,14 +76,82 @@ async def update_user(
 async def delete_user(
     user_id: UUID,
     admin: dict = Depends(verify_admin),
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AsyncAuthService = Depends(get_auth_service)
 ):
     """Удаление пользователя из системы"""
     try:
-        success = auth_service.delete_user(user_id, admin)
+        success = await auth_service.delete_user(user_id, admin)
         if not success:
             raise HTTPException(status_code=404, detail="User not found")
         return {"message": "User deleted successfully"}
     except (ValueError, PermissionError) as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
+@router.get("/tasks/{task_id}/webhooks", response_model=List[WebhookDeliveryResponse])
+async def list_webhook_deliveries(
+    task_id: str,
+    admin: dict = Depends(verify_admin)
+):
+    """Журнал попыток доставки webhook по задаче"""
+    deliveries = await AsyncWebhookDeliveryRepository.get_by_task(task_id)
+    return [WebhookDeliveryResponse(**delivery.to_dict()) for delivery in deliveries]
+
+
+@router.get("/profiles", response_model=List[RequestProfileResponse])
+async def list_profiles(
+    task_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    admin: dict = Depends(verify_admin)
+):
+    """Последние профили запросов (снимаются с заголовком X-Profile: 1)"""
+    profiles = await AsyncProfileRepository.list_recent(limit=limit, task_id=task_id)
+    return [RequestProfileResponse(**profile.to_dict()) for profile in profiles]
+
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(
+    profile_id: str,
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    admin: dict = Depends(verify_admin)
+):
+    """Скачать профиль: speedscope (JSON для speedscope.app) или collapsed stacks (flamegraph.pl)"""
+    if format == "speedscope":
+        content = await AsyncProfileRepository.get_speedscope(profile_id)
+        media_type, extension = "application/json", "speedscope.json"
+    else:
+        content = await AsyncProfileRepository.get_collapsed(profile_id)
+        media_type, extension = "text/plain; charset=utf-8", "collapsed.txt"
+    
+    if content is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=profile_{profile_id}.{extension}",
+        }
+    )
+
+
+@router.delete("/assets/{sku}")
+async def delete_assets(
+    sku: str,
+    processing_type: Optional[Literal["white", "interior"]] = None,
+    admin: dict = Depends(verify_admin)
+):
+    """Удалить изображения артикула из библиотеки (следующий запрос сгенерирует их заново)"""
+    deleted = await AsyncAssetRepository.delete_by_sku(sku, processing_type)
+    return {"message": f"Deleted {deleted} assets", "deleted": deleted}
+
+
+@router.get("/event-loop", response_model=EventLoopReport)
+async def event_loop_report(
+    admin: dict = Depends(verify_admin)
+):
+    """
+    Задержка event loop и последние блокирующие вызовы со стеками.
+    Отчёт относится к воркеру, обработавшему запрос (PID в ответе).
+    """
+    return EventLoopReport(**loop_monitor.report())
@@ -4,7 +4,7 @@
 from typing import List
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
-from api.services.auth_service import AuthService
+from api.services.auth_service import AsyncAuthService
 from api.dependencies import verify_user, verify_admin, get_auth_service
 from api.models.auth_schemas import UserCreate, UserResponse, UserUpdate
 
@@ -1,13 +1,17 @@
 """
 Роутер для обработки изображений
 """
-from fastapi import APIRouter, Depends, BackgroundTasks, UploadFile, File
-from fastapi.responses import Response
-from typing import List
+from fastapi import APIRouter, Depends, BackgroundTasks, UploadFile, File, Form, Header, Query, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Literal, Optional
+from uuid import UUID
+import json
 import threading
-from api.services.task_service import TaskService
-from api.dependencies import verify_user, get_task_service
-from api.models.schemas import ProcessingResponse, TaskStatusResponse
+from api.services.auth_service import AsyncAuthService
+from api.services.task_service import AsyncTaskService
+from api.dependencies import verify_user, get_task_service, get_auth_service
+from api.models.schemas import ProcessingResponse, TaskStatusResponse, GeneratedAssetResponse
+from api.repositories import AsyncAssetRepository
 
 router = APIRouter(prefix="/api/v1", tags=["processing"])
 
@@ -30,6 +34,18 @@ def _next_scene_index(total_scenes: int) -> int:
         idx = _random.choice(candidates)
         _last_scene = idx
         return idx
+
+
+def _next_scene_indices(total_scenes: int, count: int) -> List[int]:
+    """Возвращает count разных случайных сцен, по возможности без предыдущей."""
+    global _last_scene
+    with _scene_lock:
+        candidates = [i for i in range(total_scenes) if i != _last_scene]
+        if count > len(candidates):
+            candidates = list(range(total_scenes))
+        indices = sorted(_random.sample(candidates, count))
+        _last_scene = indices[-1]
+        return indices
 # ─────────────────────────────────────────────────────────────────────────
 
 
@@ -37,18 +53,32 @@ def _next_scene_index(total_scenes: int) -> int:
 async def process_parallel(
     background_tasks: BackgroundTasks,
     white_bg: bool = True,
+    reuse_assets: bool = False,
+    scenes: int = Query(1, ge=1),
+    deadline_seconds: Optional[int] = Query(None, ge=1),
     files: List[UploadFile] = File(...),
+    callback_url: Optional[str] = Form(None),
     user: dict = Depends(verify_user),
-    task_service: TaskService = Depends(get_task_service)
+    task_service: AsyncTaskService = Depends(get_task_service)
 ):
-    """Запуск параллельной обработки с возвратом идентификатора задачи"""
+    """
+    Запуск параллельной обработки с возвратом идентификатора задачи.
+    Если передан callback_url, по завершении задачи на него отправляется подписанный webhook.
+    С reuse_assets=true файлы с артикулом в имени отдаются из библиотеки, если уже обрабатывались.
+    Для интерьеров scenes=N генерирует сцены 0..N-1 каждого файла (категория определяется один раз).
+    С deadline_seconds файлы, до которых обработка не дошла за это время, завершаются ошибкой.
+    """
     from api.handlers.processing_handler import ProcessingHandler
     
     handler = ProcessingHandler(task_service=task_service)
     return await handler.process_parallel(
         background_tasks=background_tasks,
         white_bg=white_bg,
-        files=files
+        files=files,
+        callback_url=callback_url,
+        reuse_assets=reuse_assets,
+        scenes=scenes,
+        deadline_seconds=deadline_seconds
     )
 
 
@@ -56,7 +86,7 @@ async def process_parallel(
 async def get_task_status(
     task_id: str,
     user: dict = Depends(verify_user),
-    task_service: TaskService = Depends(get_task_service)
+    task_service: AsyncTaskService = Depends(get_task_service)
 ):
     """Получить статус задачи"""
     from api.handlers.task_handler import TaskHandler
@@ -65,11 +95,124 @@ async def get_task_status(
     return await handler.get_task_status(task_id, user)
 
 
+def _format_sse(event: Optional[dict]) -> str:
+    """Сериализация события в формат text/event-stream (None — комментарий-heartbeat)"""
+    if event is None:
+        return ": ping\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    user: dict = Depends(verify_user),
+    task_service: AsyncTaskService = Depends(get_task_service)
+):
+    """Поток событий задачи (Server-Sent Events): прогресс, результат по каждому файлу, финальный статус"""
+    from api.handlers.task_handler import TaskHandler
+    
+    handler = TaskHandler(task_service=task_service)
+    events = handler.stream_task_events(task_id)
+    # Первое событие читаем до начала ответа, чтобы вернуть 404 для несуществующей задачи
+    first_event = await events.__anext__()
+    
+    async def body():
+        try:
+            yield _format_sse(first_event)
+            async for event in events:
+                yield _format_sse(event)
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.websocket("/tasks/{task_id}/ws")
+async def task_events_websocket(
+    websocket: WebSocket,
+    task_id: str,
+    x_user_id: Optional[str] = Header(None, alias="X-User-Id"),
+    user_id: Optional[str] = Query(None),
+    auth_service: AsyncAuthService = Depends(get_auth_service),
+    task_service: AsyncTaskService = Depends(get_task_service)
+):
+    """
+    WebSocket-вариант потока событий задачи.
+    Браузеры не умеют передавать заголовки в WebSocket, поэтому ID пользователя
+    можно передать и параметром user_id.
+    """
+    from api.handlers.task_handler import TaskHandler
+    
+    try:
+        user = await auth_service.verify_user(UUID(x_user_id or user_id or ""))
+    except ValueError:
+        user = None
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or inactive user")
+        return
+    
+    handler = TaskHandler(task_service=task_service)
+    events = handler.stream_task_events(task_id)
+    await websocket.accept()
+    try:
+        async for event in events:
+            await websocket.send_json(event if event is not None else {"event": "ping"})
+        await websocket.close()
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+
+
+@router.post("/tasks/{task_id}/cancel", response_model=TaskStatusResponse)
+async def cancel_task(
+    task_id: str,
+    user: dict = Depends(verify_user),
+    task_service: AsyncTaskService = Depends(get_task_service)
+):
+    """
+    Отменить задачу: запросы к внешним сервисам прерываются, оставшиеся файлы не обрабатываются.
+    Отмена действует на любом воркере.
+    """
+    from api.handlers.task_handler import TaskHandler
+    
+    handler = TaskHandler(task_service=task_service)
+    return await handler.cancel_task(task_id)
+
+
+@router.post("/tasks/{task_id}/retry-failed", response_model=ProcessingResponse)
+async def retry_failed_files(
+    task_id: str,
+    background_tasks: BackgroundTasks,
+    deadline_seconds: Optional[int] = Query(None, ge=1),
+    user: dict = Depends(verify_user),
+    task_service: AsyncTaskService = Depends(get_task_service)
+):
+    """
+    Повторно обработать только файлы задачи с ошибкой и объединить их с готовым результатом.
+    Доступно для завершённой задачи до скачивания результата. Прежний дедлайн задачи
+    не действует: deadline_seconds задаёт новый (по умолчанию TASK_DEADLINE_SECONDS).
+    """
+    from api.handlers.task_handler import TaskHandler
+    
+    handler = TaskHandler(task_service=task_service)
+    return await handler.retry_failed(task_id, background_tasks, deadline_seconds)
+
+
 @router.get("/tasks/{task_id}/download")
 async def download_task_result(
     task_id: str,
     user: dict = Depends(verify_user),
-    task_service: TaskService = Depends(get_task_service)
+    task_service: AsyncTaskService = Depends(get_task_service)
 ):
     """Скачать результат задачи"""
     from api.handlers.task_handler import TaskHandler
@@ -77,8 +220,8 @@ async def download_task_result(
     handler = TaskHandler(task_service=task_service)
     result = await handler.download_task_result(task_id, user)
     
-    task_service.delete_task(task_id)
-
+    await task_service.delete_task(task_id)
+    
     return Response(
         content=result.getvalue(),
         media_type="application/zip",
@@ -95,7 +238,9 @@ async def remove_background(
 ):
     """Удаляет фон с одного изображения"""
     from api.processors.async_white_processor import AsyncWhiteProcessor
+    from api.handlers.processing_handler import ProcessingHandler
     
+    await ProcessingHandler.validate_files([file])
     processor = AsyncWhiteProcessor()
     processed_data, output_filename = await processor.process_single(file)
     
@@ -111,28 +256,98 @@ async def remove_background(
 @router.post("/processing/generate_image")
 async def generate_image(
     file: UploadFile = File(...),
+    reuse_assets: bool = False,
+    scenes: int = Query(1, ge=1),
     user: dict = Depends(verify_user)
 ):
     """
     Генерирует интерьерное фото товара.
     При каждом обращении случайно выбирает сцену из пула светлых композиций —
     гарантированно отличную от предыдущей.
-    Возвращает одно изображение (image/jpeg).
+    С reuse_assets=true сцена, уже сгенерированная для артикула, отдаётся из библиотеки.
+    Возвращает одно изображение (image/jpeg), а при scenes=N — zip из N разных сцен:
+    файл готовится и категоризируется один раз, сцены генерируются параллельно.
+    Если часть сцен не сгенерирована, zip содержит готовые, а их индексы
+    перечислены в заголовке X-Failed-Scenes.
     """
-    from api.processors.async_interior_processor import AsyncInteriorProcessor
+    from api.processors.async_interior_processor import AsyncInteriorProcessor, ScenesFailed
+    from api.handlers.processing_handler import ProcessingHandler
+    
+    total = AsyncInteriorProcessor.total_scenes()
+    if scenes > total:
+        raise HTTPException(status_code=400, detail=f"Too many scenes. Maximum {total} scenes allowed")
+    
+    await ProcessingHandler.validate_files([file])
+    processor = AsyncInteriorProcessor(reuse_assets=reuse_assets)
+    
+    if scenes == 1:
+        scene_index = _next_scene_index(total)
+        processed_data, output_filename = await processor.process_single(file, scene_index=scene_index)
+        
+        return Response(
+            content=processed_data,
+            media_type="image/jpeg",
+            headers={
+                "Content-Disposition": f"attachment; filename={output_filename}",
+                "X-Scene-Index": str(scene_index),
+            }
+        )
+    
+    headers = {}
+    try:
+        results = await processor.process_scenes(file, _next_scene_indices(total, scenes))
+    except ScenesFailed as e:
+        results = e.outputs
+        headers["X-Failed-Scenes"] = ",".join(str(scene_index) for scene_index in e.failed)
+    zip_buffer = await processor.create_zip_response(
+        [(output_filename, processed_data) for _, processed_data, output_filename in results]
+    )
+    name_base = file.filename.rsplit('.', 1)[0]
+    
+    return Response(
+        content=zip_buffer.getvalue(),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={name_base}_scenes.zip",
+            "X-Scene-Index": ",".join(str(scene_index) for scene_index, _, _ in results),
+            **headers,
+        }
+    )
 
-    processor = AsyncInteriorProcessor()
-    # Размер пула берём как максимум из обоих — индекс подходит для обоих через %
-    total = max(len(processor._INDOOR_ACCENTS), len(processor._OUTDOOR_ACCENTS))
-    scene_index = _next_scene_index(total)
 
-    processed_data, output_filename = await processor.process_single(file, scene_index=scene_index)
+@router.get("/assets/{sku}", response_model=List[GeneratedAssetResponse])
+async def list_assets(
+    sku: str,
+    processing_type: Optional[Literal["white", "interior"]] = None,
+    user: dict = Depends(verify_user)
+):
+    """Изображения артикула в библиотеке (без данных)"""
+    assets = await AsyncAssetRepository.list_by_sku(sku, processing_type)
+    return [GeneratedAssetResponse(**asset.to_dict()) for asset in assets]
 
+
+@router.get("/assets/{sku}/{processing_type}/{scene_index}/download")
+async def download_asset(
+    sku: str,
+    processing_type: Literal["white", "interior"],
+    scene_index: int,
+    source_hash: Optional[str] = None,
+    user: dict = Depends(verify_user)
+):
+    """
+    Скачать изображение артикула из библиотеки.
+    Белый фон хранится для каждого фото артикула: без source_hash выдаётся последний.
+    """
+    asset = await AsyncAssetRepository.get(sku, processing_type, scene_index, source_hash)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    
+    extension = "png" if asset.content_type == "image/png" else "jpg"
     return Response(
-        content=processed_data,
-        media_type="image/jpeg",
+        content=asset.result_data,
+        media_type=asset.content_type,
         headers={
-            "Content-Disposition": f"attachment; filename={output_filename}",
-            "X-Scene-Index": str(scene_index),
+            "Content-Disposition": f"attachment; filename={sku}_{asset.suffix}.{extension}",
+            "X-Scene-Index": str(asset.scene_index),
         }
-    )
\ No newline at end of file
+    )
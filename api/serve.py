@@ -0,0 +1,120 @@
+"""
+Запуск API с несколькими воркерами.
+
+По умолчанию — обычный `uvicorn --workers N`: каждый воркер запускается как новый
+процесс и сам импортирует приложение. При SERVER_PRELOAD=true (или --preload)
+мастер один раз импортирует приложение и модули процессоров, открывает сокет и
+порождает воркеров через fork. Воркеры стартуют без импорта, страницы модулей
+общие (copy-on-write), упавший воркер перезапускается за доли секунды. Движки БД,
+шина событий и фоновые задачи создаются в lifespan каждого воркера, поэтому мастер
+не держит соединений и потоков, которые унаследовали бы воркеры.
+    
+    python -m api.serve --host 0.0.0.0 --port 8002 --workers 4 --preload
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict
+import uvicorn
+from core.config import config
+
+logger = logging.getLogger("api.serve")
+
+# Если воркер падает чаще, перезапуск откладывается, чтобы не крутить fork в цикле
+_MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def _run_worker(uvicorn_config: uvicorn.Config, sock: socket.socket) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    uvicorn.Server(uvicorn_config).run(sockets=[sock])
+
+
+def serve_preloaded(host: str, port: int, workers: int) -> None:
+    """Импортировать приложение в мастере и порождать воркеров через fork"""
+    started = time.perf_counter()
+    from api.main import app
+    from api import metrics
+    from api.startup import import_heavy_modules
+    import_heavy_modules()
+    logger.info(f"Preloaded application in {time.perf_counter() - started:.3f}s")
+    
+    uvicorn_config = uvicorn.Config(app, host=host, port=port, lifespan="on")
+    sock = uvicorn_config.bind_socket()
+    children: Dict[int, float] = {}
+    stopping = False
+    
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(uvicorn_config, sock)
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+    
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    for _ in range(workers):
+        spawn()
+    logger.info(f"Started {workers} workers: {sorted(children)}")
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = children.pop(pid, None)
+        if started_at is None:
+            continue
+        metrics.mark_process_dead(pid)
+        if stopping:
+            continue
+        
+        lifetime = time.monotonic() - started_at
+        logger.warning(f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)} after {lifetime:.1f}s, restarting")
+        if lifetime < _MIN_WORKER_LIFETIME_SECONDS:
+            time.sleep(_MIN_WORKER_LIFETIME_SECONDS)
+        spawn()
+    
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Запуск API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.app.workers)
+    parser.add_argument("--preload", action="store_true", default=config.app.server_preload,
+                        help="импортировать приложение в мастере и порождать воркеров через fork")
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if args.preload:
+        serve_preloaded(args.host, args.port, args.workers)
+    else:
+        uvicorn.run("api.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 """
 Сервисы приложения
 """
-from .auth_service import AuthService
-from .task_service import TaskService
+from .auth_service import AuthService, AsyncAuthService
+from .task_service import TaskService, AsyncTaskService
 from .category_service import CategoryService
 
-__all__ = ["AuthService", "TaskService", "CategoryService"]
+__all__ = ["AuthService", "TaskService", "CategoryService", "AsyncAuthService", "AsyncTaskService"]
 
@@ -0,0 +1,82 @@
+"""
+Библиотека сгенерированных изображений по артикулу.
+
+Каждый результат обработки файла с шестизначным кодом в имени сохраняется по
+ключу (артикул, тип обработки, сцена, хэш исходного файла); повторная генерация
+заменяет запись. Белый фон — вырезка конкретной фотографии, поэтому он хранится
+и выдаётся по SHA-256 входа: разные фото одного артикула не подменяют друг друга.
+Сцены интерьера хранятся с пустым хэшем и общие для артикула: второе фото того же
+артикула получит сцены первого. В режиме reuse_assets процессоры отдают готовое
+изображение из библиотеки и генерируют только отсутствующие сцены. Сбой
+библиотеки не влияет на обработку.
+"""
+import hashlib
+from typing import Optional
+from core.config import config
+from api.repositories import AsyncAssetRepository
+from api.logging import CustomLogger
+from api import metrics
+from database.models import GeneratedAsset
+
+
+def hash_source(data: bytes) -> str:
+    """Ключ исходного файла в библиотеке"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetService:
+    """Поиск и сохранение изображений в библиотеке"""
+    
+    def __init__(self, asset_repo: AsyncAssetRepository = None):
+        self.asset_repo = asset_repo or AsyncAssetRepository()
+    
+    async def find(
+        self,
+        sku: str,
+        processing_type: str,
+        scene_index: int,
+        logger: CustomLogger,
+        source_hash: str = ""
+    ) -> Optional[GeneratedAsset]:
+        """Готовое изображение для артикула, сцены и исходного файла"""
+        try:
+            asset = await self.asset_repo.get(sku, processing_type, scene_index, source_hash)
+        except Exception as e:
+            logger.warning(f"Поиск в библиотеке изображений не удался для {sku}: {e}")
+            metrics.ASSET_LIBRARY_LOOKUPS.labels(processing_type, "error").inc()
+            return None
+        metrics.ASSET_LIBRARY_LOOKUPS.labels(processing_type, "hit" if asset else "miss").inc()
+        return asset
+    
+    async def store(
+        self,
+        sku: str,
+        processing_type: str,
+        scene_index: int,
+        result_data: bytes,
+        suffix: str,
+        content_type: str,
+        logger: CustomLogger,
+        source_filename: Optional[str] = None,
+        main_category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        source_hash: str = ""
+    ) -> None:
+        """Сохранить результат обработки в библиотеку"""
+        if not config.app.asset_library_enabled:
+            return
+        try:
+            await self.asset_repo.upsert(
+                sku=sku,
+                processing_type=processing_type,
+                scene_index=scene_index,
+                suffix=suffix,
+                content_type=content_type,
+                result_data=result_data,
+                source_filename=source_filename,
+                main_category=main_category,
+                subcategory=subcategory,
+                source_hash=source_hash,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить {sku} в библиотеку изображений: {e}")
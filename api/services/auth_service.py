@@ -3,10 +3,42 @@
 """
 from typing import Optional
 from uuid import UUID
-from api.repositories import UserRepository
+from api.repositories import UserRepository, AsyncUserRepository
+from api.services.user_cache import user_cache, last_used_buffer
 from database.models import User
 
 
+def _validate_new_user(username: str, rate_limit: int) -> None:
+    """Проверка данных нового пользователя"""
+    if not username or not username.strip():
+        raise ValueError("Username cannot be empty")
+    if rate_limit < 1 or rate_limit > 10000:
+        raise ValueError("Rate limit must be between 1 and 10000")
+
+
+def _prepare_updates(updates: dict, current_user: dict) -> dict:
+    """Проверка прав и полей обновления пользователя"""
+    if not current_user.get("is_admin"):
+        raise PermissionError("Только администраторы могут обновлять пользователей")
+    
+    if "rate_limit" in updates:
+        if not isinstance(updates["rate_limit"], int) or updates["rate_limit"] < 1 or updates["rate_limit"] > 10000:
+            raise ValueError("Rate limit must be between 1 and 10000")
+    
+    updates.pop("id", None)
+    updates.pop("username", None)
+    return updates
+
+
+def _check_delete(user_id: UUID, current_user: dict) -> None:
+    """Проверка прав на удаление пользователя"""
+    if not current_user.get("is_admin"):
+        raise PermissionError("Только администраторы могут удалять пользователей")
+    
+    if current_user.get("id") == str(user_id):
+        raise ValueError("Нельзя удалить собственный аккаунт")
+
+
 class AuthService:
     """Сервис для работы с аутентификацией"""
     
@@ -14,15 +46,36 @@ class AuthService:
         self.user_repo = user_repo
     
     def verify_user(self, user_id: UUID) -> Optional[dict]:
-        """Проверить пользователя по UUID и вернуть данные"""
-        user = self.user_repo.get_by_id(user_id)
+        """Проверить пользователя по UUID и вернуть данные (с кэшированием)"""
+        cached, user_data = user_cache.get(user_id)
+        
+        if not cached:
+            generation = user_cache.generation(user_id)
+            user = self.user_repo.get_by_id(user_id)
+            user_data = user.to_dict() if user and user.is_active else None
+            user_cache.set(user_id, user_data, generation)
         
-        if not user or not user.is_active:
+        if user_data is None:
             return None
         
-        self.user_repo.update_last_used(user_id)
+        # last_used пишется в БД пачкой из фоновой задачи
+        last_used_buffer.touch(user_id)
         
-        return user.to_dict()
+        return dict(user_data)
+    
+    def flush_last_used(self) -> int:
+        """Записать накопленные отметки last_used в БД, возвращает количество пользователей"""
+        pending = last_used_buffer.drain()
+        if not pending:
+            return 0
+        
+        try:
+            self.user_repo.update_last_used_bulk(pending)
+        except Exception:
+            last_used_buffer.restore(pending)
+            raise
+        
+        return len(pending)
     
     def create_user(self, username: str, is_admin: bool = False, rate_limit: int = 100) -> dict:
         """Создать нового пользователя"""
@@ -30,10 +83,7 @@ class AuthService:
         if existing:
             raise ValueError(f"Пользователь {username} уже существует")
         
-        if not username or not username.strip():
-            raise ValueError("Username cannot be empty")
-        if rate_limit < 1 or rate_limit > 10000:
-            raise ValueError("Rate limit must be between 1 and 10000")
+        _validate_new_user(username, rate_limit)
         
         user = self.user_repo.create(
             username=username.strip(),
@@ -55,17 +105,10 @@ class AuthService:
     
     def update_user(self, user_id: UUID, updates: dict, current_user: dict) -> dict:
         """Обновить пользователя"""
-        if not current_user.get("is_admin"):
-            raise PermissionError("Только администраторы могут обновлять пользователей")
-        
-        if "rate_limit" in updates:
-            if not isinstance(updates["rate_limit"], int) or updates["rate_limit"] < 1 or updates["rate_limit"] > 10000:
-                raise ValueError("Rate limit must be between 1 and 10000")
-        
-        updates.pop("id", None)
-        updates.pop("username", None)
+        updates = _prepare_updates(updates, current_user)
         
         user = self.user_repo.update(user_id, **updates)
+        user_cache.invalidate(user_id)
         if not user:
             raise ValueError("Пользователь не найден")
         
@@ -73,11 +116,92 @@ class AuthService:
     
     def delete_user(self, user_id: UUID, current_user: dict) -> bool:
         """Удалить пользователя"""
-        if not current_user.get("is_admin"):
-            raise PermissionError("Только администраторы могут удалять пользователей")
+        _check_delete(user_id, current_user)
         
-        if current_user.get("id") == str(user_id):
-            raise ValueError("Нельзя удалить собственный аккаунт")
-        
-        return self.user_repo.delete(user_id)
+        deleted = self.user_repo.delete(user_id)
+        user_cache.invalidate(user_id)
+        return deleted
+
 
+class AsyncAuthService:
+    """Асинхронный сервис для работы с аутентификацией"""
+    
+    def __init__(self, user_repo: AsyncUserRepository):
+        self.user_repo = user_repo
+    
+    async def verify_user(self, user_id: UUID) -> Optional[dict]:
+        """Проверить пользователя по UUID и вернуть данные (с кэшированием)"""
+        cached, user_data = user_cache.get(user_id)
+        
+        if not cached:
+            generation = user_cache.generation(user_id)
+            user = await self.user_repo.get_by_id(user_id)
+            user_data = user.to_dict() if user and user.is_active else None
+            user_cache.set(user_id, user_data, generation)
+        
+        if user_data is None:
+            return None
+        
+        # last_used пишется в БД пачкой из фоновой задачи
+        last_used_buffer.touch(user_id)
+        
+        return dict(user_data)
+    
+    async def flush_last_used(self) -> int:
+        """Записать накопленные отметки last_used в БД, возвращает количество пользователей"""
+        pending = last_used_buffer.drain()
+        if not pending:
+            return 0
+        
+        try:
+            await self.user_repo.update_last_used_bulk(pending)
+        except Exception:
+            last_used_buffer.restore(pending)
+            raise
+        
+        return len(pending)
+    
+    async def create_user(self, username: str, is_admin: bool = False, rate_limit: int = 100) -> dict:
+        """Создать нового пользователя"""
+        existing = await self.user_repo.get_by_username(username)
+        if existing:
+            raise ValueError(f"Пользователь {username} уже существует")
+        
+        _validate_new_user(username, rate_limit)
+        
+        user = await self.user_repo.create(
+            username=username.strip(),
+            is_admin=is_admin,
+            rate_limit=rate_limit
+        )
+        
+        return user.to_dict()
+    
+    async def get_user(self, user_id: UUID) -> Optional[dict]:
+        """Получить пользователя"""
+        user = await self.user_repo.get_by_id(user_id)
+        return user.to_dict() if user else None
+    
+    async def get_all_users(self) -> list:
+        """Получить всех пользователей"""
+        users = await self.user_repo.get_all()
+        return [user.to_dict() for user in users]
+    
+    async def update_user(self, user_id: UUID, updates: dict, current_user: dict) -> dict:
+        """Обновить пользователя"""
+        updates = _prepare_updates(updates, current_user)
+        
+        user = await self.user_repo.update(user_id, **updates)
+        user_cache.invalidate(user_id)
+        if not user:
+            raise ValueError("Пользователь не найден")
+        
+        return user.to_dict()
+    
+    async def delete_user(self, user_id: UUID, current_user: dict) -> bool:
+        """Удалить пользователя"""
+        _check_delete(user_id, current_user)
+        
+        deleted = await self.user_repo.delete(user_id)
+        user_cache.invalidate(user_id)
+        return deleted
@@ -1,27 +1,127 @@
 """
 Сервис для работы с категориями
 """
-from typing import Dict
-from api.repositories import CategoryRepository
+import asyncio
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+from core.config import config
+from api.repositories import CategoryRepository, AsyncCategoryRepository
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "category_changes"
+
+
+@dataclass(frozen=True)
+class CategorySnapshot:
+    """Неизменяемый снимок справочника категорий определённой версии"""
+    version: int
+    categories: Mapping[str, Mapping[str, str]]
+    
+    @classmethod
+    def build(cls, version: int, categories: Dict[str, Dict[str, str]]) -> "CategorySnapshot":
+        return cls(
+            version=version,
+            categories=MappingProxyType({
+                main: MappingProxyType(dict(subcategories)) for main, subcategories in categories.items()
+            }),
+        )
 
 
 class CategoryService:
-    """Сервис для работы с категориями"""
+    """
+    Снимок категорий в памяти воркера.
+    
+    Снимок загружается при старте приложения и заменяется целиком (одним
+    присваиванием) при изменении версии справочника: по уведомлению
+    category_changes или при периодической сверке версии. Чтение категорий
+    в обработке запросов не обращается к БД.
+    """
     
-    def __init__(self, category_repo: CategoryRepository = None):
+    def __init__(self, category_repo: CategoryRepository = None, async_category_repo: AsyncCategoryRepository = None):
         self.category_repo = category_repo or CategoryRepository()
-        self._cache: Dict[str, Dict[str, str]] = None
+        self.async_category_repo = async_category_repo or AsyncCategoryRepository()
+        self._snapshot: Optional[CategorySnapshot] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_requested: Optional[asyncio.Event] = None
+    
+    @property
+    def snapshot(self) -> CategorySnapshot:
+        """Текущий снимок (вне приложения, например в скриптах, загружается синхронно)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload_cache()
+            snapshot = self._snapshot
+        return snapshot
+    
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
     
-    def get_all_categories(self, use_cache: bool = True) -> Dict[str, Dict[str, str]]:
-        """Получить все категории (с кэшированием)"""
-        if use_cache and self._cache is not None:
-            return self._cache
-        
-        self._cache = self.category_repo.get_all()
-        return self._cache
+    def get_all_categories(self, use_cache: bool = True) -> Mapping[str, Mapping[str, str]]:
+        """Получить все категории в формате {main_category: {subcategory: description}}"""
+        if not use_cache:
+            self.reload_cache()
+        return self.snapshot.categories
     
     def reload_cache(self):
-        """Перезагрузить кэш"""
-        self._cache = None
-        self.get_all_categories()
+        """Синхронно перечитать категории из БД"""
+        # Версия читается до категорий: если справочник изменится между запросами,
+        # снимок окажется новее своей версии и будет перечитан при следующей сверке
+        version = self.category_repo.get_version()
+        self._snapshot = CategorySnapshot.build(version, self.category_repo.get_all())
+    
+    async def load(self) -> CategorySnapshot:
+        """Перечитать категории из БД и атомарно заменить снимок"""
+        version = await self.async_category_repo.get_version()
+        snapshot = CategorySnapshot.build(version, await self.async_category_repo.get_all())
+        self._snapshot = snapshot
+        logger.info(f"Loaded category snapshot v{snapshot.version}: {sum(len(s) for s in snapshot.categories.values())} subcategories")
+        return snapshot
+    
+    async def refresh_if_changed(self) -> bool:
+        """Перечитать снимок, если версия в БД отличается от текущей"""
+        version = await self.async_category_repo.get_version()
+        if self._snapshot is not None and version == self._snapshot.version:
+            return False
+        await self.load()
+        return True
+    
+    def request_refresh(self, payload: Optional[str] = None) -> None:
+        """Обработчик уведомления category_changes (вызывается в event loop)"""
+        if self._refresh_requested is not None:
+            self._refresh_requested.set()
+    
+    def start(self) -> None:
+        """Запустить фоновое обновление снимка"""
+        if self._refresh_task is None:
+            self._refresh_requested = asyncio.Event()
+            self._refresh_task = asyncio.create_task(self._refresh_forever())
+    
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+    
+    async def _refresh_forever(self) -> None:
+        """Обновлять снимок по уведомлению или по таймауту сверки версии"""
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), config.app.category_refresh_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.warning(f"Failed to refresh categories: {e}")
+
 
+category_service = CategoryService()
@@ -0,0 +1,123 @@
+"""
+Индекс генераций интерьеров для переиспользования на почти-дубликатах.
+
+Один и тот же товар часто приходит в виде немного разных кадров или
+перевыгрузок. Для входа, приведённого к 3:4, считается dHash (64 бита) и средний
+цвет; хэши всех сохранённых генераций держатся в BK-дереве в памяти воркера и
+догружаются из БД по возрастанию ID перед каждым поиском, так что генерации
+других воркеров тоже находятся. Совпадение — расстояние Хэмминга не больше
+INTERIOR_DEDUP_MAX_DISTANCE, та же сцена и близкий средний цвет (dHash цвет не
+различает). Изображение результата читается из БД только при совпадении.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional, Set
+from PIL import Image
+from core.config import config
+from api.repositories import AsyncGenerationRepository
+from interior.phash import BKTree, average_color, color_distance, dhash, to_signed, to_unsigned
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Перцептивный отпечаток входного изображения"""
+    dhash: int
+    color: int
+    
+    @classmethod
+    def of(cls, image: Image.Image) -> "Fingerprint":
+        return cls(dhash=dhash(image), color=average_color(image))
+
+
+@dataclass(frozen=True)
+class _Entry:
+    id: int
+    color: int
+    scene_index: int
+
+
+@dataclass(frozen=True)
+class ReusedGeneration:
+    """Найденная ранее генерация"""
+    id: int
+    distance: int
+    main_category: Optional[str]
+    subcategory: Optional[str]
+    use_custom_prompt: bool
+    result_data: bytes
+
+
+class GenerationIndex:
+    """BK-дерево хэшей генераций, синхронизируемое с таблицей interior_generations"""
+    
+    def __init__(self, generation_repo: AsyncGenerationRepository = None):
+        self.generation_repo = generation_repo or AsyncGenerationRepository()
+        self._tree: BKTree[_Entry] = BKTree()
+        self._last_id = 0
+        # Записи, удалённые очисткой после попадания в дерево
+        self._missing: Set[int] = set()
+        self._lock = asyncio.Lock()
+    
+    @property
+    def size(self) -> int:
+        return self._tree.size - len(self._missing)
+    
+    async def sync(self) -> int:
+        """Догрузить в дерево записи, появившиеся после последней синхронизации"""
+        async with self._lock:
+            rows = await self.generation_repo.list_since(self._last_id)
+            for generation_id, hash_value, color, scene_index in rows:
+                self._tree.add(to_unsigned(hash_value), _Entry(generation_id, color, scene_index))
+                self._last_id = generation_id
+            return len(rows)
+    
+    async def find(self, fingerprint: Fingerprint, scene_index: int) -> Optional[ReusedGeneration]:
+        """Ближайшая генерация для почти совпадающего входа с той же сценой"""
+        await self.sync()
+        
+        candidates = self._tree.search(fingerprint.dhash, config.app.interior_dedup_max_distance)
+        for distance, entry in candidates:
+            if entry.scene_index != scene_index or entry.id in self._missing:
+                continue
+            if color_distance(entry.color, fingerprint.color) > config.app.interior_dedup_color_tolerance:
+                continue
+            
+            generation = await self.generation_repo.get(entry.id)
+            if generation is None:
+                self._missing.add(entry.id)
+                continue
+            return ReusedGeneration(
+                id=generation.id,
+                distance=distance,
+                main_category=generation.main_category,
+                subcategory=generation.subcategory,
+                use_custom_prompt=generation.use_custom_prompt,
+                result_data=generation.result_data,
+            )
+        return None
+    
+    async def add(
+        self,
+        fingerprint: Fingerprint,
+        scene_index: int,
+        result_data: bytes,
+        main_category: Optional[str] = None,
+        subcategory: Optional[str] = None,
+        use_custom_prompt: bool = False
+    ) -> int:
+        """Сохранить генерацию (в дерево она попадёт при следующей синхронизации)"""
+        return await self.generation_repo.add(
+            dhash=to_signed(fingerprint.dhash),
+            color=fingerprint.color,
+            scene_index=scene_index,
+            result_data=result_data,
+            main_category=main_category,
+            subcategory=subcategory,
+            use_custom_prompt=use_custom_prompt,
+        )
+
+
+generation_index = GenerationIndex()
@@ -0,0 +1,154 @@
+"""
+Шина событий задач: Postgres LISTEN/NOTIFY с раздачей подписчикам текущего воркера
+"""
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Set
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from core.config import config
+from database.db_session import get_async_db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "task_events"
+
+# Payload NOTIFY ограничен 8000 байтами
+_MAX_PAYLOAD_BYTES = 7900
+_RECONNECT_DELAY_SECONDS = 5
+_QUEUE_SIZE = 100
+
+
+class TaskEventBus:
+    """
+    Публикует события задач через NOTIFY и раздаёт их локальным подписчикам.
+
+    Каждый воркер держит одно соединение с LISTEN, поэтому событие, опубликованное
+    любым воркером или узлом, доходит до всех SSE/WebSocket клиентов задачи.
+    Через то же соединение можно слушать и другие каналы (add_channel_listener).
+    """
+
+    def __init__(self, dsn: Optional[str] = None, channel: str = CHANNEL):
+        # Без dsn адрес берётся из DATABASE_URL при подключении, а не при импорте
+        self.dsn = dsn
+        self.channel = channel
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._channel_listeners: Dict[str, Callable[[Optional[str]], None]] = {}
+        self._connection: Optional[asyncpg.Connection] = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запустить фоновое прослушивание канала"""
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        """Остановить прослушивание и закрыть соединение"""
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        await self._close_connection()
+
+    async def publish(self, task_id: str, event: str, data: dict) -> None:
+        """Опубликовать событие задачи (ошибки только логируются — статус всё равно есть в БД)"""
+        payload = json.dumps({"task_id": task_id, "event": event, "data": data}, ensure_ascii=False, default=str)
+        if len(payload.encode("utf-8")) > _MAX_PAYLOAD_BYTES:
+            data = {key: value for key, value in data.items() if not isinstance(value, str)}
+            payload = json.dumps({"task_id": task_id, "event": event, "data": data}, default=str)
+
+        try:
+            await self.notify(self.channel, payload)
+        except Exception as e:
+            logger.warning(f"Failed to publish task event {event} for {task_id}: {e}")
+
+    @staticmethod
+    async def notify(channel: str, payload: str) -> None:
+        """Отправить NOTIFY в произвольный канал (доходит до всех воркеров, слушающих канал)"""
+        async with get_async_db() as db:
+            await db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": channel, "payload": payload}
+            )
+
+    def add_channel_listener(self, channel: str, callback: Callable[[Optional[str]], None]) -> None:
+        """
+        Слушать дополнительный канал (вызывать до start).
+        callback получает payload уведомления, а при каждом (пере)подключении — None:
+        пока соединения не было, уведомления могли быть пропущены.
+        """
+        self._channel_listeners[channel] = callback
+
+    @contextmanager
+    def subscribe(self, task_id: str) -> Iterator[asyncio.Queue]:
+        """Подписаться на события задачи на время блока with"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def _dispatch(self, connection, pid, channel, payload: str) -> None:
+        """Раздать уведомление подписчикам задачи"""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Malformed task event payload: {payload[:200]}")
+            return
+
+        for queue in tuple(self._subscribers.get(event.get("task_id"), ())):
+            if queue.full():
+                # Медленный клиент: отбрасываем самое старое событие
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _listen_forever(self) -> None:
+        """Держать LISTEN-соединение, переподключаясь при обрыве"""
+        while True:
+            try:
+                self._connection = await asyncpg.connect(self.dsn or _default_dsn())
+                await self._connection.add_listener(self.channel, self._dispatch)
+                for channel, callback in self._channel_listeners.items():
+                    await self._connection.add_listener(
+                        channel, lambda connection, pid, channel, payload, callback=callback: callback(payload)
+                    )
+                    callback(None)
+                logger.info(f"Listening for task events on channel {self.channel}")
+
+                while True:
+                    await asyncio.sleep(config.app.task_events_heartbeat_seconds)
+                    await self._connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Task events listener disconnected: {e}")
+            finally:
+                await self._close_connection()
+
+            await asyncio.sleep(_RECONNECT_DELAY_SECONDS)
+
+    async def _close_connection(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=5)
+            except Exception:
+                connection.terminate()
+
+
+def _default_dsn() -> str:
+    return make_url(config.database.require_url()).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+task_event_bus = TaskEventBus()
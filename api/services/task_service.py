@@ -1,12 +1,18 @@
 """
 Сервис для работы с задачами
 """
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from uuid import UUID
+import asyncio
 import io
-from api.repositories import TaskRepository
+import tempfile
+from fastapi import UploadFile
+from api.repositories import TaskRepository, AsyncTaskRepository, AsyncTaskFileRepository
 from database.models import Task
 
+# Входы продолжаемой задачи больше этого размера читаются из БД во временный файл на диске
+_SPOOL_MAX_SIZE = 1024 * 1024
+
 
 class TaskService:
     """Сервис для работы с задачами"""
@@ -14,9 +20,15 @@ class TaskService:
     def __init__(self, task_repo: TaskRepository):
         self.task_repo = task_repo
     
-    def create_task(self, white_bg: bool, total_files: int) -> dict:
+    def create_task(self, white_bg: bool, total_files: int, callback_url: Optional[str] = None, reuse_assets: bool = False, scenes: int = 1) -> dict:
         """Создать новую задачу"""
-        task = self.task_repo.create(white_bg=white_bg, total_files=total_files)
+        task = self.task_repo.create(
+            white_bg=white_bg,
+            total_files=total_files,
+            callback_url=callback_url,
+            reuse_assets=reuse_assets,
+            scenes=scenes
+        )
         return self._task_to_dict(task)
     
     def get_task(self, task_id: str) -> Optional[dict]:
@@ -27,13 +39,27 @@ class TaskService:
         
         return self._task_to_dict(task)
     
+    def get_task_status(self, task_id: str) -> Optional[dict]:
+        """Получить статус задачи (без архива результата)"""
+        status = self.task_repo.get_status(task_id)
+        if not status:
+            return None
+        
+        status["task_id"] = status.pop("id")
+        return status
+    
+    def get_task_result(self, task_id: str) -> Optional[io.BytesIO]:
+        """Получить архив результата задачи"""
+        result_data = self.task_repo.get_result(task_id)
+        return io.BytesIO(result_data) if result_data else None
+    
     def update_task_status(self, task_id: str, status: str, **kwargs) -> Optional[dict]:
         """Обновить статус задачи"""
         task = self.task_repo.update(task_id, status=status, **kwargs)
         return self._task_to_dict(task) if task else None
     
     def set_task_result(self, task_id: str, zip_buffer: io.BytesIO) -> Optional[dict]:
-        """Установить результат задачи"""
+        """Установить результат и завершить задачу"""
         task = self.task_repo.set_result(task_id, zip_buffer.getvalue())
         return self._task_to_dict(task) if task else None
     
@@ -46,16 +72,156 @@ class TaskService:
         """Удалить задачу"""
         return self.task_repo.delete(task_id)
     
-    def cleanup_old_tasks(self, max_age_hours: int = 24) -> int:
-        """Очистить старые задачи"""
-        return self.task_repo.cleanup_old(max_age_hours)
+    def cleanup_old_tasks(self, max_age_hours: int = 24, batch_size: int = 500,
+                          interval_hours: float = 1) -> Optional[dict]:
+        """
+        Очистить старые задачи (None — за этот интервал очистку уже выполнил другой воркер).
+        При сбое интервал освобождается, и очистку повторит следующая проверка.
+        """
+        claimed_at = self.task_repo.claim_cleanup(interval_hours)
+        if claimed_at is None:
+            return None
+        try:
+            return self.task_repo.cleanup_old(max_age_hours, batch_size)
+        except Exception:
+            self.task_repo.release_cleanup(claimed_at)
+            raise
     
-    def _task_to_dict(self, task: Task) -> dict:
+    @staticmethod
+    def _task_to_dict(task: Task) -> dict:
         """Преобразовать задачу в словарь"""
         result = task.to_dict()
         result["task_id"] = task.id
-        
-        if task.result_data:
-            result["result"] = io.BytesIO(task.result_data)
-        
         return result
+
+
+class AsyncTaskService:
+    """Асинхронный сервис для работы с задачами"""
+    
+    def __init__(self, task_repo: AsyncTaskRepository, task_file_repo: AsyncTaskFileRepository = None):
+        self.task_repo = task_repo
+        self.task_file_repo = task_file_repo or AsyncTaskFileRepository()
+    
+    async def create_task(
+        self,
+        white_bg: bool,
+        total_files: int,
+        callback_url: Optional[str] = None,
+        reuse_assets: bool = False,
+        scenes: int = 1,
+        files: Optional[List[UploadFile]] = None,
+        deadline_seconds: Optional[int] = None
+    ) -> dict:
+        """
+        Создать новую задачу (с files — вместе с сохранёнными входами для продолжения,
+        с deadline_seconds — с дедлайном обработки от момента создания)
+        """
+        task = await self.task_repo.create(
+            white_bg=white_bg,
+            total_files=total_files,
+            callback_url=callback_url,
+            reuse_assets=reuse_assets,
+            scenes=scenes,
+            inputs=self._read_inputs(files) if files else None,
+            deadline_seconds=deadline_seconds
+        )
+        return TaskService._task_to_dict(task)
+    
+    @staticmethod
+    async def _read_inputs(files: List[UploadFile]) -> AsyncIterator[Tuple[str, bytes]]:
+        """Содержимое файлов по одному (файл остаётся доступным для обработки)"""
+        for file in files:
+            content = await file.read()
+            await file.seek(0)
+            yield file.filename, content
+    
+    async def get_task(self, task_id: str) -> Optional[dict]:
+        """Получить задачу"""
+        task = await self.task_repo.get_by_id(task_id)
+        return TaskService._task_to_dict(task) if task else None
+    
+    async def get_task_status(self, task_id: str) -> Optional[dict]:
+        """Получить статус задачи (без архива результата)"""
+        status = await self.task_repo.get_status(task_id)
+        if not status:
+            return None
+        
+        status["task_id"] = status.pop("id")
+        return status
+    
+    async def get_task_result(self, task_id: str) -> Optional[io.BytesIO]:
+        """Получить архив результата задачи"""
+        result_data = await self.task_repo.get_result(task_id)
+        return io.BytesIO(result_data) if result_data else None
+    
+    async def update_task_status(self, task_id: str, status: str, owner: Optional[str] = None, **kwargs) -> Optional[dict]:
+        """Обновить статус задачи (с owner — только от имени воркера, владеющего задачей)"""
+        task = await self.task_repo.update(task_id, owner=owner, status=status, **kwargs)
+        return TaskService._task_to_dict(task) if task else None
+    
+    async def set_task_result(self, task_id: str, zip_buffer: io.BytesIO, owner: Optional[str] = None) -> Optional[dict]:
+        """Установить результат и завершить задачу (с owner — только от имени воркера, владеющего задачей)"""
+        task = await self.task_repo.set_result(task_id, zip_buffer.getvalue(), owner)
+        return TaskService._task_to_dict(task) if task else None
+    
+    async def set_task_error(self, task_id: str, error: str, owner: Optional[str] = None) -> Optional[dict]:
+        """Установить ошибку задачи (с owner — только от имени воркера, владеющего задачей)"""
+        task = await self.task_repo.set_error(task_id, error, owner)
+        return TaskService._task_to_dict(task) if task else None
+    
+    async def delete_task(self, task_id: str) -> bool:
+        """Удалить задачу"""
+        return await self.task_repo.delete(task_id)
+    
+    async def cancel_task(self, task_id: str) -> Optional[dict]:
+        """Отменить незавершённую задачу (None — задачи нет или она уже завершена)"""
+        task = await self.task_repo.cancel(task_id)
+        return TaskService._task_to_dict(task) if task else None
+    
+    async def touch_task(self, task_id: str, worker_id: str) -> bool:
+        """Отметка heartbeat воркера, обрабатывающего задачу"""
+        return await self.task_repo.touch(task_id, worker_id)
+    
+    async def claim_stale_task(self, stale_seconds: int, worker_id: str) -> Optional[str]:
+        """Захватить задачу, воркер которой перестал отмечаться"""
+        return await self.task_repo.claim_stale(stale_seconds, worker_id)
+    
+    async def has_files(self, task_id: str) -> bool:
+        """Сохранены ли входные файлы задачи"""
+        return await self.task_file_repo.has_files(task_id)
+    
+    async def get_pending_files(self, task_id: str) -> List[Tuple[int, UploadFile]]:
+        """Необработанные файлы задачи из БД: (индекс, файл)"""
+        files = []
+        for file_index, filename in await self.task_file_repo.list_pending(task_id):
+            content = await self.task_file_repo.get_input(task_id, file_index) or b""
+            spooled = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+            await asyncio.to_thread(spooled.write, content)
+            spooled.seek(0)
+            files.append((file_index, UploadFile(file=spooled, filename=filename, size=len(content))))
+        return files
+    
+    async def save_file_outcome(
+        self,
+        task_id: str,
+        file_index: int,
+        worker_id: str,
+        outputs: List[Tuple[str, bytes]],
+        error: Optional[str] = None
+    ) -> bool:
+        """Сохранить итог обработки файла (False — задачу подхватил другой воркер)"""
+        return await self.task_file_repo.save_outcome(task_id, file_index, worker_id, outputs, error)
+    
+    async def get_file_results(self, task_id: str) -> List[Tuple[str, bytes]]:
+        """Результаты всех обработанных файлов задачи"""
+        return await self.task_file_repo.get_results(task_id)
+    
+    async def get_partial_results(self, task_id: str, file_indices: List[int]) -> Dict[int, List[Tuple[str, bytes]]]:
+        """Результаты, сохранённые для файлов при прошлой частично неудачной обработке"""
+        if not file_indices:
+            return {}
+        return await self.task_file_repo.get_file_results(task_id, file_indices)
+    
+    async def reopen_failed_files(self, task_id: str, deadline_seconds: Optional[int] = None) -> Optional[int]:
+        """Вернуть в обработку файлы задачи с ошибкой (None — задача ещё выполняется)"""
+        return await self.task_file_repo.reopen_failed(task_id, deadline_seconds)
@@ -0,0 +1,92 @@
+"""
+Кэш аутентификации пользователей и отложенная запись last_used
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+from core.config import config
+
+
+class UserCache:
+    """
+    TTL-кэш результатов проверки пользователя (None — пользователь не найден или неактивен).
+    
+    invalidate() увеличивает поколение записи (или всего кэша), а set() с поколением,
+    взятым до запроса в БД, ничего не сохраняет, если оно с тех пор изменилось:
+    проверка, начатая до изменения пользователя, не вернёт в кэш устаревшие данные.
+    """
+    
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[UUID, Tuple[float, Optional[dict]]] = {}
+        self._generations: Dict[UUID, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: UUID) -> Tuple[bool, Optional[dict]]:
+        """Вернуть (найдено в кэше, данные пользователя)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False, None
+            
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return False, None
+            
+            return True, user
+    
+    def generation(self, user_id: UUID) -> Tuple[int, int]:
+        """Поколение записи: берётся перед запросом в БД и передаётся в set()"""
+        with self._lock:
+            return self._epoch, self._generations.get(user_id, 0)
+    
+    def set(self, user_id: UUID, user: Optional[dict], generation: Optional[Tuple[int, int]] = None) -> None:
+        """Сохранить данные пользователя (если запись не сбрасывалась после generation)"""
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(user_id, 0)):
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user)
+    
+    def invalidate(self, user_id: Optional[UUID] = None) -> None:
+        """Сбросить запись пользователя (или весь кэш)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(user_id, None)
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+class LastUsedBuffer:
+    """Накапливает время последнего использования для пакетной записи в БД"""
+    
+    def __init__(self):
+        self._pending: Dict[UUID, datetime] = {}
+        self._lock = threading.Lock()
+    
+    def touch(self, user_id: UUID) -> None:
+        """Отметить использование"""
+        with self._lock:
+            self._pending[user_id] = datetime.now(timezone.utc)
+    
+    def drain(self) -> Dict[UUID, datetime]:
+        """Забрать накопленные отметки"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+    
+    def restore(self, pending: Dict[UUID, datetime]) -> None:
+        """Вернуть отметки в буфер после неудачной записи (более свежие не затираются)"""
+        with self._lock:
+            for user_id, last_used in pending.items():
+                self._pending.setdefault(user_id, last_used)
+
+
+user_cache = UserCache(ttl_seconds=config.app.auth_cache_ttl_seconds)
+last_used_buffer = LastUsedBuffer()
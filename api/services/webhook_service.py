@@ -0,0 +1,216 @@
+"""
+Сервис webhook-уведомлений о завершении задач
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import socket
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+import httpx
+from core.config import config
+from api.repositories import AsyncWebhookDeliveryRepository
+from api.logging import CustomLogger
+from api.metrics import record_upstream
+
+# Ответы, после которых имеет смысл повторить доставку
+_RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _is_public_address(address: str) -> bool:
+    """Адрес в интернете: не loopback, частная сеть, link-local (метаданные облака), зарезервированный или multicast"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def _resolve(hostname: str, port: int) -> List[str]:
+    """Адреса хоста (ValueError, если хост не разрешается)"""
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"callback_url host {hostname} cannot be resolved")
+    return [address[4][0] for address in addresses]
+
+
+async def _check_callback_url(url: str) -> Tuple[str, Optional[str]]:
+    """
+    Нормализованный URL и проверенный публичный адрес хоста, с которым нужно
+    соединяться (None — хост из WEBHOOK_ALLOWED_HOSTS, ему доверяется DNS).
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an absolute http(s) URL")
+    
+    hostname = parts.hostname.lower()
+    allowed_hosts = config.webhook.allowed_hosts
+    if allowed_hosts:
+        if hostname not in allowed_hosts:
+            raise ValueError(f"callback_url host {parts.hostname} is not allowed")
+        return url, None
+    
+    addresses = await _resolve(hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    if not addresses or not all(_is_public_address(address) for address in addresses):
+        raise ValueError(f"callback_url host {parts.hostname} resolves to a non-public address")
+    
+    return url, addresses[0]
+
+
+async def validate_callback_url(url: str) -> str:
+    """
+    Проверить URL для webhook, возвращает нормализованный URL или бросает ValueError.
+    Хост из WEBHOOK_ALLOWED_HOSTS разрешён всегда; при пустом списке хост должен
+    разрешаться только в публичные адреса, иначе сервер можно заставить отправлять
+    запросы во внутреннюю сеть. Проверка повторяется перед каждой доставкой.
+    """
+    url, _ = await _check_callback_url(url)
+    return url
+
+
+def _pin_address(url: str, address: str) -> Tuple[str, str, dict]:
+    """
+    URL с проверенным адресом вместо хоста, заголовок Host и расширения запроса.
+    Соединение идёт на адрес, прошедший проверку: повторное разрешение имени
+    при подключении могло бы вернуть внутренний адрес (DNS rebinding).
+    SNI и проверка сертификата выполняются по исходному имени хоста.
+    """
+    parts = urlsplit(url)
+    host = f"[{address}]" if ":" in address else address
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    userinfo, _, netloc = parts.netloc.rpartition("@")
+    pinned = parts._replace(netloc=f"{userinfo}@{host}" if userinfo else host)
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return urlunsplit(pinned), netloc, extensions
+
+
+def sign_payload(body: bytes, timestamp: str, secret: str) -> str:
+    """HMAC-SHA256 подпись строки "<timestamp>.<body>" """
+    message = timestamp.encode("ascii") + b"." + body
+    return "sha256=" + hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+class WebhookService:
+    """Доставка webhook с подписью, ограниченными повторами и журналом попыток"""
+    
+    def __init__(self, delivery_repo: AsyncWebhookDeliveryRepository):
+        self.delivery_repo = delivery_repo
+    
+    @staticmethod
+    def build_payload(task_id: str, status: str, error: Optional[str] = None, **extra) -> dict:
+        """Тело уведомления о завершении задачи (download_url — только при заданном PUBLIC_BASE_URL)"""
+        download_url = None
+        if status == "completed" and config.webhook.public_base_url:
+            download_url = (
+                f"{config.webhook.public_base_url.rstrip('/')}{config.app.root_path.rstrip('/')}"
+                f"/api/v1/tasks/{task_id}/download"
+            )
+        
+        return {
+            "event": f"task.{status}",
+            "task_id": task_id,
+            "status": status,
+            "error": error,
+            "download_url": download_url,
+            **extra,
+        }
+    
+    async def deliver(self, task_id: str, url: str, payload: dict, logger: CustomLogger) -> bool:
+        """
+        Отправить уведомление, повторяя при сетевых ошибках, 429 и 5xx.
+        Адрес проверяется перед каждой попыткой (DNS мог измениться после создания
+        задачи), соединение идёт на проверенный адрес, перенаправления не выполняются.
+        """
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        event = payload.get("event", "task")
+        max_attempts = max(1, config.webhook.max_attempts)
+        
+        async with httpx.AsyncClient(timeout=httpx.Timeout(config.webhook.timeout), follow_redirects=False) as client:
+            for attempt in range(1, max_attempts + 1):
+                status_code, error, retryable = None, None, True
+                started = time.perf_counter()
+                try:
+                    request_url, address = await _check_callback_url(url)
+                except ValueError as e:
+                    error = str(e)
+                    await self._log_attempt(task_id, url, event, attempt, 0, False, None, error, logger)
+                    break
+                
+                headers, extensions = self._headers(body, task_id, attempt), {}
+                if address:
+                    request_url, headers["Host"], extensions = _pin_address(request_url, address)
+                
+                try:
+                    response = await client.post(
+                        request_url, content=body, headers=headers, extensions=extensions
+                    )
+                    status_code = response.status_code
+                    if response.is_success:
+                        retryable = False
+                    else:
+                        error = f"HTTP {status_code}"
+                        retryable = status_code in _RETRYABLE_STATUS_CODES
+                    record_upstream("webhook", time.perf_counter() - started, status_code=status_code)
+                except httpx.HTTPError as e:
+                    error = f"{type(e).__name__}: {e}"
+                    outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "network_error"
+                    record_upstream("webhook", time.perf_counter() - started, outcome=outcome)
+                
+                delivered = status_code is not None and error is None
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                await self._log_attempt(task_id, url, event, attempt, duration_ms, delivered, status_code, error, logger)
+                
+                if delivered:
+                    logger.info(f"Webhook {event} для задачи {task_id} доставлен с попытки {attempt}")
+                    return True
+                
+                if not retryable or attempt == max_attempts:
+                    break
+                
+                await asyncio.sleep(self._backoff(attempt))
+        
+        logger.warning(f"Webhook {event} для задачи {task_id} не доставлен: {error}")
+        return False
+    
+    @staticmethod
+    def _headers(body: bytes, task_id: str, attempt: int) -> dict:
+        """Заголовки запроса (подпись добавляется, если задан WEBHOOK_SECRET)"""
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "photo-processing-webhook/1.0",
+            "X-Webhook-Task-Id": task_id,
+            "X-Webhook-Attempt": str(attempt),
+            "X-Webhook-Timestamp": timestamp,
+        }
+        if config.webhook.secret:
+            headers["X-Webhook-Signature"] = sign_payload(body, timestamp, config.webhook.secret)
+        return headers
+    
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Экспоненциальная задержка с джиттером"""
+        delay = min(config.webhook.backoff_seconds * (2 ** (attempt - 1)), config.webhook.max_backoff_seconds)
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def _log_attempt(self, task_id, url, event, attempt, duration_ms, delivered, status_code, error, logger) -> None:
+        """Записать попытку в журнал (сбой журнала не прерывает доставку)"""
+        try:
+            await self.delivery_repo.log_attempt(
+                task_id=task_id,
+                url=url,
+                event=event,
+                attempt=attempt,
+                duration_ms=duration_ms,
+                delivered=delivered,
+                status_code=status_code,
+                error=error,
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось записать попытку доставки webhook: {e}")
@@ -0,0 +1,73 @@
+"""
+Запуск воркера: замер времени старта и прогрев тяжёлых модулей.
+
+Импорт приложения не создаёт каталогов, движков БД и фоновых задач — всё это
+делается в lifespan. Модули процессоров (openai, aiohttp, Pillow) не нужны до
+первой задачи: они импортируются в фоновом потоке после запуска воркера либо
+один раз в мастере в режиме preload-then-fork (api/serve.py).
+"""
+import importlib
+import logging
+import os
+import time
+from typing import Optional
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+# Модули, импорт которых откладывается до первой задачи
+HEAVY_MODULES = (
+    "api.processors.async_white_processor",
+    "api.processors.async_interior_processor",
+)
+
+
+def process_age() -> Optional[float]:
+    """Сколько секунд назад создан процесс (для воркера, порождённого fork, — с момента fork)"""
+    try:
+        with open("/proc/self/stat") as f:
+            stat = f.read()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+    # Имя процесса в скобках может содержать пробелы: поля считаются после ')',
+    # starttime — 22-е поле, то есть 20-е после имени
+    start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+    return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+def import_heavy_modules() -> float:
+    """Импортировать модули процессоров, вернуть затраченное время"""
+    started = time.perf_counter()
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    return time.perf_counter() - started
+
+
+class StartupTimer:
+    """Фазы запуска воркера: boot (от создания процесса до lifespan), startup (lifespan), ready"""
+    
+    def __init__(self):
+        self.boot_seconds = process_age()
+        self._started = time.perf_counter()
+    
+    def ready(self) -> None:
+        startup = time.perf_counter() - self._started
+        metrics.WORKER_STARTUP_SECONDS.labels("startup").set(startup)
+        if self.boot_seconds is None:
+            logger.info(f"Worker {os.getpid()} ready: startup {startup:.3f}s")
+            return
+        metrics.WORKER_STARTUP_SECONDS.labels("boot").set(self.boot_seconds)
+        metrics.WORKER_STARTUP_SECONDS.labels("ready").set(self.boot_seconds + startup)
+        logger.info(
+            f"Worker {os.getpid()} ready in {self.boot_seconds + startup:.3f}s "
+            f"(boot {self.boot_seconds:.3f}s, startup {startup:.3f}s)"
+        )
+
+
+def warm_up() -> None:
+    """Прогрев модулей процессоров (выполняется в потоке, чтобы не блокировать event loop)"""
+    seconds = import_heavy_modules()
+    metrics.WORKER_STARTUP_SECONDS.labels("warmup").set(seconds)
+    logger.info(f"Worker {os.getpid()} warmed up processor modules in {seconds:.3f}s")
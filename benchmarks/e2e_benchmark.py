@@ -0,0 +1,359 @@
+"""
+Сквозной бенчмарк API с локальными заглушками Pixian, LiteLLM и Google Sheets.
+
+Поднимает заглушки (benchmarks.upstream_stubs), запускает uvicorn с API,
+направленным на них, и нагружает /processing/parallel, /processing/remove_background
+и /processing/generate_image с заданной конкурентностью. Выводит пропускную
+способность, p50/p95/p99 задержки, пиковый RSS и CPU на изображение для процессов API.
+
+Запуск (нужна БД из DATABASE_URL с применёнными миграциями):
+    python -m benchmarks.e2e_benchmark --scenarios remove_background,generate_image,parallel \\
+        --requests 40 --concurrency 8 --workers 4 --pixian-latency lognormal:1.5:0.3
+
+Против уже запущенного API (его окружение должно указывать на заглушки, см. upstream_stubs):
+    python -m benchmarks.e2e_benchmark --app-url http://127.0.0.1:8002 --user-id <uuid>
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Set, Tuple
+import httpx
+from PIL import Image
+
+from benchmarks.upstream_stubs import UpstreamStubs, add_stub_arguments, stubs_from_args
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int = 0
+    errors: int = 0
+    images: int = 0
+    wall_seconds: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+    peak_rss_mb: float = 0.0
+    cpu_seconds: float = 0.0
+    
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.latencies_ms) or [0.0]
+        return {
+            "scenario": self.scenario,
+            "requests": self.requests,
+            "errors": self.errors,
+            "images": self.images,
+            "throughput_img_s": self.images / self.wall_seconds if self.wall_seconds else 0.0,
+            "p50_ms": _percentile(ordered, 50),
+            "p95_ms": _percentile(ordered, 95),
+            "p99_ms": _percentile(ordered, 99),
+            "mean_ms": statistics.fmean(ordered),
+            "peak_rss_mb": self.peak_rss_mb,
+            "cpu_ms_per_image": self.cpu_seconds * 1000 / self.images if self.images else 0.0,
+        }
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+# ── Процессы API: CPU и RSS из /proc ─────────────────────────────────────
+
+def _process_tree(root_pid: int) -> Set[int]:
+    """PID корневого процесса и всех его потомков (воркеры uvicorn)"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    
+    tree, stack = set(), [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.add(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _cpu_seconds(pids: Set[int]) -> float:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / _CLK_TCK
+
+
+def _rss_bytes(pids: Set[int]) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * _PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class ResourceSampler:
+    """Периодически замеряет суммарный RSS процессов API и считает CPU за прогон"""
+    
+    def __init__(self, root_pid: Optional[int], interval: float = 0.1):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._task: Optional[asyncio.Task] = None
+        self._cpu_start = 0.0
+    
+    def start(self) -> None:
+        if self.root_pid is None:
+            return
+        self.peak_rss = 0
+        self._cpu_start = _cpu_seconds(_process_tree(self.root_pid))
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> Tuple[float, float]:
+        """Вернуть (пиковый RSS в МБ, CPU-секунды за прогон)"""
+        if self._task is None:
+            return 0.0, 0.0
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        cpu = _cpu_seconds(_process_tree(self.root_pid)) - self._cpu_start
+        return self.peak_rss / (1024 * 1024), cpu
+    
+    async def _run(self) -> None:
+        while True:
+            pids = await asyncio.to_thread(_process_tree, self.root_pid)
+            self.peak_rss = max(self.peak_rss, _rss_bytes(pids))
+            await asyncio.sleep(self.interval)
+
+
+# ── Синтетические входные изображения ────────────────────────────────────
+
+def _make_corpus(count: int, size: Tuple[int, int], sheet_codes: List[str], sheet_hit_ratio: float) -> List[Tuple[str, bytes]]:
+    """JPEG с шумом (реалистичный размер файла); часть имён содержит коды из CSV-заглушки"""
+    variants = []
+    for seed in range(min(count, 4)):
+        noise = Image.effect_noise(size, 40 + seed * 10)
+        base = Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+        buffer = io.BytesIO()
+        base.save(buffer, format="JPEG", quality=90)
+        variants.append(buffer.getvalue())
+    
+    corpus = []
+    for i in range(count):
+        if random.random() < sheet_hit_ratio:
+            code = random.choice(sheet_codes)
+        else:
+            code = f"{900000 + i % 99999}"
+        corpus.append((f"{code}_bench_{i}.jpg", variants[i % len(variants)]))
+    return corpus
+
+
+# ── Сценарии ─────────────────────────────────────────────────────────────
+
+async def _single_image_request(client: httpx.AsyncClient, path: str, image: Tuple[str, bytes]) -> int:
+    filename, data = image
+    response = await client.post(path, files={"file": (filename, data, "image/jpeg")})
+    response.raise_for_status()
+    return 1
+
+
+async def _parallel_request(client: httpx.AsyncClient, images: List[Tuple[str, bytes]], white_bg: bool, poll_interval: float) -> int:
+    files = [("files", (filename, data, "image/jpeg")) for filename, data in images]
+    response = await client.post("/api/v1/processing/parallel", params={"white_bg": str(white_bg).lower()}, files=files)
+    response.raise_for_status()
+    task_id = response.json()["task_id"]
+    
+    while True:
+        await asyncio.sleep(poll_interval)
+        status = (await client.get(f"/api/v1/tasks/{task_id}/status")).json()
+        if status["status"] == "failed":
+            raise RuntimeError(status.get("error") or "task failed")
+        if status["status"] == "completed":
+            break
+    
+    download = await client.get(f"/api/v1/tasks/{task_id}/download")
+    download.raise_for_status()
+    return len(images)
+
+
+async def run_scenario(
+    name: str,
+    client: httpx.AsyncClient,
+    corpus: List[Tuple[str, bytes]],
+    args: argparse.Namespace,
+    sampler: ResourceSampler
+) -> ScenarioResult:
+    """Выполнить args.requests запросов сценария с конкурентностью args.concurrency"""
+    result = ScenarioResult(scenario=name)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if name == "remove_background":
+                    images = await _single_image_request(client, "/api/v1/processing/remove_background", corpus[i % len(corpus)])
+                elif name == "generate_image":
+                    images = await _single_image_request(client, "/api/v1/processing/generate_image", corpus[i % len(corpus)])
+                else:
+                    batch = [corpus[(i * args.batch_size + j) % len(corpus)] for j in range(args.batch_size)]
+                    images = await _parallel_request(client, batch, args.white_bg, args.poll_interval)
+            except Exception as e:
+                result.errors += 1
+                if args.verbose:
+                    print(f"[{name}] request {i} failed: {e!r}", file=sys.stderr)
+                return
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+            result.images += images
+    
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    result.wall_seconds = time.perf_counter() - started
+    result.peak_rss_mb, result.cpu_seconds = await sampler.stop()
+    result.requests = args.requests
+    return result
+
+
+# ── Запуск API и тестового пользователя ──────────────────────────────────
+
+async def _wait_healthy(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).json().get("status") == "healthy":
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"API at {base_url} did not become healthy in {timeout} s")
+
+
+def _start_app(port: int, workers: int, stub_env: Dict[str, str]) -> subprocess.Popen:
+    env = {**os.environ, **stub_env}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        env=env,
+    )
+
+
+def _create_user() -> str:
+    from api.repositories import UserRepository
+    user = UserRepository.create(username=f"benchmark-{uuid.uuid4().hex[:8]}", is_admin=False, rate_limit=10000)
+    return str(user.id)
+
+
+def _delete_user(user_id: str) -> None:
+    from api.repositories import UserRepository
+    UserRepository.delete(uuid.UUID(user_id))
+
+
+def _print_report(summaries: List[Dict[str, float]]) -> None:
+    header = f"{'scenario':<18} {'req':>5} {'err':>4} {'img':>5} {'img/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8} {'CPU ms/img':>11}"
+    print(header)
+    for s in summaries:
+        print(
+            f"{s['scenario']:<18} {s['requests']:>5} {s['errors']:>4} {s['images']:>5} {s['throughput_img_s']:>7.2f} "
+            f"{s['p50_ms']:>9.0f} {s['p95_ms']:>9.0f} {s['p99_ms']:>9.0f} {s['peak_rss_mb']:>8.0f} {s['cpu_ms_per_image']:>11.1f}"
+        )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    sheet_codes = [f"{100000 + i}" for i in range(args.sheet_rows)]
+    stubs = stubs_from_args(args, sheet_codes)
+    await stubs.start("127.0.0.1", args.stub_port)
+    
+    app_process = None
+    base_url = args.app_url
+    user_id = args.user_id
+    created_user = False
+    try:
+        if base_url is None:
+            app_process = _start_app(args.app_port, args.workers, UpstreamStubs.environment("127.0.0.1", args.stub_port))
+            base_url = f"http://127.0.0.1:{args.app_port}"
+        await _wait_healthy(base_url, timeout=60)
+        
+        if user_id is None:
+            user_id = await asyncio.to_thread(_create_user)
+            created_user = True
+        
+        width, height = (int(v) for v in args.image_size.lower().split("x"))
+        corpus = _make_corpus(args.corpus_size, (width, height), sheet_codes, args.sheet_hit_ratio)
+        
+        sampler = ResourceSampler(app_process.pid if app_process else args.app_pid)
+        timeout = httpx.Timeout(args.request_timeout)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        summaries = []
+        async with httpx.AsyncClient(base_url=base_url, headers={"X-User-Id": user_id}, timeout=timeout, limits=limits) as client:
+            for scenario in args.scenarios.split(","):
+                result = await run_scenario(scenario.strip(), client, corpus, args, sampler)
+                summaries.append(result.summary())
+        
+        _print_report(summaries)
+        print(f"Stub requests: {stubs.requests}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "results": summaries, "stub_requests": stubs.requests}, f, indent=2, default=str)
+    finally:
+        if created_user:
+            await asyncio.to_thread(_delete_user, user_id)
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        await stubs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="remove_background,generate_image,parallel")
+    parser.add_argument("--requests", type=int, default=40, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=5, help="Файлов в одном запросе /processing/parallel")
+    parser.add_argument("--white-bg", action=argparse.BooleanOptionalAction, default=True, help="Тип обработки для parallel")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--image-size", default="3000x4000", help="Размер синтетических изображений")
+    parser.add_argument("--corpus-size", type=int, default=20)
+    parser.add_argument("--sheet-rows", type=int, default=1000)
+    parser.add_argument("--sheet-hit-ratio", type=float, default=0.5, help="Доля файлов с кодом из CSV")
+    parser.add_argument("--workers", type=int, default=4, help="Воркеров uvicorn для запускаемого API")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--app-url", help="URL уже запущенного API (не запускать свой)")
+    parser.add_argument("--app-pid", type=int, help="PID уже запущенного API для замеров CPU/RSS")
+    parser.add_argument("--user-id", help="X-User-Id (по умолчанию создаётся временный пользователь)")
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    parser.add_argument("--verbose", action="store_true")
+    add_stub_arguments(parser)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
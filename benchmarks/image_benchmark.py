@@ -0,0 +1,368 @@
+"""
+Микро-бенчмарки CPU-операций ImageProcessor, ImagePreprocessor и создания zip-архива.
+
+Синтетический корпус реалистичных разрешений: фото с телефона (12 Мп, EXIF-поворот),
+кадр с зеркальной камеры (24 Мп) и PNG с альфа-каналом. Каждая пара
+(операция, изображение) выполняется в отдельном дочернем процессе, чтобы пиковый
+RSS не смешивался между замерами. Результаты можно сохранить как базовые и
+сравнивать с ними: при регрессии времени или памяти сверх порога код выхода 1.
+
+Запуск:
+    python -m benchmarks.image_benchmark --save-baseline benchmarks/image_baseline.json
+    python -m benchmarks.image_benchmark --baseline benchmarks/image_baseline.json --threshold 0.15
+
+Замер памяти использует /proc (Linux).
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+import PIL
+from PIL import Image
+
+from interior.image_processor import ImageProcessor
+from white.image_preprocessor import ImagePreprocessor
+from api.processors.async_base import AsyncBaseProcessor
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# Размеры фиксированы, а не берутся из конфига, чтобы базовые результаты не зависели от окружения
+_PIXIAN_TARGET_SIZE = "1800 2400"
+_GENERATE_MAX_SIDE = 1200
+_CATEGORIZE_MAX_SIDE = 384
+_ZIP_FILES = 20
+
+
+# ── Синтетический корпус ─────────────────────────────────────────────────
+
+def _textured_rgb(size: Tuple[int, int]) -> Image.Image:
+    """Градиенты с шумом: сжимается в JPEG примерно как настоящая фотография"""
+    width, height = size
+    horizontal = Image.linear_gradient("L").rotate(90).resize(size)
+    vertical = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 24)
+    return Image.merge("RGB", (
+        Image.blend(horizontal, noise, 0.25),
+        Image.blend(vertical, noise, 0.25),
+        Image.blend(horizontal.transpose(Image.Transpose.FLIP_TOP_BOTTOM), noise, 0.35),
+    ))
+
+
+def _phone_photo() -> bytes:
+    """12 Мп JPEG, снятый вертикально: пиксели лежат горизонтально, EXIF Orientation = 6"""
+    img = _textured_rgb((4032, 3024))
+    exif = img.getexif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def _dslr_photo() -> bytes:
+    """24 Мп JPEG 6000x4000"""
+    buffer = io.BytesIO()
+    _textured_rgb((6000, 4000)).save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def _png_alpha() -> bytes:
+    """PNG 2400x2400 с прозрачным фоном вокруг товара"""
+    size = (2400, 2400)
+    alpha = Image.radial_gradient("L").resize(size).point(lambda v: 255 if v < 160 else 0)
+    img = _textured_rgb(size).convert("RGBA")
+    img.putalpha(alpha)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=6)
+    return buffer.getvalue()
+
+
+CORPUS: Dict[str, Callable[[], bytes]] = {
+    "phone_12mp": _phone_photo,
+    "dslr_24mp": _dslr_photo,
+    "png_alpha": _png_alpha,
+}
+
+
+def _generate(name: str) -> bytes:
+    return CORPUS[name]()
+
+
+def generate_corpus(names: List[str]) -> Dict[str, bytes]:
+    """Сгенерировать корпус в отдельном процессе: память, освобождённая после
+    генерации, иначе осталась бы в куче родителя и исказила замеры RSS"""
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        return dict(zip(names, pool.map(_generate, names)))
+
+
+# ── Операции ─────────────────────────────────────────────────────────────
+
+def _decoded_rgb(data: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _to_3_4_size(img: Image.Image) -> Tuple[int, int]:
+    """Целевой размер, как в ImageProcessor.format_image_3_4"""
+    width, height = img.size
+    if width / height > 3 / 4:
+        return width, int(width / (3 / 4))
+    return int(height * (3 / 4)), height
+
+
+def _zip_batch(data: bytes) -> List[Tuple[str, bytes]]:
+    result = ImageProcessor.encode_jpeg(ImageProcessor.crop_to_3_4(_decoded_rgb(data)), 95)
+    return [(f"result_{i}.jpg", result) for i in range(_ZIP_FILES)]
+
+
+@dataclass
+class Case:
+    """Операция: setup готовит вход вне замера, run — замеряемая часть"""
+    name: str
+    setup: Callable[[bytes], object]
+    run: Callable[[object], object]
+    # Медленные операции повторяются меньшее число раз
+    max_repeat: Optional[int] = None
+
+
+def _decode(data: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def _orient(img: Image.Image) -> Image.Image:
+    return ImageProcessor.apply_orientation(img, ImageProcessor.get_image_orientation(img))
+
+
+def _extend(img: Image.Image) -> Image.Image:
+    return ImageProcessor.extend_with_border_color(img, *_to_3_4_size(img))
+
+
+def _zip(files: List[Tuple[str, bytes]]) -> io.BytesIO:
+    return asyncio.run(AsyncBaseProcessor("benchmark").create_zip_response(files))
+
+
+CASES: Dict[str, Case] = {case.name: case for case in (
+    Case("decode", setup=lambda data: data, run=_decode),
+    Case("apply_orientation", setup=_decode, run=_orient),
+    Case("extend_with_border_color", setup=_decoded_rgb, run=_extend, max_repeat=1),
+    Case("crop_to_3_4", setup=_decoded_rgb, run=ImageProcessor.crop_to_3_4),
+    Case("resize_lanczos_generate", setup=_decoded_rgb, run=lambda img: ImageProcessor.fit_to_max_side(img, _GENERATE_MAX_SIDE)),
+    Case("resize_lanczos_categorize", setup=_decoded_rgb, run=lambda img: ImageProcessor.fit_to_max_side(img, _CATEGORIZE_MAX_SIDE)),
+    Case("encode_jpeg_q95", setup=lambda data: ImageProcessor.crop_to_3_4(_decoded_rgb(data)), run=lambda img: ImageProcessor.encode_jpeg(img, 95)),
+    Case("prepare_for_upload", setup=lambda data: data, run=lambda data: ImagePreprocessor.prepare_for_upload(data, _PIXIAN_TARGET_SIZE, 95)),
+    Case("create_zip_response", setup=_zip_batch, run=_zip),
+)}
+
+
+# ── Замеры ───────────────────────────────────────────────────────────────
+
+@dataclass
+class Measurement:
+    case: str
+    corpus: str
+    repeat: int
+    median_ms: float
+    min_ms: float
+    peak_rss_mb: float
+    
+    @property
+    def key(self) -> str:
+        return f"{self.case}/{self.corpus}"
+
+
+def _current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+
+def _reset_peak_rss() -> None:
+    """Сбросить VmHWM: иначе дочерний процесс наследует пик родителя после fork"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure_in_child(case: Case, data: bytes, warmup: int, repeat: int, conn) -> None:
+    """Выполняется в дочернем процессе: возвращает (времена в мс, прирост пикового RSS)"""
+    try:
+        prepared = case.setup(data)
+        _reset_peak_rss()
+        rss_before = _current_rss()
+        
+        for _ in range(warmup):
+            case.run(prepared)
+        
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case.run(prepared)
+            timings.append((time.perf_counter() - started) * 1000)
+        
+        conn.send((timings, max(0, _peak_rss() - rss_before)))
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+
+def measure(case: Case, corpus: str, data: bytes, warmup: int, repeat: int) -> Measurement:
+    if case.max_repeat is not None:
+        repeat = min(repeat, case.max_repeat)
+        warmup = 0
+    
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_in_child, args=(case, data, warmup, repeat, child_conn))
+    process.start()
+    child_conn.close()
+    result = parent_conn.recv()
+    process.join()
+    
+    if isinstance(result, Exception):
+        raise RuntimeError(f"{case.name}/{corpus} failed: {result}") from result
+    
+    timings, peak_rss = result
+    return Measurement(
+        case=case.name,
+        corpus=corpus,
+        repeat=repeat,
+        median_ms=statistics.median(timings),
+        min_ms=min(timings),
+        peak_rss_mb=peak_rss / (1024 * 1024),
+    )
+
+
+# ── Базовые результаты ───────────────────────────────────────────────────
+
+def _environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": str(os.cpu_count()),
+    }
+
+
+def save_baseline(path: str, results: List[Measurement]) -> None:
+    payload = {
+        "environment": _environment(),
+        "results": {m.key: asdict(m) for m in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def compare(
+    baseline_path: str,
+    results: List[Measurement],
+    threshold: float,
+    memory_threshold: float,
+    min_delta_ms: float,
+    min_delta_mb: float,
+) -> List[str]:
+    """Список регрессий относительно базовых результатов"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    
+    if baseline.get("environment") != _environment():
+        print(f"warning: baseline environment differs: {baseline.get('environment')} vs {_environment()}", file=sys.stderr)
+    
+    regressions = []
+    for m in results:
+        base = baseline["results"].get(m.key)
+        if base is None:
+            continue
+        
+        # Небольшие абсолютные изменения считаются шумом, даже если относительно они велики
+        if m.median_ms > base["median_ms"] * (1 + threshold) and m.median_ms - base["median_ms"] > min_delta_ms:
+            regressions.append(f"{m.key}: median {base['median_ms']:.1f} -> {m.median_ms:.1f} ms ({m.median_ms / base['median_ms'] - 1:+.0%})")
+        
+        if m.peak_rss_mb > base["peak_rss_mb"] * (1 + memory_threshold) and m.peak_rss_mb - base["peak_rss_mb"] > min_delta_mb:
+            regressions.append(f"{m.key}: peak RSS {base['peak_rss_mb']:.1f} -> {m.peak_rss_mb:.1f} MB")
+    
+    return regressions
+
+
+def _print_table(results: List[Measurement], baseline: Optional[Dict[str, dict]]) -> None:
+    header = f"{'case':<28}{'corpus':<12}{'n':>3}{'median ms':>12}{'min ms':>10}{'peak MB':>10}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+    print("-" * len(header))
+    for m in results:
+        line = f"{m.case:<28}{m.corpus:<12}{m.repeat:>3}{m.median_ms:>12.1f}{m.min_ms:>10.1f}{m.peak_rss_mb:>10.1f}"
+        if baseline:
+            base = baseline.get(m.key)
+            line += f"{m.median_ms / base['median_ms'] - 1:>+10.0%}" if base else f"{'new':>10}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=",".join(CASES), help="Операции через запятую")
+    parser.add_argument("--corpus", default=",".join(CORPUS), help="Изображения через запятую")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--baseline", help="Сравнить с базовыми результатами из JSON")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как базовые")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Допустимый рост медианы времени (доля)")
+    parser.add_argument("--memory-threshold", type=float, default=0.20, help="Допустимый рост пикового RSS (доля)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Меньший абсолютный рост времени не считается регрессией")
+    parser.add_argument("--min-delta-mb", type=float, default=8.0, help="Меньший абсолютный рост RSS не считается регрессией")
+    args = parser.parse_args()
+    
+    cases = [CASES[name] for name in args.cases.split(",") if name]
+    corpus_names = [name for name in args.corpus.split(",") if name]
+    corpus = generate_corpus(corpus_names)
+    
+    results = []
+    for case in cases:
+        for name in corpus_names:
+            measurement = measure(case, name, corpus[name], args.warmup, args.repeat)
+            print(f"  {measurement.key}: {measurement.median_ms:.1f} ms", file=sys.stderr)
+            results.append(measurement)
+    
+    baseline_results = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_results = json.load(f)["results"]
+    _print_table(results, baseline_results)
+    
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f"Baseline saved to {args.save_baseline}")
+    
+    if args.baseline:
+        regressions = compare(args.baseline, results, args.threshold, args.memory_threshold, args.min_delta_ms, args.min_delta_mb)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
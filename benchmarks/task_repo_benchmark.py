@@ -0,0 +1,113 @@
+"""
+Микро-бенчмарк операций TaskRepository: старый вариант (SELECT → изменение →
+COMMIT → refresh) против UPDATE ... RETURNING.
+
+Запуск (нужна БД из DATABASE_URL с применёнными миграциями):
+    python -m benchmarks.task_repo_benchmark --iterations 200 --result-size 2000000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from database.db_session import get_db
+from database.models import Task
+from api.repositories.task_repo import TaskRepository
+
+
+def _legacy_update(task_id: str, **kwargs) -> Task:
+    """Прежняя реализация TaskRepository.update"""
+    with get_db() as db:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        for key, value in kwargs.items():
+            if hasattr(task, key) and key != "result_data":
+                setattr(task, key, value)
+        db.commit()
+        db.refresh(task)
+        db.expunge(task)
+        return task
+
+
+def _legacy_set_result(task_id: str, result_data: bytes) -> Task:
+    """Прежняя реализация TaskRepository.set_result"""
+    with get_db() as db:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        task.result_data = result_data
+        task.end_time = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(task)
+        db.expunge(task)
+        return task
+
+
+def _legacy_set_error(task_id: str, error: str) -> Task:
+    """Прежняя реализация TaskRepository.set_error"""
+    with get_db() as db:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        task.error = error
+        task.status = "failed"
+        task.end_time = datetime.now(timezone.utc)
+        db.commit()
+        db.refresh(task)
+        db.expunge(task)
+        return task
+
+
+def _measure(call: Callable[[int], object], iterations: int) -> List[float]:
+    """Возвращает время каждого вызова в миллисекундах"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        call(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--result-size", type=int, default=2_000_000, help="Размер result_data в байтах")
+    args = parser.parse_args()
+    
+    result_data = b"\0" * args.result_size
+    task = TaskRepository.create(white_bg=True, total_files=args.iterations)
+    # Задача уже с результатом — как при опросе завершённых задач
+    TaskRepository.set_result(task.id, result_data)
+    
+    cases = {
+        "update": (
+            lambda i: _legacy_update(task.id, status="processing", progress=i % 100, processed_files=i),
+            lambda i: TaskRepository.update(task.id, status="processing", progress=i % 100, processed_files=i),
+        ),
+        "set_result": (
+            lambda i: _legacy_set_result(task.id, result_data),
+            lambda i: TaskRepository.set_result(task.id, result_data),
+        ),
+        "set_error": (
+            lambda i: _legacy_set_error(task.id, f"error {i}"),
+            lambda i: TaskRepository.set_error(task.id, f"error {i}"),
+        ),
+    }
+    
+    try:
+        print(f"{'operation':<12} {'variant':<8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, (legacy, lean) in cases.items():
+            for variant, call in (("legacy", legacy), ("lean", lean)):
+                stats = _summary(_measure(call, args.iterations))
+                print(f"{name:<12} {variant:<8} {stats['mean']:>9.2f} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+    finally:
+        TaskRepository.delete(task.id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Локальные заглушки внешних сервисов для бенчмарков: Pixian remove-background,
+OpenAI-совместимый chat completions (LiteLLM) и CSV-выгрузка вместо Google Sheets.
+
+Задержка задаётся распределением:
+    fixed:0.5            — всегда 0.5 с
+    uniform:0.2:1.5      — равномерно от 0.2 до 1.5 с
+    lognormal:0.8:0.4    — логнормально с медианой 0.8 с и sigma 0.4
+
+Запуск отдельно (для ручных прогонов против уже запущенного API):
+    python -m benchmarks.upstream_stubs --port 9100 --pixian-latency lognormal:1.5:0.3
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+from aiohttp import web
+from PIL import Image
+
+CATEGORIES = [
+    "KITCHEN|COOKWARE",
+    "BATHROOM|TOWELS",
+    "LIVING_ROOM|DECOR",
+    "BEDROOM|BEDDING",
+    "OFFICE|STATIONERY",
+    "GARDEN|PLANTS",
+]
+
+
+@dataclass
+class Latency:
+    """Распределение задержки ответа"""
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+    
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params] + [0.0, 0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        return cls(kind, values[0], values[1])
+    
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return random.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return self.a * math.exp(random.gauss(0, self.b)) if self.a > 0 else 0.0
+        return self.a
+
+
+@dataclass
+class StubBehaviour:
+    """Поведение одной заглушки: задержка и доли ошибок"""
+    latency: Latency
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    
+    async def respond_with_failure(self) -> web.Response | None:
+        """Выдержать задержку и, возможно, вернуть ошибку"""
+        await asyncio.sleep(self.latency.sample())
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response({"error": "rate limited"}, status=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response({"error": "stub failure"}, status=500)
+        return None
+
+
+def _encode_image(size, image_format: str, color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=image_format, quality=85)
+    return buffer.getvalue()
+
+
+class UpstreamStubs:
+    """aiohttp-приложение со всеми заглушками и счётчиками запросов"""
+    
+    def __init__(self, pixian: StubBehaviour, llm: StubBehaviour, sheet: StubBehaviour, sheet_codes: List[str]):
+        self.pixian = pixian
+        self.llm = llm
+        self.sheet = sheet
+        self.requests: Dict[str, int] = {"pixian": 0, "llm_categorize": 0, "llm_generate": 0, "sheet": 0}
+        
+        self._pixian_png = _encode_image((1800, 2400), "PNG", (255, 255, 255))
+        generated = _encode_image((1200, 1600), "JPEG", (200, 190, 170))
+        self._generated_url = f"data:image/jpeg;base64,{base64.b64encode(generated).decode('ascii')}"
+        rows = ["Код,Сегмент,Номенклатура"] + [f"{code},KITCHEN,Товар {code}" for code in sheet_codes]
+        self._csv = ("\n".join(rows) + "\n").encode("utf-8")
+        
+        self._runner: web.AppRunner | None = None
+    
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/pixian/remove-background", self._pixian_handler)
+        app.router.add_post("/llm/chat/completions", self._chat_handler)
+        app.router.add_get("/sheet.csv", self._sheet_handler)
+        return app
+    
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+    
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+    
+    @staticmethod
+    def environment(host: str, port: int) -> Dict[str, str]:
+        """Переменные окружения, направляющие API на заглушки"""
+        base = f"http://{host}:{port}"
+        return {
+            "PIXIAN_API_URL": f"{base}/pixian/remove-background",
+            "PIXIAN_API_USER": "bench",
+            "PIXIAN_API_KEY": "bench",
+            "BASE_URL": f"{base}/llm",
+            "OPENAI_API_KEY": "bench",
+            "SHEET_CSV_URL": f"{base}/sheet.csv",
+        }
+    
+    async def _pixian_handler(self, request: web.Request) -> web.Response:
+        self.requests["pixian"] += 1
+        await request.read()
+        failure = await self.pixian.respond_with_failure()
+        return failure or web.Response(body=self._pixian_png, content_type="image/png")
+    
+    async def _chat_handler(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        # Генерация отличается от категоризации отсутствием system-сообщения
+        is_generation = not any(m.get("role") == "system" for m in body.get("messages", []))
+        self.requests["llm_generate" if is_generation else "llm_categorize"] += 1
+        
+        failure = await self.llm.respond_with_failure()
+        if failure:
+            return failure
+        
+        if is_generation:
+            message = {
+                "role": "assistant",
+                "content": "",
+                "images": [{"type": "image_url", "image_url": {"url": self._generated_url}}],
+            }
+        else:
+            message = {"role": "assistant", "content": random.choice(CATEGORIES)}
+        
+        return web.json_response({
+            "id": f"chatcmpl-stub-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+    
+    async def _sheet_handler(self, request: web.Request) -> web.Response:
+        self.requests["sheet"] += 1
+        failure = await self.sheet.respond_with_failure()
+        return failure or web.Response(body=self._csv, content_type="text/csv")
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    """Общие параметры заглушек"""
+    for name, default in (("pixian", "lognormal:1.5:0.3"), ("llm", "lognormal:6:0.4"), ("sheet", "fixed:0.2")):
+        parser.add_argument(f"--{name}-latency", default=default, help=f"Распределение задержки {name}")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help=f"Доля ответов 500 от {name}")
+        parser.add_argument(f"--{name}-rate-limit-rate", type=float, default=0.0, help=f"Доля ответов 429 от {name}")
+
+
+def stubs_from_args(args: argparse.Namespace, sheet_codes: List[str]) -> UpstreamStubs:
+    def behaviour(name: str) -> StubBehaviour:
+        return StubBehaviour(
+            latency=Latency.parse(getattr(args, f"{name}_latency")),
+            error_rate=getattr(args, f"{name}_error_rate"),
+            rate_limit_rate=getattr(args, f"{name}_rate_limit_rate"),
+        )
+    
+    return UpstreamStubs(behaviour("pixian"), behaviour("llm"), behaviour("sheet"), sheet_codes)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    stubs = stubs_from_args(args, sheet_codes=[f"{100000 + i}" for i in range(args.sheet_rows)])
+    await stubs.start(args.host, args.port)
+    print(json.dumps(UpstreamStubs.environment(args.host, args.port), indent=2))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stubs.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--sheet-rows", type=int, default=1000, help="Количество кодов в CSV")
+    add_stub_arguments(parser)
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
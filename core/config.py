@@ -9,12 +9,13 @@ load_dotenv()
 
 @dataclass
 class DatabaseConfig:
-    """Конфигурация базы данных"""
+    """Конфигурация базы данных (URL проверяется при создании движка, а не при импорте)"""
     url: str = field(default_factory=lambda: os.getenv("DATABASE_URL") or "")
     
-    def __post_init__(self):
+    def require_url(self) -> str:
         if not self.url:
             raise ValueError("DATABASE_URL environment variable is required")
+        return self.url
 
 
 @dataclass
@@ -23,25 +24,78 @@ class AppConfig:
     base_dir: Path = field(default_factory=lambda: Path("/app") if os.path.exists("/app") else Path(__file__).parent.parent.parent)
     white_dir: Path = field(init=False)
     interior_dir: Path = field(init=False)
+    # Префикс, под которым приложение опубликовано за прокси (root_path FastAPI)
+    root_path: str = field(default_factory=lambda: os.getenv("ROOT_PATH", "/photo_processing"))
     
     log_token: str = field(default_factory=lambda: os.getenv("PORADOCK_LOG_TOKEN"))
+    log_buffer_size: int = field(default_factory=lambda: int(os.getenv("LOG_BUFFER_SIZE", 10000)))
+    log_batch_size: int = field(default_factory=lambda: int(os.getenv("LOG_BATCH_SIZE", 200)))
+    log_flush_interval_seconds: float = field(default_factory=lambda: float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", 1.0)))
+    log_pressure_sample_rate: float = field(default_factory=lambda: float(os.getenv("LOG_PRESSURE_SAMPLE_RATE", 0.1)))
 
     max_file_size: int = field(default_factory=lambda: int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))) 
     max_files_count: int = field(default_factory=lambda: int(os.getenv("MAX_FILES_COUNT", 50)))
     allowed_content_types: Set[str] = field(default_factory=lambda: {
         "image/jpeg", "image/jpg", "image/png", "image/webp"
     })
+    max_image_pixels: int = field(default_factory=lambda: int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000)))
+    max_image_side: int = field(default_factory=lambda: int(os.getenv("MAX_IMAGE_SIDE", 12000)))
     
     task_cleanup_interval_hours: int = field(default_factory=lambda: int(os.getenv("TASK_CLEANUP_INTERVAL_HOURS", 1)))
     task_max_age_hours: int = field(default_factory=lambda: int(os.getenv("TASK_MAX_AGE_HOURS", 24)))
+    task_cleanup_batch_size: int = field(default_factory=lambda: int(os.getenv("TASK_CLEANUP_BATCH_SIZE", 500)))
+    
+    # Продолжение задач упавших воркеров: heartbeat задачи, порог устаревания и проверка
+    task_heartbeat_seconds: int = field(default_factory=lambda: int(os.getenv("TASK_HEARTBEAT_SECONDS", 15)))
+    task_stale_seconds: int = field(default_factory=lambda: int(os.getenv("TASK_STALE_SECONDS", 120)))
+    task_recovery_interval_seconds: int = field(default_factory=lambda: int(os.getenv("TASK_RECOVERY_INTERVAL_SECONDS", 30)))
+    task_recovery_concurrency: int = field(default_factory=lambda: int(os.getenv("TASK_RECOVERY_CONCURRENCY", 2)))
+    task_max_resumes: int = field(default_factory=lambda: int(os.getenv("TASK_MAX_RESUMES", 3)))
+    
+    # Дедлайны по умолчанию (0 — без дедлайна): синхронного запроса и фоновой задачи
+    request_deadline_seconds: float = field(default_factory=lambda: float(os.getenv("REQUEST_DEADLINE_SECONDS", 0)))
+    task_deadline_seconds: int = field(default_factory=lambda: int(os.getenv("TASK_DEADLINE_SECONDS", 0)))
+    
+    auth_cache_ttl_seconds: int = field(default_factory=lambda: int(os.getenv("AUTH_CACHE_TTL_SECONDS", 30)))
+    last_used_flush_interval_seconds: int = field(default_factory=lambda: int(os.getenv("LAST_USED_FLUSH_INTERVAL_SECONDS", 60)))
+    
+    task_events_heartbeat_seconds: int = field(default_factory=lambda: int(os.getenv("TASK_EVENTS_HEARTBEAT_SECONDS", 15)))
+    category_refresh_interval_seconds: int = field(default_factory=lambda: int(os.getenv("CATEGORY_REFRESH_INTERVAL_SECONDS", 60)))
+    
+    profiling_enabled: bool = field(default_factory=lambda: os.getenv("PROFILING_ENABLED", "true").lower() == "true")
+    profile_interval_seconds: float = field(default_factory=lambda: float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.001)))
+    
+    loop_monitor_enabled: bool = field(default_factory=lambda: os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true")
+    loop_monitor_interval_seconds: float = field(default_factory=lambda: float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", 0.1)))
+    loop_block_threshold_seconds: float = field(default_factory=lambda: float(os.getenv("LOOP_BLOCK_THRESHOLD_SECONDS", 0.25)))
+    loop_monitor_max_offenders: int = field(default_factory=lambda: int(os.getenv("LOOP_MONITOR_MAX_OFFENDERS", 50)))
+    
+    # Переиспользование генерации интерьера для почти совпадающих входных фото
+    interior_dedup_enabled: bool = field(default_factory=lambda: os.getenv("INTERIOR_DEDUP_ENABLED", "false").lower() == "true")
+    interior_dedup_max_distance: int = field(default_factory=lambda: int(os.getenv("INTERIOR_DEDUP_MAX_DISTANCE", 4)))
+    interior_dedup_color_tolerance: int = field(default_factory=lambda: int(os.getenv("INTERIOR_DEDUP_COLOR_TOLERANCE", 24)))
+    interior_dedup_max_age_hours: int = field(default_factory=lambda: int(os.getenv("INTERIOR_DEDUP_MAX_AGE_HOURS", 720)))
+    
+    # Сохранять результаты обработки файлов с артикулом в библиотеку изображений
+    asset_library_enabled: bool = field(default_factory=lambda: os.getenv("ASSET_LIBRARY_ENABLED", "true").lower() == "true")
 
     sheet_id: str = field(default_factory=lambda: os.getenv("SHEET_ID", ""))
     gid: str = field(default_factory=lambda: os.getenv("GID", "1195334868"))
+    sheet_csv_url: str = field(default_factory=lambda: os.getenv("SHEET_CSV_URL", ""))
+    
+    # Сервер: воркеры uvicorn и режим preload-then-fork (см. api/serve.py)
+    workers: int = field(default_factory=lambda: int(os.getenv("WEB_CONCURRENCY", 4)))
+    server_preload: bool = field(default_factory=lambda: os.getenv("SERVER_PRELOAD", "false").lower() == "true")
+    # Импортировать модули процессоров (openai, aiohttp, Pillow) в фоне после запуска воркера,
+    # чтобы первый запрос не платил за импорт в event loop
+    processor_warmup: bool = field(default_factory=lambda: os.getenv("PROCESSOR_WARMUP", "true").lower() == "true")
     
     def __post_init__(self):
         self.white_dir = self.base_dir / "white"
         self.interior_dir = self.base_dir / "interior"
-        
+    
+    def ensure_dirs(self):
+        """Создать рабочие каталоги (вызывается при запуске приложения, не при импорте)"""
         (self.white_dir / "input").mkdir(parents=True, exist_ok=True)
         (self.white_dir / "output").mkdir(parents=True, exist_ok=True)
         (self.interior_dir / "input").mkdir(parents=True, exist_ok=True)
@@ -56,6 +110,16 @@ class OpenAIConfig:
     model_name: str = field(default_factory=lambda: os.getenv("MODEL_NAME", "openai-gpt-4.1-mini"))
     image_model: str = field(default_factory=lambda: os.getenv("IMAGE_MODEL", "gemini-2.5-flash-image"))
     base_url: str = field(default_factory=lambda: os.getenv("BASE_URL", "https://litellm.poryadok.ru"))
+    # Таймаут запроса и число повторов SDK (оба ограничиваются дедлайном запроса или задачи)
+    timeout: float = field(default_factory=lambda: float(os.getenv("OPENAI_TIMEOUT", 120)))
+    max_retries: int = field(default_factory=lambda: int(os.getenv("OPENAI_MAX_RETRIES", 2)))
+
+    categorize_max_side: int = field(default_factory=lambda: int(os.getenv("CATEGORIZE_MAX_SIDE", 384)))
+    categorize_quality: int = field(default_factory=lambda: int(os.getenv("CATEGORIZE_QUALITY", 80)))
+    # Пометить системный промпт категоризации cache_control (для провайдеров с явным кэшированием)
+    categorize_prompt_cache_control: bool = field(default_factory=lambda: os.getenv("CATEGORIZE_PROMPT_CACHE_CONTROL", "false").lower() == "true")
+    generate_max_side: int = field(default_factory=lambda: int(os.getenv("GENERATE_MAX_SIDE", 1200)))
+    generate_quality: int = field(default_factory=lambda: int(os.getenv("GENERATE_QUALITY", 85)))
 
 
 @dataclass
@@ -68,6 +132,24 @@ class PixianConfig:
     test_mode: str = field(default_factory=lambda: os.getenv("PIXIAN_TEST_MODE", "false"))
     timeout: int = field(default_factory=lambda: int(os.getenv("PIXIAN_TIMEOUT", 120)))
     target_size: str = field(default_factory=lambda: os.getenv("PIXIAN_TARGET_SIZE", "1800  2400"))
+    preprocess: bool = field(default_factory=lambda: os.getenv("PIXIAN_PREPROCESS", "true").lower() == "true")
+    upload_quality: int = field(default_factory=lambda: int(os.getenv("PIXIAN_UPLOAD_QUALITY", 95)))
+
+
+@dataclass
+class WebhookConfig:
+    """Конфигурация webhook-уведомлений о завершении задач"""
+    secret: str = field(default_factory=lambda: os.getenv("WEBHOOK_SECRET", ""))
+    timeout: int = field(default_factory=lambda: int(os.getenv("WEBHOOK_TIMEOUT", 10)))
+    max_attempts: int = field(default_factory=lambda: int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5)))
+    backoff_seconds: float = field(default_factory=lambda: float(os.getenv("WEBHOOK_BACKOFF_SECONDS", 2)))
+    max_backoff_seconds: float = field(default_factory=lambda: float(os.getenv("WEBHOOK_MAX_BACKOFF_SECONDS", 60)))
+    # Пусто — любые хосты с публичными адресами; хосты из списка разрешены и с внутренними адресами
+    allowed_hosts: Set[str] = field(default_factory=lambda: {
+        host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+    })
+    # Схема и хост API для ссылки на скачивание результата в теле webhook (пусто — без ссылки)
+    public_base_url: str = field(default_factory=lambda: os.getenv("PUBLIC_BASE_URL", ""))
 
 
 @dataclass
@@ -77,6 +159,7 @@ class Config:
     app: AppConfig = field(default_factory=AppConfig)
     openai: OpenAIConfig = field(default_factory=OpenAIConfig)
     pixian: PixianConfig = field(default_factory=PixianConfig)
+    webhook: WebhookConfig = field(default_factory=WebhookConfig)
     
     sql_debug: bool = field(default_factory=lambda: os.getenv("SQL_DEBUG", "false").lower() == "true")
 
@@ -1,23 +1,84 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import contextmanager, asynccontextmanager
+from typing import Generator, AsyncGenerator, Optional
 import logging
+import threading
 from core.config import config
 
 logger = logging.getLogger(__name__)
 
-engine = create_engine(
-    config.database.url,
-    echo=config.sql_debug,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,  
-    pool_recycle=3600,   
-)
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Синхронный движок (psycopg2) для скриптов и задач, выполняемых в потоках.
+    Создаётся при первом обращении, а не при импорте: импорт модуля не требует
+    DATABASE_URL, а в режиме preload-then-fork пул создаётся уже в воркере.
+    """
+    global _engine, _session_factory
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = create_engine(
+                    config.database.require_url(),
+                    echo=config.sql_debug,
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_pre_ping=True,
+                    pool_recycle=3600,
+                )
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Асинхронный движок (asyncpg) для эндпоинтов и фоновых задач (создаётся при первом обращении)"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    make_url(config.database.require_url()).set(drivername="postgresql+asyncpg"),
+                    echo=config.sql_debug,
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_pre_ping=True,
+                    pool_recycle=3600,
+                )
+                _async_session_factory = async_sessionmaker(
+                    bind=_async_engine,
+                    autoflush=False,
+                    expire_on_commit=False,
+                )
+    return _async_engine
+
+
+def SessionLocal() -> Session:
+    get_engine()
+    return _session_factory()
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_session_factory()
+
+
+async def dispose_engines() -> None:
+    """Закрыть пулы соединений, если движки создавались"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @contextmanager
 def get_db() -> Generator[Session, None, None]:
@@ -44,8 +105,62 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+@contextmanager
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    Контекстный менеджер для операций только на чтение: без commit,
+    транзакция откатывается при закрытии сессии.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Асинхронный контекстный менеджер для работы с БД.
+    
+    Пример:
+        async with get_async_db() as db:
+            result = await db.execute(select(User).where(User.username == "admin"))
+    """
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Unexpected error: {e}")
+        raise
+    finally:
+        await db.close()
+
+
+@asynccontextmanager
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Асинхронный контекстный менеджер только для чтения (без commit)"""
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        await db.close()
+
+
 def init_db():
     """Создание таблиц"""
     from .models import Base
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
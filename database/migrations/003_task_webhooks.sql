@@ -0,0 +1,19 @@
+-- URL для уведомления о завершении задачи
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS callback_url TEXT;
+
+-- Журнал попыток доставки webhook (без внешнего ключа: задача удаляется после скачивания)
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    id BIGSERIAL PRIMARY KEY,
+    task_id VARCHAR(36) NOT NULL,
+    url TEXT NOT NULL,
+    event VARCHAR(50) NOT NULL,
+    attempt INTEGER NOT NULL,
+    status_code INTEGER,
+    error TEXT,
+    duration_ms INTEGER NOT NULL,
+    delivered BOOLEAN NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_task_id ON webhook_deliveries(task_id);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_created_at ON webhook_deliveries(created_at);
@@ -0,0 +1,16 @@
+-- Профили запросов, снятые по запросу администратора (X-Profile: 1)
+CREATE TABLE IF NOT EXISTS request_profiles (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id UUID NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    path TEXT NOT NULL,
+    task_id VARCHAR(36),
+    status_code INTEGER,
+    duration_ms INTEGER NOT NULL,
+    speedscope BYTEA NOT NULL,
+    collapsed TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_request_profiles_task_id ON request_profiles(task_id);
+CREATE INDEX IF NOT EXISTS idx_request_profiles_created_at ON request_profiles(created_at);
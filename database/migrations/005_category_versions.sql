@@ -0,0 +1,29 @@
+-- Версия справочника тематических категорий: воркеры держат снимок категорий
+-- в памяти и перечитывают его при изменении версии
+CREATE TABLE IF NOT EXISTS category_versions (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO category_versions (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+-- Любое изменение thematic_categories увеличивает версию и уведомляет воркеры
+CREATE OR REPLACE FUNCTION bump_category_version() RETURNS TRIGGER AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE category_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE id = 1
+    RETURNING version INTO new_version;
+
+    PERFORM pg_notify('category_changes', new_version::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_thematic_categories_version ON thematic_categories;
+CREATE TRIGGER trg_thematic_categories_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON thematic_categories
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_category_version();
@@ -0,0 +1,62 @@
+-- Категории, которые были только в промпте категоризации, но не в справочнике.
+-- Промпт теперь строится из thematic_categories, поэтому они переносятся в БД
+INSERT INTO thematic_categories (main_category, subcategory, description) VALUES
+-- GARDEN
+('GARDEN', 'FURNITURE', 'Садовая мебель, шезлонги, качели'),
+('GARDEN', 'TOOLS', 'Садовый инвентарь, лопаты, секаторы, шланги'),
+('GARDEN', 'DECOR', 'Садовые фигуры, кашпо, декор для участка'),
+('GARDEN', 'PLANTS', 'Растения, семена, горшки, грунт'),
+('GARDEN', 'LIGHTING', 'Садовые фонари, гирлянды, светильники на солнечных батареях'),
+('GARDEN', 'STORAGE', 'Ящики, контейнеры и стеллажи для участка'),
+
+-- CONSTRUCTION_REPAIR
+('CONSTRUCTION_REPAIR', 'TOOLS', 'Ручной и электроинструмент'),
+('CONSTRUCTION_REPAIR', 'CONSTRUCTION_CHEMICALS', 'Герметики, пены, грунтовки, пропитки'),
+('CONSTRUCTION_REPAIR', 'LADDERS', 'Лестницы, стремянки, подмости'),
+('CONSTRUCTION_REPAIR', 'HANDLES_LOCKS_FITTINGS', 'Дверные ручки, замки, фурнитура'),
+('CONSTRUCTION_REPAIR', 'TOOL_CONSUMABLES', 'Диски, свёрла, биты, пилки'),
+('CONSTRUCTION_REPAIR', 'RADIATORS_CONVECTOR', 'Радиаторы отопления, конвекторы'),
+('CONSTRUCTION_REPAIR', 'BUILDING_MIXTURES', 'Цемент, штукатурка, шпаклёвка, сухие смеси'),
+('CONSTRUCTION_REPAIR', 'GLUE', 'Клей строительный и универсальный'),
+('CONSTRUCTION_REPAIR', 'VENTILATION', 'Вентиляторы, решётки, воздуховоды'),
+('CONSTRUCTION_REPAIR', 'WORKPLACE_ORGANIZATION', 'Ящики для инструментов, верстаки, органайзеры'),
+('CONSTRUCTION_REPAIR', 'SANITARY_ENGINEERING', 'Сантехника: унитазы, раковины, инсталляции'),
+('CONSTRUCTION_REPAIR', 'SANITARY_HARDWARE_ACCESSORIES', 'Сифоны, гибкие подводки, комплектующие для сантехники'),
+('CONSTRUCTION_REPAIR', 'HOUSEHOLD_LIGHTING', 'Бытовые светильники, прожекторы'),
+('CONSTRUCTION_REPAIR', 'WATER_SUPPLY_ENGINEERING_PLUMBING', 'Трубы, фитинги, краны, водоснабжение'),
+('CONSTRUCTION_REPAIR', 'CERAMICWARE_BATHS', 'Ванны, поддоны, керамическая сантехника'),
+('CONSTRUCTION_REPAIR', 'ACCESS_HATCH', 'Ревизионные люки'),
+('CONSTRUCTION_REPAIR', 'BULB', 'Лампы накаливания, светодиодные лампы'),
+('CONSTRUCTION_REPAIR', 'WELDING_EQUIPMENT', 'Сварочные аппараты и расходники'),
+('CONSTRUCTION_REPAIR', 'DRAINAGE_SYSTEMS', 'Водосточные и дренажные системы'),
+('CONSTRUCTION_REPAIR', 'MEASURING_TOOLS', 'Рулетки, уровни, дальномеры'),
+('CONSTRUCTION_REPAIR', 'ELECTRICAL_INSTALLATION', 'Розетки, выключатели, электроустановочные изделия'),
+('CONSTRUCTION_REPAIR', 'FASTENERS_FITTINGS', 'Крепёж: саморезы, дюбели, анкеры'),
+('CONSTRUCTION_REPAIR', 'INSTRUMENT_EQUIPMENT', 'Строительное оборудование, компрессоры, генераторы'),
+('CONSTRUCTION_REPAIR', 'ADHESIVE_TAPES', 'Клейкие ленты, скотч, малярная лента'),
+('CONSTRUCTION_REPAIR', 'ELECTRICS', 'Кабели, удлинители, автоматы'),
+('CONSTRUCTION_REPAIR', 'PNEUMOTOOL_EQUIPMENT', 'Пневмоинструмент и оборудование'),
+('CONSTRUCTION_REPAIR', 'WALLPAPERS_COVERINGS', 'Обои, настенные и напольные покрытия'),
+('CONSTRUCTION_REPAIR', 'SAFETY_FIRE_PROTECTION', 'Средства защиты, огнетушители, пожарная безопасность'),
+('CONSTRUCTION_REPAIR', 'MIXERS_SHOWER_SYSTEMS', 'Смесители, душевые системы'),
+('CONSTRUCTION_REPAIR', 'INSULATION_MATERIALS', 'Тепло-, звуко- и гидроизоляция'),
+
+-- SPORT_OUTDOOR
+('SPORT_OUTDOOR', 'POOL', 'Бассейны и аксессуары к ним'),
+('SPORT_OUTDOOR', 'INFLATABLE_FURNITURE', 'Надувные матрасы, кресла, круги'),
+('SPORT_OUTDOOR', 'CAMP_FURNITURE', 'Туристическая мебель, складные стулья и столы'),
+('SPORT_OUTDOOR', 'TENTS_CANOPIES_SLEEPING_BAGS', 'Палатки, тенты, спальные мешки'),
+('SPORT_OUTDOOR', 'TOURIST_DISHWARE', 'Туристическая посуда, термосы'),
+
+-- BEAUTY_HYGIENE
+('BEAUTY_HYGIENE', 'BODY_FACE_HAIR_CARE', 'Уход за телом, лицом и волосами'),
+('BEAUTY_HYGIENE', 'COSMETICS', 'Декоративная косметика'),
+('BEAUTY_HYGIENE', 'MAKEUP_TOOLS', 'Кисти, спонжи, инструменты для макияжа'),
+('BEAUTY_HYGIENE', 'COSMETICS_ACCESSORIES', 'Косметички, зеркала, органайзеры для косметики'),
+('BEAUTY_HYGIENE', 'HAIR_ACCESSORIES', 'Расчёски, заколки, резинки для волос'),
+
+-- AUTO
+('AUTO', 'CAR_CLEANING_PRODUCTS', 'Автохимия и средства для мойки автомобиля'),
+('AUTO', 'CAR_ACCESSORIES', 'Автоаксессуары, органайзеры, держатели')
+
+ON CONFLICT (main_category, subcategory) DO NOTHING;
@@ -0,0 +1,15 @@
+-- Результаты генерации интерьеров с перцептивным хэшем входного изображения:
+-- для почти совпадающего фото результат переиспользуется без обращения к Gemini
+CREATE TABLE IF NOT EXISTS interior_generations (
+    id BIGSERIAL PRIMARY KEY,
+    dhash BIGINT NOT NULL,
+    color INTEGER NOT NULL,
+    scene_index INTEGER NOT NULL,
+    main_category VARCHAR(50),
+    subcategory VARCHAR(255),
+    use_custom_prompt BOOLEAN NOT NULL DEFAULT FALSE,
+    result_data BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_interior_generations_created_at ON interior_generations(created_at);
@@ -0,0 +1,18 @@
+-- Библиотека сгенерированных изображений по артикулу (шестизначный код из имени файла):
+-- одна актуальная запись на артикул, тип обработки и сцену
+CREATE TABLE IF NOT EXISTS generated_assets (
+    id BIGSERIAL PRIMARY KEY,
+    sku VARCHAR(6) NOT NULL,
+    processing_type VARCHAR(20) NOT NULL,
+    scene_index INTEGER NOT NULL DEFAULT 0,
+    suffix VARCHAR(100) NOT NULL,
+    content_type VARCHAR(50) NOT NULL,
+    source_filename TEXT,
+    main_category VARCHAR(50),
+    subcategory VARCHAR(255),
+    size_bytes INTEGER NOT NULL,
+    result_data BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT uq_generated_assets_key UNIQUE (sku, processing_type, scene_index)
+);
@@ -0,0 +1,34 @@
+-- Параметры обработки и heartbeat задачи: задачу, воркер которой перестал отмечаться,
+-- подхватывает другой воркер и продолжает с необработанных файлов
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS reuse_assets BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS scenes INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS worker_id VARCHAR(100);
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS resume_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE tasks SET heartbeat_at = start_time WHERE heartbeat_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_tasks_heartbeat_at ON tasks(heartbeat_at) WHERE status IN ('pending', 'processing');
+
+-- Файлы задачи: вход (хранится, пока файл не обработан успешно) и итог обработки
+CREATE TABLE IF NOT EXISTS task_files (
+    task_id VARCHAR(36) NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    file_index INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    error TEXT,
+    input_data BYTEA,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (task_id, file_index)
+);
+
+-- Результаты обработки файла (несколько — при генерации нескольких сцен)
+CREATE TABLE IF NOT EXISTS task_file_results (
+    task_id VARCHAR(36) NOT NULL,
+    file_index INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    result_data BYTEA NOT NULL,
+    PRIMARY KEY (task_id, file_index, position),
+    FOREIGN KEY (task_id, file_index) REFERENCES task_files(task_id, file_index) ON DELETE CASCADE
+);
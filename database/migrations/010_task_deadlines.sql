@@ -0,0 +1,3 @@
+-- Дедлайн задачи: после него оставшиеся файлы не обрабатываются, а запросы
+-- к внешним сервисам прерываются (в том числе после продолжения на другом воркере)
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS deadline_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,5 @@
+-- Время задачи хранится с часовым поясом, как и остальные отметки времени:
+-- asyncpg не передаёт datetime с часовым поясом в колонку TIMESTAMP
+ALTER TABLE tasks
+    ALTER COLUMN start_time TYPE TIMESTAMP WITH TIME ZONE USING start_time AT TIME ZONE 'UTC',
+    ALTER COLUMN end_time TYPE TIMESTAMP WITH TIME ZONE USING end_time AT TIME ZONE 'UTC';
@@ -0,0 +1,6 @@
+-- Время последнего запуска периодических работ: очистку выполняет один воркер
+-- кластера за интервал, остальные её пропускают
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    job VARCHAR(50) PRIMARY KEY,
+    last_run_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
@@ -0,0 +1,8 @@
+-- Белый фон зависит от конкретной фотографии, а не только от артикула: у артикула
+-- может быть несколько фото, поэтому ключ включает SHA-256 исходного файла.
+-- Для сцен интерьера хэш пустой — сцены общие для артикула
+ALTER TABLE generated_assets ADD COLUMN IF NOT EXISTS source_hash VARCHAR(64) NOT NULL DEFAULT '';
+
+ALTER TABLE generated_assets DROP CONSTRAINT IF EXISTS uq_generated_assets_key;
+ALTER TABLE generated_assets
+    ADD CONSTRAINT uq_generated_assets_key UNIQUE (sku, processing_type, scene_index, source_hash);
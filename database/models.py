@@ -1,9 +1,10 @@
 """
 SQLAlchemy модели для БД
 """
-from sqlalchemy import Column, String, Boolean, Integer, DateTime, Text, LargeBinary
+from sqlalchemy import Column, String, Boolean, Integer, BigInteger, DateTime, Text, LargeBinary, UniqueConstraint, ForeignKey, ForeignKeyConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 from datetime import datetime, timezone
 import uuid
 
@@ -19,8 +20,8 @@ class User(Base):
     is_admin = Column(Boolean, default=False, nullable=False)
     rate_limit = Column(Integer, default=100, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False, index=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    last_used = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_used = Column(DateTime(timezone=True), nullable=True)
     
     def to_dict(self) -> dict:
         """Преобразует в словарь"""
@@ -45,10 +46,21 @@ class Task(Base):
     progress = Column(Integer, default=0, nullable=False)
     processed_files = Column(Integer, default=0, nullable=False)
     total_files = Column(Integer, nullable=False)
-    start_time = Column(DateTime, nullable=False)
-    end_time = Column(DateTime, nullable=True, index=True)
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=True, index=True)
     error = Column(Text, nullable=True)
-    result_data = Column(LargeBinary, nullable=True)
+    callback_url = Column(Text, nullable=True)
+    reuse_assets = Column(Boolean, default=False, nullable=False)
+    scenes = Column(Integer, default=1, nullable=False)
+    # Воркер, обрабатывающий задачу, и его последняя отметка: задачу с устаревшей
+    # отметкой подхватывает другой воркер
+    worker_id = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    resume_count = Column(Integer, default=0, nullable=False)
+    # После дедлайна оставшиеся файлы задачи не обрабатываются
+    deadline_at = Column(DateTime(timezone=True), nullable=True)
+    # Архив результата загружается только явно (TaskRepository.get_result)
+    result_data = deferred(Column(LargeBinary, nullable=True))
     
     def to_dict(self) -> dict:
         """Преобразует в словарь"""
@@ -61,10 +73,109 @@ class Task(Base):
             "start_time": self.start_time,
             "end_time": self.end_time,
             "error": self.error,
+            "callback_url": self.callback_url,
+            "reuse_assets": self.reuse_assets,
+            "scenes": self.scenes,
+            "resume_count": self.resume_count,
+            "deadline_at": self.deadline_at,
             "result": None 
         }
 
 
+class TaskFile(Base):
+    """Файл задачи: вход и итог обработки (чекпоинт для продолжения задачи)"""
+    __tablename__ = "task_files"
+    
+    task_id = Column(String(36), ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    file_index = Column(Integer, primary_key=True)
+    filename = Column(Text, nullable=False)
+    # pending, completed, failed
+    status = Column(String(20), default="pending", nullable=False)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Вход удаляется после успешной обработки, для ошибок — хранится до retry-failed
+    input_data = deferred(Column(LargeBinary, nullable=True))
+
+
+class TaskFileResult(Base):
+    """Результат обработки файла задачи"""
+    __tablename__ = "task_file_results"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["task_id", "file_index"],
+            ["task_files.task_id", "task_files.file_index"],
+            ondelete="CASCADE",
+        ),
+    )
+    
+    task_id = Column(String(36), primary_key=True)
+    file_index = Column(Integer, primary_key=True)
+    position = Column(Integer, primary_key=True)
+    filename = Column(Text, nullable=False)
+    result_data = Column(LargeBinary, nullable=False)
+
+
+class WebhookDelivery(Base):
+    """Журнал попыток доставки webhook"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    task_id = Column(String(36), nullable=False, index=True)
+    url = Column(Text, nullable=False)
+    event = Column(String(50), nullable=False)
+    attempt = Column(Integer, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    duration_ms = Column(Integer, nullable=False)
+    delivered = Column(Boolean, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    
+    def to_dict(self) -> dict:
+        """Преобразует в словарь"""
+        return {
+            "id": self.id,
+            "task_id": self.task_id,
+            "url": self.url,
+            "event": self.event,
+            "attempt": self.attempt,
+            "status_code": self.status_code,
+            "error": self.error,
+            "duration_ms": self.duration_ms,
+            "delivered": self.delivered,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class RequestProfile(Base):
+    """Профиль запроса, снятый по запросу администратора"""
+    __tablename__ = "request_profiles"
+    
+    id = Column(String(36), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    method = Column(String(10), nullable=False)
+    path = Column(Text, nullable=False)
+    task_id = Column(String(36), nullable=True, index=True)
+    status_code = Column(Integer, nullable=True)
+    duration_ms = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    # Выгрузки профиля читаются только при скачивании
+    speedscope = deferred(Column(LargeBinary, nullable=False))
+    collapsed = deferred(Column(Text, nullable=False))
+    
+    def to_dict(self) -> dict:
+        """Преобразует в словарь (без выгрузок профиля)"""
+        return {
+            "id": self.id,
+            "user_id": str(self.user_id),
+            "method": self.method,
+            "path": self.path,
+            "task_id": self.task_id,
+            "status_code": self.status_code,
+            "duration_ms": self.duration_ms,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
 class ThematicCategory(Base):
     """Модель тематических категорий"""
     __tablename__ = "thematic_categories"
@@ -81,3 +192,80 @@ class ThematicCategory(Base):
             "description": self.description
         }
 
+
+class CategoryVersion(Base):
+    """Версия справочника категорий (одна строка, увеличивается триггером)"""
+    __tablename__ = "category_versions"
+    
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class InteriorGeneration(Base):
+    """Результат генерации интерьера с перцептивным хэшем входного изображения"""
+    __tablename__ = "interior_generations"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    dhash = Column(BigInteger, nullable=False)
+    color = Column(Integer, nullable=False)
+    scene_index = Column(Integer, nullable=False)
+    main_category = Column(String(50), nullable=True)
+    subcategory = Column(String(255), nullable=True)
+    use_custom_prompt = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    # Изображение читается только при совпадении хэша
+    result_data = deferred(Column(LargeBinary, nullable=False))
+
+
+class GeneratedAsset(Base):
+    """Сгенерированное изображение в библиотеке по артикулу"""
+    __tablename__ = "generated_assets"
+    __table_args__ = (
+        UniqueConstraint("sku", "processing_type", "scene_index", "source_hash", name="uq_generated_assets_key"),
+    )
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    sku = Column(String(6), nullable=False)
+    processing_type = Column(String(20), nullable=False)
+    scene_index = Column(Integer, nullable=False, default=0)
+    # SHA-256 исходного файла для белого фона (у артикула может быть несколько фото);
+    # пустой для сцен интерьера, общих для артикула
+    source_hash = Column(String(64), nullable=False, default="")
+    # Окончание имени выходного файла: {имя_входа}_{suffix}.{расширение}
+    suffix = Column(String(100), nullable=False)
+    content_type = Column(String(50), nullable=False)
+    source_filename = Column(Text, nullable=True)
+    main_category = Column(String(50), nullable=True)
+    subcategory = Column(String(255), nullable=True)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Изображение читается только при выдаче
+    result_data = deferred(Column(LargeBinary, nullable=False))
+    
+    def to_dict(self) -> dict:
+        """Преобразует в словарь (без изображения)"""
+        return {
+            "id": self.id,
+            "sku": self.sku,
+            "processing_type": self.processing_type,
+            "scene_index": self.scene_index,
+            "source_hash": self.source_hash,
+            "suffix": self.suffix,
+            "content_type": self.content_type,
+            "source_filename": self.source_filename,
+            "main_category": self.main_category,
+            "subcategory": self.subcategory,
+            "size_bytes": self.size_bytes,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class MaintenanceRun(Base):
+    """Время последнего запуска периодической работы (одна строка на работу)"""
+    __tablename__ = "maintenance_runs"
+    
+    job = Column(String(50), primary_key=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=False)
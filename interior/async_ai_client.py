@@ -1,169 +1,102 @@
 import base64
 import io
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError
 from PIL import Image
 import asyncio
 from interior.config import Config
+from interior.categorization_prompt import get_prompt
+from interior.sku import extract_six_digit_code
+from api.services.category_service import category_service
 from api.logging import CustomLogger
 from core.config import config
+from api.metrics import record_upstream, record_llm_usage
+from api import deadline
+from api.deadline import DeadlineExceeded
 import re
 import csv
+import traceback
 import httpx
 from io import StringIO
 from typing import Optional, Tuple, Dict
 import time
 
 
+def encode_image_url(image_data: bytes) -> str:
+    """Строит data URL для передачи JPEG-изображения в chat completions"""
+    return f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}"
+
+
 class AsyncAIClient:
     """Асинхронный клиент для работы с AI API"""
     
     def __init__(self):
         self.client = AsyncOpenAI(
             api_key=Config.API_KEY,
-            base_url=Config.BASE_URL
+            base_url=Config.BASE_URL,
+            timeout=Config.TIMEOUT,
+            max_retries=Config.MAX_RETRIES
         )
     
-    async def analyze_thematic_subcategory(self, image_data: bytes, logger: CustomLogger) -> Tuple[str, str]:
-        """Асинхронно анализирует тематику товара"""
-        base64_image = base64.b64encode(image_data).decode('utf-8')
+    async def _chat_completion(self, upstream: str, **kwargs):
+        """
+        chat.completions.create с учётом в метриках внешних сервисов.
+        Таймаут попытки и повторы SDK ограничены остатком дедлайна запроса или задачи.
+        """
+        request_timeout = deadline.timeout(Config.TIMEOUT, upstream)
+        started = time.perf_counter()
+        try:
+            async with deadline.limit(upstream):
+                response = await self.client.chat.completions.create(timeout=request_timeout, **kwargs)
+        except (APITimeoutError, TimeoutError) as e:
+            record_upstream(upstream, time.perf_counter() - started, outcome="timeout")
+            if not isinstance(e, DeadlineExceeded) and request_timeout < Config.TIMEOUT:
+                raise DeadlineExceeded(upstream) from e
+            raise
+        except APIConnectionError:
+            record_upstream(upstream, time.perf_counter() - started, outcome="network_error")
+            raise
+        except Exception as e:
+            record_upstream(upstream, time.perf_counter() - started, status_code=getattr(e, "status_code", None) or 500)
+            raise
         
-        system_prompt = """Ты эксперт по категоризации товаров маркетплейса.
-        Твоя задача — определить категорию и подкатегорию товара по фото.
-        Ответ строго в формате: КАТЕГОРИЯ|ПОДКАТЕГОРИЯ
+        record_upstream(upstream, time.perf_counter() - started)
+        record_llm_usage(upstream, getattr(response, "usage", None))
+        return response
+    
+    async def analyze_thematic_subcategory(self, image_url: str, logger: CustomLogger) -> Tuple[str, str]:
+        """Асинхронно анализирует тематику товара (image_url — data URL из encode_image_url)"""
+        prompt = get_prompt(category_service.snapshot)
         
-        Особое правило:
-        - Если изображены праздничные украшения (ёлочные игрушки, новогодние, пасхальные, хэллоуинские предметы и т.п.), 
-          отнеси их к категории HOLIDAY с соответствующей подкатегорией:
-          CHRISTMAS, EASTER, HALLOWEEN, NEW_YEAR, VALENTINE или GENERAL.
-        
-        Остальные доступные категории и подкатегории:
-        KITCHEN - 
-            COOKWARE, 
-            UTENSILS, 
-            APPLIANCES, 
-            STORAGE, 
-            DINNERWARE, 
-            DECOR
-            
-        BATHROOM - 
-            TOWELS, 
-            HYGIENE, 
-            FURNITURE, 
-            STORAGE, 
-            ACCESSORIES, 
-            CLEANING
-
-        LIVING_ROOM - 
-            FURNITURE, 
-            LIGHTING, 
-            DECOR, 
-            TEXTILES, 
-            STORAGE, 
-            ELECTRONICS
-
-        BEDROOM - 
-            BEDDING, 
-            FURNITURE, 
-            LIGHTING, 
-            DECOR, 
-            STORAGE, 
-            TEXTILES
-
-        GARDEN - 
-            FURNITURE, 
-            TOOLS, 
-            DECOR, 
-            PLANTS, 
-            LIGHTING, 
-            STORAGE
-
-        OFFICE - 
-            FURNITURE, 
-            ORGANIZATION, 
-            STATIONERY, 
-            TECH, 
-            DECOR
-
-        HOLIDAY - 
-            CHRISTMAS, 
-            EASTER, 
-            HALLOWEEN, 
-            NEW_YEAR, 
-            VALENTINE, 
-            GENERAL      
-
-        CONSTRUCTION_REPAIR - 
-            TOOLS, 
-            CONSTRUCTION_CHEMICALS, 
-            LADDERS, 
-            HANDLES_LOCKS_FITTINGS, 
-            TOOL_CONSUMABLES, 
-            RADIATORS_CONVECTOR, 
-            BUILDING_MIXTURES, 
-            GLUE, 
-            VENTILATION, 
-            WORKPLACE_ORGANIZATION, 
-            SANITARY_ENGINEERING, 
-            SANITARY_HARDWARE_ACCESSORIES, 
-            HOUSEHOLD_LIGHTING, 
-            WATER_SUPPLY_ENGINEERING_PLUMBING, 
-            CERAMICWARE_BATHS, 
-            ACCESS_HATCH, 
-            BULB, 
-            WELDING_EQUIPMENT, 
-            DRAINAGE_SYSTEMS, 
-            MEASURING_TOOLS, 
-            ELECTRICAL_INSTALLATION, 
-            FASTENERS_FITTINGS, 
-            INSTRUMENT_EQUIPMENT, 
-            ADHESIVE_TAPES, 
-            ELECTRICS, 
-            PNEUMOTOOL_EQUIPMENT, 
-            WALLPAPERS_COVERINGS, 
-            SAFETY_FIRE_PROTECTION, 
-            MIXERS_SHOWER_SYSTEMS, 
-            INSULATION_MATERIALS
-
-        SPORT_OUTDOOR -
-            POOL, 
-            INFLATABLE_FURNITURE, 
-            CAMP_FURNITURE, 
-            TENTS_CANOPIES_SLEEPING_BAGS, 
-            TOURIST_DISHWARE
-
-        BEAUTY_HYGIENE -
-            BODY_FACE_HAIR_CARE, 
-            COSMETICS, 
-            MAKEUP_TOOLS, 
-            COSMETICS_ACCESSORIES, 
-            HAIR_ACCESSORIES
-
-        AUTO -
-            CAR_CLEANING_PRODUCTS, 
-            CAR_ACCESSORIES
-        """
+        # Неизменный системный промпт идёт первым, изображение — последним:
+        # так провайдер может переиспользовать кэш префикса между запросами
+        system_content = prompt.system_prompt
+        if Config.CATEGORIZE_PROMPT_CACHE_CONTROL:
+            system_content = [{"type": "text", "text": prompt.system_prompt, "cache_control": {"type": "ephemeral"}}]
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                "llm_categorize",
                 model=Config.MODEL_NAME,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": system_content},
                     {"role": "user", "content": [
-                        {"type": "text", "text": "Определи категорию и подкатегорию этого товара:"},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        {"type": "image_url", "image_url": {"url": image_url}}
                     ]}
                 ],
             )
             
-            result = response.choices[0].message.content.strip()
-            if "|" in result:
-                return result.split("|")
-            else:
-                logger.warning(f"Неожиданный формат ответа категоризации: {result!r}")
-                return "LIVING_ROOM", "DECOR"
+            result = (response.choices[0].message.content or "").strip()
+            category = prompt.parse(result)
+            if category:
+                return category
+            
+            logger.warning(f"Ответ категоризации вне справочника v{prompt.version}: {result!r}")
+            return "LIVING_ROOM", "DECOR"
                 
+        except DeadlineExceeded:
+            # Без бюджета категория по умолчанию не поможет: генерация всё равно не начнётся
+            raise
         except Exception as e:
-            import traceback
             error_body = ""
             if hasattr(e, "response") and e.response is not None:
                 try:
@@ -178,18 +111,18 @@ class AsyncAIClient:
             traceback.print_exc()
             return "LIVING_ROOM", "DECOR"
     
-    async def edit_image_with_gemini(self, image_data: bytes, prompt: str, logger: CustomLogger) -> Optional[bytes]:
-        """Асинхронно генерирует изображение (совместимость с Gemini 2.5)"""
-        base64_image = base64.b64encode(image_data).decode('utf-8')
+    async def edit_image_with_gemini(self, image_url: str, prompt: str, logger: CustomLogger) -> Optional[bytes]:
+        """Асинхронно генерирует изображение (совместимость с Gemini 2.5), image_url — data URL из encode_image_url"""
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._chat_completion(
+                "llm_generate",
                 model=Config.IMAGE_MODEL,
                 messages=[{
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        {"type": "image_url", "image_url": {"url": image_url}}
                     ]
                 }],
             )
@@ -230,6 +163,8 @@ class AsyncAIClient:
             #print(f"msg.image: {getattr(msg, 'image', 'N/A')}")
             return None
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             import traceback
             # Пытаемся достать тело ошибки от LiteLLM/httpx
@@ -250,13 +185,11 @@ class AsyncAIClient:
 
 SHEET_ID = config.app.sheet_id
 GID = config.app.gid
-
-def extract_six_digit_code(filename: str) -> Optional[str]:
-    m = re.search(r'(?<!\d)(\d{6})(?!\d)', filename)
-    return m.group(1) if m else None
+# Явный URL выгрузки CSV (например, локальная заглушка в бенчмарках) вместо Google Sheets
+SHEET_CSV_URL = config.app.sheet_csv_url
 
 async def get_product_from_sheet_by_code(code: str, logger) -> Optional[Tuple[str, str]]:
-    url = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv&gid={GID}&_cb={int(time.time())}"
+    url = SHEET_CSV_URL or f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv&gid={GID}&_cb={int(time.time())}"
     headers = {
         "Cache-Control": "no-cache, no-store, must-revalidate",
         "Pragma": "no-cache",
@@ -264,9 +197,13 @@ async def get_product_from_sheet_by_code(code: str, logger) -> Optional[Tuple[st
         "User-Agent": "httpx/SheetsFetcher",
     }
 
+    # Таймаут httpx действует на каждую фазу запроса, поэтому весь запрос дополнительно ограничен дедлайном
+    request_timeout = deadline.timeout(20.0, "google_sheets")
+    started = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0), follow_redirects=True) as client:
+        async with deadline.limit("google_sheets"), httpx.AsyncClient(timeout=httpx.Timeout(request_timeout), follow_redirects=True) as client:
             resp = await client.get(url, headers=headers)
+            record_upstream("google_sheets", time.perf_counter() - started, status_code=resp.status_code)
             try:
                 resp.raise_for_status()
             except httpx.HTTPStatusError as e:
@@ -278,13 +215,18 @@ async def get_product_from_sheet_by_code(code: str, logger) -> Optional[Tuple[st
                     f"body_sample={body_sample!r} exc={e!r}"
                 )
                 return None
+    except DeadlineExceeded:
+        record_upstream("google_sheets", time.perf_counter() - started, outcome="timeout")
+        raise
     except httpx.TimeoutException as e:
+        record_upstream("google_sheets", time.perf_counter() - started, outcome="timeout")
         logger.error(
             "Не удалось загрузить Google Sheet: Timeout | "
             f"url={url} exc={e!r}\n{traceback.format_exc()}"
         )
         return None
     except httpx.RequestError as e:
+        record_upstream("google_sheets", time.perf_counter() - started, outcome="network_error")
         # ConnectError, NetworkError и пр. наследуются от RequestError
         req_url = getattr(e.request, "url", url)
         logger.error(
@@ -0,0 +1,85 @@
+"""
+Промпт категоризации, построенный из справочника thematic_categories.
+
+Каждой подкатегории присваивается номер, модель отвечает только номером.
+Промпт строится из снимка категорий и кэшируется, пока снимок не заменён. Он не
+меняется между запросами и идёт первым сообщением, а изображение — последним,
+поэтому у провайдера срабатывает кэширование префикса промпта.
+"""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from api.services.category_service import CategorySnapshot
+
+# Основная категория для праздничного декора (отдельное правило в промпте)
+_HOLIDAY = "HOLIDAY"
+
+_CODE_PATTERN = re.compile(r"\d+")
+
+
+@dataclass(frozen=True)
+class CategorizationPrompt:
+    """Промпт категоризации для определённой версии справочника"""
+    version: int
+    system_prompt: str
+    codes: Dict[int, Tuple[str, str]]
+    
+    def parse(self, answer: str) -> Optional[Tuple[str, str]]:
+        """
+        Разобрать ответ модели: номер подкатегории или, на случай если модель
+        ответила по-старому, "КАТЕГОРИЯ|ПОДКАТЕГОРИЯ". Пара вне справочника — None.
+        """
+        answer = answer.strip()
+        match = _CODE_PATTERN.search(answer)
+        if match:
+            return self.codes.get(int(match.group()))
+        
+        if "|" in answer:
+            main_category, subcategory = (part.strip().upper() for part in answer.split("|", 1))
+            if (main_category, subcategory) in self.codes.values():
+                return main_category, subcategory
+        return None
+
+
+def build_prompt(snapshot: CategorySnapshot) -> CategorizationPrompt:
+    """Построить компактный промпт: категории по строкам, подкатегории с номерами"""
+    codes: Dict[int, Tuple[str, str]] = {}
+    lines = []
+    for main_category in sorted(snapshot.categories):
+        entries = []
+        for subcategory in sorted(snapshot.categories[main_category]):
+            code = len(codes) + 1
+            codes[code] = (main_category, subcategory)
+            entries.append(f"{code} {subcategory}")
+        lines.append(f"{main_category}: {', '.join(entries)}")
+    
+    rules = [
+        "Определи категорию товара маркетплейса по фото.",
+        "Ответь только номером подкатегории из списка, без других слов.",
+    ]
+    if _HOLIDAY in snapshot.categories:
+        rules.append(
+            "Праздничные украшения (ёлочные игрушки, новогодний, пасхальный, хэллоуинский декор) "
+            f"относи к {_HOLIDAY}."
+        )
+    
+    system_prompt = "\n".join(rules) + "\n\n" + "\n".join(lines)
+    return CategorizationPrompt(version=snapshot.version, system_prompt=system_prompt, codes=codes)
+
+
+_cached: Optional[Tuple[CategorySnapshot, CategorizationPrompt]] = None
+_lock = threading.Lock()
+
+
+def get_prompt(snapshot: CategorySnapshot) -> CategorizationPrompt:
+    """Промпт для снимка (перестраивается только при смене снимка)"""
+    global _cached
+    cached = _cached
+    if cached is not None and cached[0] is snapshot:
+        return cached[1]
+    
+    with _lock:
+        if _cached is None or _cached[0] is not snapshot:
+            _cached = (snapshot, build_prompt(snapshot))
+        return _cached[1]
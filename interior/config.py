@@ -1,13 +1,10 @@
 """
 Конфигурация для обработки интерьеров
-Использует новый сервис категорий
+Категории читаются из снимка сервиса категорий в памяти
 """
-from typing import Dict
+from typing import Mapping
 from core.config import config
-from api.services.category_service import CategoryService
-
-# Сервис категорий
-_category_service = CategoryService()
+from api.services.category_service import category_service
 
 
 class Config:
@@ -17,6 +14,15 @@ class Config:
     MODEL_NAME = config.openai.model_name
     IMAGE_MODEL = config.openai.image_model
     BASE_URL = config.openai.base_url
+    TIMEOUT = config.openai.timeout
+    MAX_RETRIES = config.openai.max_retries
+    
+    # Профили входного изображения для каждого этапа AI
+    CATEGORIZE_MAX_SIDE = config.openai.categorize_max_side
+    CATEGORIZE_QUALITY = config.openai.categorize_quality
+    CATEGORIZE_PROMPT_CACHE_CONTROL = config.openai.categorize_prompt_cache_control
+    GENERATE_MAX_SIDE = config.openai.generate_max_side
+    GENERATE_QUALITY = config.openai.generate_quality
     #PORADOCK_LOG_TOKEN_INTERIOR = config.app.log_token
     
     BASE_DIR = config.app.interior_dir
@@ -25,14 +31,14 @@ class Config:
     TEMP_DIR = config.app.interior_dir / "temp"
     
     @classmethod
-    def get_thematic_categories(cls) -> Dict[str, Dict[str, str]]:
-        """Тематические категории - загружаются из БД через сервис"""
-        return _category_service.get_all_categories()
+    def get_thematic_categories(cls) -> Mapping[str, Mapping[str, str]]:
+        """Тематические категории из текущего снимка (загружается при старте приложения)"""
+        return category_service.get_all_categories()
     
     @classmethod
     def reload_categories(cls):
         """Перезагружает категории из БД"""
-        _category_service.reload_cache()
+        category_service.reload_cache()
 
 
 class ThematicCategoriesDescriptor:
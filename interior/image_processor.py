@@ -1,3 +1,4 @@
+import io
 import os
 from PIL import Image, ExifTags
 from .config import Config
@@ -137,6 +138,23 @@ class ImageProcessor:
         resized_image = cropped_image.resize(target_size, resample=Image.LANCZOS)
         return resized_image
 
+    @staticmethod
+    def fit_to_max_side(image, max_side):
+        """Уменьшает изображение так, чтобы длинная сторона не превышала max_side"""
+        width, height = image.size
+        if max(width, height) <= max_side:
+            return image
+        
+        scale = max_side / max(width, height)
+        return image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+
+    @staticmethod
+    def encode_jpeg(image, quality):
+        """Кодирует изображение в JPEG и возвращает bytes"""
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
     def format_image_3_4(self, input_path, output_path, logger):
         """Приводит изображение к формату 3:4 с граничащими цветами"""
         try:
@@ -0,0 +1,106 @@
+"""
+Перцептивный хэш изображений и BK-дерево для поиска по расстоянию Хэмминга
+"""
+from typing import Generic, Iterator, List, Optional, Tuple, TypeVar
+from PIL import Image
+
+T = TypeVar("T")
+
+_HASH_BITS = 64
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    Разностный хэш (dHash): 64 бита, сравнение яркости соседних пикселей
+    уменьшенной до 9x8 копии. Устойчив к масштабу, перекодированию и небольшим
+    сдвигам кадра, но не различает цвет.
+    """
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def average_color(image: Image.Image) -> int:
+    """Средний цвет изображения, упакованный в 0xRRGGBB"""
+    red, green, blue = image.convert("RGB").resize((1, 1), Image.BOX).getpixel((0, 0))
+    return (red << 16) | (green << 8) | blue
+
+
+def color_distance(a: int, b: int) -> int:
+    """Максимальное расхождение по каналам RGB"""
+    return max(abs(((a >> shift) & 0xFF) - ((b >> shift) & 0xFF)) for shift in (16, 8, 0))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_signed(value: int) -> int:
+    """64-битный хэш в диапазоне BIGINT Postgres"""
+    return value - (1 << _HASH_BITS) if value >= 1 << (_HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << _HASH_BITS) if value < 0 else value
+
+
+class _Node(Generic[T]):
+    __slots__ = ("hash", "items", "children")
+    
+    def __init__(self, hash_value: int, item: T):
+        self.hash = hash_value
+        self.items: List[T] = [item]
+        self.children: dict = {}
+
+
+class BKTree(Generic[T]):
+    """BK-дерево по расстоянию Хэмминга: поиск соседей без полного перебора"""
+    
+    def __init__(self):
+        self._root: Optional[_Node[T]] = None
+        self.size = 0
+    
+    def add(self, hash_value: int, item: T) -> None:
+        self.size += 1
+        if self._root is None:
+            self._root = _Node(hash_value, item)
+            return
+        
+        node = self._root
+        while True:
+            distance = hamming(hash_value, node.hash)
+            if distance == 0:
+                node.items.append(item)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(hash_value, item)
+                return
+            node = child
+    
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, T]]:
+        """Все элементы на расстоянии не больше max_distance, ближайшие первыми"""
+        found = list(self._search(hash_value, max_distance))
+        found.sort(key=lambda pair: pair[0])
+        return found
+    
+    def _search(self, hash_value: int, max_distance: int) -> Iterator[Tuple[int, T]]:
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(hash_value, node.hash)
+            if distance <= max_distance:
+                for item in node.items:
+                    yield distance, item
+            # Неравенство треугольника: поддеревья вне [d - r, d + r] не содержат соседей
+            for child_distance, child in node.children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
@@ -0,0 +1,12 @@
+"""
+Артикул товара в имени файла (модуль без тяжёлых зависимостей)
+"""
+import re
+from typing import Optional
+
+_CODE_PATTERN = re.compile(r'(?<!\d)(\d{6})(?!\d)')
+
+
+def extract_six_digit_code(filename: str) -> Optional[str]:
+    m = _CODE_PATTERN.search(filename)
+    return m.group(1) if m else None
@@ -0,0 +1,26 @@
+"""
+Общие фикстуры тестов.
+
+Тесты репозиториев выполняются на реальном PostgreSQL с применёнными миграциями
+(URL — в переменной TEST_DATABASE_URL); без неё они пропускаются.
+"""
+import asyncio
+import os
+import pytest
+from core.config import config
+from database import db_session
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Движки БД, созданные заново для теста и закрытые после него"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL не задан")
+    
+    monkeypatch.setattr(config.database, "url", TEST_DATABASE_URL)
+    for name in ("_engine", "_session_factory", "_async_engine", "_async_session_factory"):
+        monkeypatch.setattr(db_session, name, None)
+    yield
+    asyncio.run(db_session.dispose_engines())
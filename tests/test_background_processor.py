@@ -0,0 +1,201 @@
+"""
+Фоновая обработка на реальном PostgreSQL: отмена и захват задачи другим воркером
+не затираются записями воркера, который её обрабатывал; частично обработанный
+файл сохраняется с готовыми результатами и ошибкой; задача упавшего воркера
+продолжается с необработанных файлов.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+import pytest
+from fastapi import UploadFile
+from core.config import config
+from api.background_processor import BackgroundProcessor, worker_id
+from api.processors import async_white_processor
+from api.processors.async_base import AsyncBaseProcessor, PartialFailure
+from api.repositories import AsyncTaskRepository
+from api.services.task_service import AsyncTaskService
+
+
+class _Processor(AsyncBaseProcessor):
+    """Процессор без внешних сервисов: результат — содержимое входа"""
+    
+    processed: List[str] = []
+    # Файлы, обработанные частично
+    partial: List[str] = []
+    
+    def __init__(self, reuse_assets: bool = False):
+        super().__init__("white", reuse_assets=reuse_assets)
+    
+    async def process_single(self, file: UploadFile) -> Tuple[bytes, str]:
+        _Processor.processed.append(file.filename)
+        return await file.read(), f"out_{file.filename}"
+    
+    async def _process_file(self, file: UploadFile, previous: List[Tuple[str, bytes]]) -> List[Tuple[bytes, str]]:
+        result = await self.process_single(file)
+        if file.filename in _Processor.partial:
+            raise PartialFailure("Scenes 1 failed", [result])
+        return [result]
+
+
+@pytest.fixture
+def task_service(database, monkeypatch):
+    _Processor.processed = []
+    _Processor.partial = []
+    monkeypatch.setattr(async_white_processor, "AsyncWhiteProcessor", _Processor)
+    return AsyncTaskService(task_repo=AsyncTaskRepository())
+
+
+async def _create_task(total_files: int) -> str:
+    async def inputs():
+        for index in range(total_files):
+            yield f"{index}.jpg", f"image {index}".encode()
+    
+    task = await AsyncTaskRepository.create(white_bg=True, total_files=total_files, inputs=inputs())
+    return task.id
+
+
+async def _run(task_service: AsyncTaskService, task_id: str) -> dict:
+    files = await task_service.get_pending_files(task_id)
+    await BackgroundProcessor(task_service)._run(task_id, files, 3, True, None, False, 1)
+    return await task_service.get_task_status(task_id)
+
+
+def test_completes(task_service):
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            status = await _run(task_service, task_id)
+            assert status["status"] == "completed" and status["has_result"]
+            assert _Processor.processed == ["0.jpg", "1.jpg", "2.jpg"]
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+def test_cancel_between_file_outcomes_survives(task_service, monkeypatch):
+    save_file_outcome = task_service.save_file_outcome
+    
+    async def save_then_cancel(task_id, *args, **kwargs):
+        # /cancel приходит после сохранения итога файла, до обновления прогресса
+        saved = await save_file_outcome(task_id, *args, **kwargs)
+        await task_service.cancel_task(task_id)
+        return saved
+    
+    monkeypatch.setattr(task_service, "save_file_outcome", save_then_cancel)
+    
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            status = await _run(task_service, task_id)
+            assert status["status"] == "cancelled"
+            assert status["processed_files"] == 0
+            assert _Processor.processed == ["0.jpg"]
+            # Необработанные файлы остаются для retry-failed, а не для claim_stale
+            assert [filename for _, filename in await task_service.task_file_repo.list_pending(task_id)] == ["1.jpg", "2.jpg"]
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+def test_cancel_before_start_not_lost(task_service):
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            await task_service.cancel_task(task_id)
+            status = await _run(task_service, task_id)
+            assert status["status"] == "cancelled"
+            assert _Processor.processed == []
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+def test_task_owned_by_other_worker_not_processed(task_service):
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            await AsyncTaskRepository.update(task_id, status="processing", worker_id="other:1")
+            status = await _run(task_service, task_id)
+            assert status["status"] == "processing" and status["worker_id"] == "other:1"
+            assert _Processor.processed == []
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+def test_partial_file_outcome_kept_for_retry(task_service):
+    _Processor.partial = ["1.jpg"]
+    
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            status = await _run(task_service, task_id)
+            assert status["status"] == "completed" and status["failed_files"] == 1
+            
+            assert await task_service.reopen_failed_files(task_id) == 1
+            files = await task_service.get_pending_files(task_id)
+            assert [file.filename for _, file in files] == ["1.jpg"]
+            assert await task_service.get_partial_results(task_id, [file_index for file_index, _ in files]) == {
+                1: [("out_1.jpg", b"image 1")]
+            }
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+async def _abandon(task_id: str, processed: int) -> None:
+    """Воркер dead:1 обработал первые processed файлов и перестал отмечаться"""
+    await AsyncTaskRepository.update(
+        task_id, status="processing", worker_id="dead:1",
+        heartbeat_at=datetime.now(timezone.utc) - timedelta(hours=1),
+    )
+    for file_index in range(processed):
+        await AsyncTaskService(task_repo=AsyncTaskRepository()).save_file_outcome(
+            task_id, file_index, "dead:1", [(f"out_{file_index}.jpg", b"done")]
+        )
+
+
+def test_stale_task_resumed_from_pending_files(task_service):
+    async def scenario():
+        task_id = await _create_task(3)
+        try:
+            await _abandon(task_id, 1)
+            assert await AsyncTaskRepository.claim_stale(60, worker_id()) == task_id
+            
+            # Запоздалые записи прежнего воркера после захвата отклоняются
+            assert await AsyncTaskRepository.update(task_id, owner="dead:1", progress=10) is None
+            assert not await task_service.save_file_outcome(task_id, 1, "dead:1", [("late.jpg", b"late")])
+            
+            await BackgroundProcessor(task_service).resume_task(task_id)
+            status = await task_service.get_task_status(task_id)
+            assert status["status"] == "completed" and status["worker_id"] == worker_id()
+            assert _Processor.processed == ["1.jpg", "2.jpg"]
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
+
+
+def test_resume_limit_fails_task(task_service, monkeypatch):
+    monkeypatch.setattr(config.app, "task_max_resumes", 0)
+    
+    async def scenario():
+        task_id = await _create_task(2)
+        try:
+            await _abandon(task_id, 0)
+            assert await AsyncTaskRepository.claim_stale(60, worker_id()) == task_id
+            await BackgroundProcessor(task_service).resume_task(task_id)
+            
+            status = await task_service.get_task_status(task_id)
+            assert status["status"] == "failed" and "retry-failed" in status["error"]
+            assert _Processor.processed == []
+        finally:
+            await AsyncTaskRepository.delete(task_id)
+    
+    asyncio.run(scenario())
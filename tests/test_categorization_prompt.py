@@ -0,0 +1,38 @@
+"""
+Разбор ответа модели категоризации.
+"""
+from api.services.category_service import CategorySnapshot
+from interior.categorization_prompt import build_prompt, get_prompt
+
+_SNAPSHOT = CategorySnapshot.build(3, {
+    "KITCHEN": {"MUGS": "Кружки", "PLATES": "Тарелки"},
+    "HOLIDAY": {"ORNAMENTS": "Ёлочные игрушки"},
+})
+
+
+def test_numeric_code():
+    prompt = build_prompt(_SNAPSHOT)
+    assert prompt.version == 3
+    for code, pair in prompt.codes.items():
+        assert f"{code} {pair[1]}" in prompt.system_prompt
+        assert prompt.parse(f" {code}\n") == pair
+        assert prompt.parse(f"Ответ: {code}.") == pair
+
+
+def test_legacy_pair():
+    prompt = build_prompt(_SNAPSHOT)
+    assert prompt.parse("KITCHEN|MUGS") == ("KITCHEN", "MUGS")
+    assert prompt.parse(" kitchen | plates ") == ("KITCHEN", "PLATES")
+
+
+def test_answer_outside_taxonomy():
+    prompt = build_prompt(_SNAPSHOT)
+    assert prompt.parse(str(len(prompt.codes) + 1)) is None
+    assert prompt.parse("KITCHEN|ORNAMENTS") is None
+    assert prompt.parse("GARDEN|MUGS") is None
+    assert prompt.parse("не знаю") is None
+
+
+def test_prompt_cached_per_snapshot():
+    assert get_prompt(_SNAPSHOT) is get_prompt(_SNAPSHOT)
+    assert get_prompt(CategorySnapshot.build(4, {"KITCHEN": {"MUGS": "Кружки"}})).version == 4
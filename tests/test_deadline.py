@@ -0,0 +1,94 @@
+"""
+Дедлайны: вложенные бюджеты, прерывание ожидания и импорт приложения.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from api import deadline
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_no_deadline():
+    assert deadline.remaining() is None
+    assert deadline.timeout(5.0) == 5.0
+    deadline.check()
+
+
+def test_budget_nesting_keeps_earlier_deadline():
+    with deadline.budget(10):
+        with deadline.budget(100):
+            assert deadline.remaining() <= 10
+        with deadline.budget(1):
+            assert deadline.remaining() <= 1
+        with deadline.budget(None):
+            assert deadline.remaining() <= 10
+        assert 1 < deadline.remaining() <= 10
+    assert deadline.remaining() is None
+
+
+def test_budget_without_inherit_replaces_outer():
+    with deadline.budget(1):
+        with deadline.budget(100, inherit=False):
+            assert deadline.remaining() > 1
+        with deadline.budget(None, inherit=False):
+            assert deadline.remaining() is None
+        assert deadline.remaining() <= 1
+
+
+def test_exhausted_budget():
+    with deadline.budget(0):
+        with pytest.raises(deadline.DeadlineExceeded) as error:
+            deadline.check("upload")
+        assert error.value.stage == "upload"
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.timeout(5.0)
+
+
+def test_timeout_capped_by_budget():
+    with deadline.budget(2):
+        assert deadline.timeout(30.0) <= 2
+        assert deadline.timeout(0.5) == 0.5
+
+
+def test_limit_raises_when_budget_expires():
+    async def scenario():
+        with deadline.budget(0.05):
+            async with deadline.limit("request"):
+                await asyncio.sleep(1)
+    
+    with pytest.raises(deadline.DeadlineExceeded) as error:
+        asyncio.run(scenario())
+    assert error.value.stage == "request"
+
+
+def test_limit_keeps_own_timeout():
+    async def scenario():
+        with deadline.budget(10):
+            async with deadline.limit("request"):
+                await asyncio.wait_for(asyncio.sleep(1), 0.01)
+    
+    with pytest.raises(TimeoutError) as error:
+        asyncio.run(scenario())
+    assert not isinstance(error.value, deadline.DeadlineExceeded)
+
+
+def test_limit_without_deadline():
+    async def scenario():
+        async with deadline.limit("request"):
+            await asyncio.sleep(0)
+        return True
+    
+    assert asyncio.run(scenario())
+
+
+def test_app_imports_without_database_url():
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import api.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
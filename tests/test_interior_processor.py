@@ -0,0 +1,90 @@
+"""
+Интерьер с несколькими сценами: частичный сбой генерации и повтор только
+недостающих сцен.
+"""
+import asyncio
+import io
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from core.config import config
+from interior.config import Config
+from api.logging import CustomLogger
+from api.processors.async_interior_processor import (
+    AsyncInteriorProcessor, ScenesFailed, _Category, _PreparedInput,
+)
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr(Config, "API_KEY", "test")
+    monkeypatch.setattr(config.app, "interior_dedup_enabled", False)
+    processor = AsyncInteriorProcessor(scenes=3)
+    processor.failing = {1}
+    processor.generated = []
+    
+    async def prepare_input(file):
+        return _PreparedInput(image=Image.new("RGB", (30, 40)), generate_image_url="data:")
+    
+    async def categorize(filename, code, image, logger):
+        return _Category(main_category="KITCHEN", subcategory="MUGS")
+    
+    async def generate_scene(prepared, category, scene_index, logger):
+        processor.generated.append(scene_index)
+        if scene_index in processor.failing:
+            raise Exception(f"Image generation failed for scene_index={scene_index}")
+        return f"scene {scene_index}".encode()
+    
+    monkeypatch.setattr(processor, "_prepare_input", prepare_input)
+    monkeypatch.setattr(processor, "_categorize", categorize)
+    monkeypatch.setattr(processor, "_generate_scene", generate_scene)
+    return processor
+
+
+def _upload() -> UploadFile:
+    return UploadFile(file=io.BytesIO(b"image"), filename="photo.jpg")
+
+
+def _process(processor, previous=None):
+    outcomes = []
+    
+    async def on_progress(progress, current, total, filename=None, error=None, outputs=None):
+        outcomes.append((error, outputs))
+    
+    processor.set_progress_callback(on_progress)
+    asyncio.run(processor.process_files([_upload()], CustomLogger("interior"), previous))
+    return outcomes[0]
+
+
+def test_partial_failure_reported_with_ready_scenes(processor):
+    error, outputs = _process(processor)
+    assert error.startswith("Scenes 1 failed")
+    assert [filename for filename, _ in outputs] == ["photo_in_kitchen_scene0.jpg", "photo_in_kitchen_scene2.jpg"]
+
+
+def test_retry_generates_only_missing_scenes(processor):
+    _, outputs = _process(processor)
+    processor.failing, processor.generated = set(), []
+    
+    error, outputs = _process(processor, [outputs])
+    assert error is None
+    assert processor.generated == [1]
+    assert outputs == [
+        ("photo_in_kitchen_scene0.jpg", b"scene 0"),
+        ("photo_in_kitchen_scene1.jpg", b"scene 1"),
+        ("photo_in_kitchen_scene2.jpg", b"scene 2"),
+    ]
+
+
+def test_process_scenes_raises_with_failed_indices(processor):
+    with pytest.raises(ScenesFailed) as error:
+        asyncio.run(processor.process_scenes(_upload(), [0, 1]))
+    assert error.value.failed == [1]
+    assert [scene_index for scene_index, _, _ in error.value.outputs] == [0]
+
+
+def test_all_scenes_failed(processor):
+    processor.failing = {0, 1, 2}
+    error, outputs = _process(processor)
+    assert error == "Image generation failed for scene_index=0"
+    assert outputs == []
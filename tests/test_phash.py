@@ -0,0 +1,91 @@
+"""
+Перцептивный хэш, BK-дерево и индекс генераций интерьеров.
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+from PIL import Image
+from core.config import config
+from api.services.generation_index import Fingerprint, GenerationIndex
+from interior.phash import BKTree, dhash, hamming, to_signed, to_unsigned
+
+
+def test_signed_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        signed = to_signed(value)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert to_unsigned(signed) == value
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(42)
+    base = [rng.getrandbits(64) for _ in range(20)]
+    # Кластеры близких хэшей и точные повторы, как у перевыгрузок одного кадра
+    hashes = [value ^ (1 << rng.randrange(64)) for value in base for _ in range(10)] + base + base[:5]
+    
+    tree: BKTree[int] = BKTree()
+    for index, value in enumerate(hashes):
+        tree.add(value, index)
+    assert tree.size == len(hashes)
+    
+    for query in base[:10] + [rng.getrandbits(64) for _ in range(10)]:
+        for max_distance in (0, 1, 3, 8, 32):
+            expected = sorted(
+                (hamming(query, value), index)
+                for index, value in enumerate(hashes)
+                if hamming(query, value) <= max_distance
+            )
+            found = tree.search(query, max_distance)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_dhash_stable_under_resize():
+    image = Image.linear_gradient("L").rotate(30).convert("RGB")
+    resized = image.resize((120, 90)).resize((256, 256))
+    assert hamming(dhash(image), dhash(resized)) <= 4
+
+
+class _GenerationRepo:
+    """Таблица interior_generations в памяти"""
+    
+    def __init__(self):
+        self.rows = {}
+    
+    async def add(self, dhash, color, scene_index, result_data, main_category, subcategory, use_custom_prompt):
+        generation_id = len(self.rows) + 1
+        self.rows[generation_id] = SimpleNamespace(
+            id=generation_id, dhash=dhash, color=color, scene_index=scene_index, result_data=result_data,
+            main_category=main_category, subcategory=subcategory, use_custom_prompt=use_custom_prompt,
+        )
+        return generation_id
+    
+    async def list_since(self, last_id):
+        return [(row.id, row.dhash, row.color, row.scene_index) for row in self.rows.values() if row.id > last_id]
+    
+    async def get(self, generation_id):
+        return self.rows.get(generation_id)
+
+
+def test_generation_index_reuses_near_duplicate(monkeypatch):
+    monkeypatch.setattr(config.app, "interior_dedup_max_distance", 4)
+    monkeypatch.setattr(config.app, "interior_dedup_color_tolerance", 24)
+    
+    async def scenario():
+        repo = _GenerationRepo()
+        index = GenerationIndex(generation_repo=repo)
+        fingerprint = Fingerprint(dhash=(1 << 63) | 0b1011, color=0x808080)
+        await index.add(fingerprint, scene_index=0, result_data=b"scene")
+        
+        near = Fingerprint(dhash=fingerprint.dhash ^ 1, color=0x818080)
+        reused = await index.find(near, scene_index=0)
+        assert reused.result_data == b"scene" and reused.distance == 1
+        assert await index.find(near, scene_index=1) is None
+        assert await index.find(Fingerprint(dhash=fingerprint.dhash, color=0x000000), scene_index=0) is None
+        
+        # Запись, удалённая очисткой, больше не предлагается
+        del repo.rows[reused.id]
+        assert await index.find(near, scene_index=0) is None
+        assert index.size == 0
+    
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+"""
+Репозитории на реальном PostgreSQL: отметки времени с часовым поясом через asyncpg,
+захват задачи воркером, запуск очистки раз в интервал и его освобождение при сбое.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import delete
+from api.repositories import TaskRepository, AsyncTaskRepository, AsyncUserRepository
+from api.services.task_service import TaskService
+from database.db_session import get_db
+from database.models import MaintenanceRun
+
+
+def test_task_insert_and_update(database):
+    async def scenario():
+        task = await AsyncTaskRepository.create(white_bg=True, total_files=1)
+        try:
+            stored = await AsyncTaskRepository.get_by_id(task.id)
+            assert stored.start_time.tzinfo is not None
+            
+            failed = await AsyncTaskRepository.set_error(task.id, "boom")
+            assert failed.status == "failed"
+            assert failed.end_time >= stored.start_time
+        finally:
+            await AsyncTaskRepository.delete(task.id)
+    
+    asyncio.run(scenario())
+
+
+def test_user_last_used_flush(database):
+    async def scenario():
+        user = await AsyncUserRepository.create(f"test-{uuid.uuid4()}")
+        try:
+            used_at = datetime.now(timezone.utc)
+            await AsyncUserRepository.update_last_used_bulk({user.id: used_at})
+            assert (await AsyncUserRepository.get_by_id(user.id)).last_used == used_at
+        finally:
+            await AsyncUserRepository.delete(user.id)
+    
+    asyncio.run(scenario())
+
+
+def test_cleanup_claimed_once_per_interval(database):
+    with get_db() as db:
+        db.execute(delete(MaintenanceRun))
+    try:
+        assert TaskRepository.claim_cleanup(1)
+        assert not TaskRepository.claim_cleanup(1)
+        assert TaskRepository.claim_cleanup(0)
+    finally:
+        with get_db() as db:
+            db.execute(delete(MaintenanceRun))
+
+
+def test_cleanup_released_after_failure(database):
+    class FailingRepository(TaskRepository):
+        @staticmethod
+        def cleanup_old(max_age_hours: int = 24, batch_size: int = 500) -> dict:
+            raise RuntimeError("connection lost")
+    
+    with get_db() as db:
+        db.execute(delete(MaintenanceRun))
+    try:
+        with pytest.raises(RuntimeError):
+            TaskService(task_repo=FailingRepository()).cleanup_old_tasks(interval_hours=1)
+        # Интервал не израсходован: очистку выполнит следующая проверка
+        assert TaskService(task_repo=TaskRepository()).cleanup_old_tasks(interval_hours=1) is not None
+        
+        # Освобождение не снимает запуск, занятый позже другим воркером
+        claimed_at = TaskRepository.claim_cleanup(0)
+        assert not TaskRepository.release_cleanup(claimed_at - timedelta(seconds=1))
+        assert not TaskRepository.claim_cleanup(1)
+    finally:
+        with get_db() as db:
+            db.execute(delete(MaintenanceRun))
+
+
+def test_task_claimed_by_one_worker(database):
+    async def scenario():
+        task = await AsyncTaskRepository.create(white_bg=True, total_files=1)
+        try:
+            assert await AsyncTaskRepository.update(task.id, owner="a", status="processing", worker_id="a")
+            assert await AsyncTaskRepository.update(task.id, owner="b", status="processing", worker_id="b") is None
+            assert (await AsyncTaskRepository.get_by_id(task.id)).worker_id == "a"
+            
+            # Отменённую задачу воркер больше не обновляет
+            assert await AsyncTaskRepository.cancel(task.id)
+            assert await AsyncTaskRepository.update(task.id, owner="a", status="processing") is None
+            assert (await AsyncTaskRepository.get_by_id(task.id)).status == "cancelled"
+        finally:
+            await AsyncTaskRepository.delete(task.id)
+    
+    asyncio.run(scenario())
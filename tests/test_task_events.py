@@ -0,0 +1,168 @@
+"""
+Шина событий задач на реальном PostgreSQL: доставка через LISTEN/NOTIFY только
+подписчикам задачи, дополнительные каналы, переподключение слушателя и поток
+событий задачи до финального статуса.
+"""
+import asyncio
+import json
+import uuid
+from typing import List, Optional
+from core.config import config
+from api.handlers import task_handler
+from api.handlers.task_handler import TaskHandler
+from api.repositories import AsyncTaskRepository
+from api.services import task_events
+from api.services.task_events import TaskEventBus
+from api.services.task_service import AsyncTaskService
+
+
+class _Bus:
+    """Шина на отдельном канале с отметкой каждого (пере)подключения"""
+    
+    def __init__(self):
+        self.bus = TaskEventBus(channel=f"test_events_{uuid.uuid4().hex}")
+        self.extra_channel = f"{self.bus.channel}_extra"
+        self.extra: List[Optional[str]] = []
+        self._connected = asyncio.Event()
+        self.bus.add_channel_listener(self.extra_channel, self._on_extra)
+    
+    def _on_extra(self, payload: Optional[str]) -> None:
+        self.extra.append(payload)
+        if payload is None:
+            self._connected.set()
+    
+    async def connected(self) -> None:
+        await asyncio.wait_for(self._connected.wait(), 10)
+        self._connected.clear()
+
+
+async def _get(queue: asyncio.Queue) -> dict:
+    return await asyncio.wait_for(queue.get(), 5)
+
+
+def test_event_delivered_to_task_subscribers(database):
+    async def scenario():
+        listener = _Bus()
+        bus = listener.bus
+        bus.start()
+        try:
+            await listener.connected()
+            with bus.subscribe("task-a") as queue, bus.subscribe("task-a") as second, bus.subscribe("task-b") as other:
+                await bus.publish("task-a", "file", {"filename": "1.jpg", "processed_files": 1})
+                event = await _get(queue)
+                assert event == {"task_id": "task-a", "event": "file", "data": {"filename": "1.jpg", "processed_files": 1}}
+                assert await _get(second) == event
+                await asyncio.sleep(0.1)
+                assert other.empty()
+            assert bus._subscribers == {}
+        finally:
+            await bus.stop()
+    
+    asyncio.run(scenario())
+
+
+def test_channel_listener_receives_payload(database):
+    async def scenario():
+        listener = _Bus()
+        listener.bus.start()
+        try:
+            await listener.connected()
+            await TaskEventBus.notify(listener.extra_channel, "task-a")
+            for _ in range(50):
+                if "task-a" in listener.extra:
+                    break
+                await asyncio.sleep(0.1)
+            assert listener.extra == [None, "task-a"]
+        finally:
+            await listener.bus.stop()
+    
+    asyncio.run(scenario())
+
+
+def test_listener_reconnects(database, monkeypatch):
+    monkeypatch.setattr(task_events, "_RECONNECT_DELAY_SECONDS", 0)
+    monkeypatch.setattr(config.app, "task_events_heartbeat_seconds", 0.05)
+    
+    async def scenario():
+        listener = _Bus()
+        bus = listener.bus
+        bus.start()
+        try:
+            await listener.connected()
+            bus._connection.terminate()
+            # Слушатели каналов узнают о переподключении: уведомления могли быть пропущены
+            await listener.connected()
+            assert listener.extra == [None, None]
+            
+            with bus.subscribe("task-a") as queue:
+                await bus.publish("task-a", "status", {"status": "processing"})
+                assert (await _get(queue))["data"] == {"status": "processing"}
+        finally:
+            await bus.stop()
+    
+    asyncio.run(scenario())
+
+
+def test_oversized_payload_drops_text_fields(monkeypatch):
+    payloads = []
+    
+    async def notify(channel, payload):
+        payloads.append(payload)
+    
+    bus = TaskEventBus(channel="test")
+    monkeypatch.setattr(bus, "notify", notify)
+    asyncio.run(bus.publish("task-a", "file", {"error": "x" * 10000, "processed_files": 3}))
+    assert json.loads(payloads[0])["data"] == {"processed_files": 3}
+
+
+def test_slow_subscriber_keeps_latest_events():
+    async def scenario():
+        bus = TaskEventBus(channel="test")
+        with bus.subscribe("task-a") as queue:
+            for index in range(task_events._QUEUE_SIZE + 5):
+                bus._dispatch(None, 0, "test", json.dumps({"task_id": "task-a", "event": "file", "data": {"index": index}}))
+            bus._dispatch(None, 0, "test", "not json")
+            
+            assert queue.qsize() == task_events._QUEUE_SIZE
+            assert queue.get_nowait()["data"] == {"index": 5}
+    
+    asyncio.run(scenario())
+
+
+def test_stream_ends_on_final_status(database, monkeypatch):
+    async def scenario():
+        listener = _Bus()
+        bus = listener.bus
+        monkeypatch.setattr(task_handler, "task_event_bus", bus)
+        bus.start()
+        task = await AsyncTaskRepository.create(white_bg=True, total_files=2)
+        try:
+            await listener.connected()
+            events = TaskHandler(AsyncTaskService(task_repo=AsyncTaskRepository())).stream_task_events(task.id)
+            snapshot = await events.__anext__()
+            assert snapshot["event"] == "status" and snapshot["data"]["status"] == "pending"
+            
+            await bus.publish(task.id, "file", {"filename": "0.jpg", "processed_files": 1})
+            await bus.publish(task.id, "status", {"status": "completed", "progress": 100})
+            assert [event async for event in events] == [
+                {"task_id": task.id, "event": "file", "data": {"filename": "0.jpg", "processed_files": 1}},
+                {"task_id": task.id, "event": "status", "data": {"status": "completed", "progress": 100}},
+            ]
+        finally:
+            await AsyncTaskRepository.delete(task.id)
+            await bus.stop()
+    
+    asyncio.run(scenario())
+
+
+def test_stream_of_finished_task_is_snapshot_only(database):
+    async def scenario():
+        task = await AsyncTaskRepository.create(white_bg=True, total_files=1)
+        try:
+            await AsyncTaskRepository.set_error(task.id, "boom")
+            events = TaskHandler(AsyncTaskService(task_repo=AsyncTaskRepository())).stream_task_events(task.id)
+            assert [event["data"]["status"] async for event in events] == ["failed"]
+        finally:
+            await AsyncTaskRepository.delete(task.id)
+    
+    asyncio.run(scenario())
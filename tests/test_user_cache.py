@@ -0,0 +1,47 @@
+"""
+Кэш аутентификации: сброс записи во время проверки пользователя.
+"""
+import uuid
+from api.services.user_cache import UserCache
+
+
+def test_set_and_invalidate():
+    cache = UserCache(ttl_seconds=60)
+    user_id = uuid.uuid4()
+    assert cache.get(user_id) == (False, None)
+    
+    cache.set(user_id, {"id": str(user_id)}, cache.generation(user_id))
+    assert cache.get(user_id) == (True, {"id": str(user_id)})
+    
+    cache.invalidate(user_id)
+    assert cache.get(user_id) == (False, None)
+
+
+def test_stale_lookup_not_cached_after_invalidate():
+    cache = UserCache(ttl_seconds=60)
+    user_id, other_id = uuid.uuid4(), uuid.uuid4()
+    
+    # Проверка началась до деактивации пользователя, а завершилась после
+    generation = cache.generation(user_id)
+    other_generation = cache.generation(other_id)
+    cache.invalidate(user_id)
+    cache.set(user_id, {"is_active": True}, generation)
+    assert cache.get(user_id) == (False, None)
+    
+    # Сброс одной записи не мешает кэшировать другие
+    cache.set(other_id, {"is_active": True}, other_generation)
+    assert cache.get(other_id)[0]
+    
+    # Новая проверка после сброса кэшируется
+    cache.set(user_id, None, cache.generation(user_id))
+    assert cache.get(user_id) == (True, None)
+
+
+def test_stale_lookup_not_cached_after_clear():
+    cache = UserCache(ttl_seconds=60)
+    user_id = uuid.uuid4()
+    
+    generation = cache.generation(user_id)
+    cache.invalidate()
+    cache.set(user_id, {"is_active": True}, generation)
+    assert cache.get(user_id) == (False, None)
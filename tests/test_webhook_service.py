@@ -0,0 +1,195 @@
+"""
+Доставка webhook на локальный HTTP-приёмник: подпись, повторы с задержкой,
+журнал попыток, отказ во внутренних адресах и соединение с проверенным адресом.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+import pytest
+from sqlalchemy import delete
+from core.config import config
+from api.logging import CustomLogger
+from api.repositories import AsyncWebhookDeliveryRepository
+from api.services import webhook_service
+from api.services.webhook_service import WebhookService, validate_callback_url
+from database.db_session import get_async_db
+from database.models import WebhookDelivery
+
+
+class _Receiver:
+    """HTTP-сервер на 127.0.0.1, отвечающий кодами из очереди (по умолчанию 200)"""
+    
+    def __init__(self):
+        self.requests: List[tuple] = []
+        self.responses: List[int] = []
+        receiver = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.responses.pop(0) if receiver.responses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class _DeliveryLog:
+    """Журнал попыток в памяти"""
+    
+    def __init__(self):
+        self.attempts: List[dict] = []
+    
+    async def log_attempt(self, **attempt):
+        self.attempts.append(attempt)
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    monkeypatch.setattr(config.webhook, "allowed_hosts", ["127.0.0.1"])
+    monkeypatch.setattr(config.webhook, "secret", "")
+    monkeypatch.setattr(config.webhook, "max_attempts", 3)
+    monkeypatch.setattr(config.webhook, "backoff_seconds", 0)
+    monkeypatch.setattr(config.webhook, "timeout", 5)
+    receiver = _Receiver()
+    yield receiver
+    receiver.server.shutdown()
+    receiver.server.server_close()
+
+
+def _deliver(url: str, delivery_log=None) -> bool:
+    service = WebhookService(delivery_log or _DeliveryLog())
+    payload = WebhookService.build_payload("task-1", "completed")
+    return asyncio.run(service.deliver("task-1", url, payload, CustomLogger("webhook")))
+
+
+def test_signature_over_timestamp_and_body(receiver, monkeypatch):
+    monkeypatch.setattr(config.webhook, "secret", "s3cret")
+    assert _deliver(receiver.url)
+    
+    headers, body = receiver.requests[0]
+    message = f"{headers['X-Webhook-Timestamp']}.".encode() + body
+    expected = "sha256=" + hmac.new(b"s3cret", message, hashlib.sha256).hexdigest()
+    assert headers["X-Webhook-Signature"] == expected
+    assert json.loads(body)["event"] == "task.completed"
+
+
+def test_unsigned_without_secret(receiver):
+    assert _deliver(receiver.url)
+    assert "X-Webhook-Signature" not in receiver.requests[0][0]
+
+
+def test_retryable_status_retried(receiver):
+    receiver.responses = [503, 429]
+    delivery_log = _DeliveryLog()
+    assert _deliver(receiver.url, delivery_log)
+    
+    assert [headers["X-Webhook-Attempt"] for headers, _ in receiver.requests] == ["1", "2", "3"]
+    assert [(a["attempt"], a["status_code"], a["delivered"]) for a in delivery_log.attempts] == [
+        (1, 503, False), (2, 429, False), (3, 200, True),
+    ]
+
+
+def test_gives_up_after_max_attempts(receiver):
+    receiver.responses = [500, 500, 500, 500]
+    delivery_log = _DeliveryLog()
+    assert not _deliver(receiver.url, delivery_log)
+    assert len(receiver.requests) == 3
+    assert delivery_log.attempts[-1]["error"] == "HTTP 500"
+
+
+def test_client_error_not_retried(receiver):
+    receiver.responses = [400]
+    assert not _deliver(receiver.url)
+    assert len(receiver.requests) == 1
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(config.webhook, "backoff_seconds", 2)
+    monkeypatch.setattr(config.webhook, "max_backoff_seconds", 5)
+    assert 1 <= WebhookService._backoff(1) <= 2
+    assert 2 <= WebhookService._backoff(2) <= 4
+    assert 2.5 <= WebhookService._backoff(5) <= 5
+
+
+def test_internal_addresses_rejected(receiver, monkeypatch):
+    monkeypatch.setattr(config.webhook, "allowed_hosts", [])
+    delivery_log = _DeliveryLog()
+    assert not _deliver(receiver.url, delivery_log)
+    assert receiver.requests == []
+    assert "non-public" in delivery_log.attempts[0]["error"]
+    
+    for url in (
+        "http://10.0.0.1/hook",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/hook",
+        "http://[::ffff:127.0.0.1]/hook",
+        "ftp://example.com/hook",
+        "/relative",
+    ):
+        with pytest.raises(ValueError):
+            asyncio.run(validate_callback_url(url))
+
+
+def test_host_outside_allowlist_rejected(receiver):
+    with pytest.raises(ValueError):
+        asyncio.run(validate_callback_url(f"http://localhost:{receiver.port}/hook"))
+
+
+def test_connects_to_validated_address(receiver, monkeypatch):
+    monkeypatch.setattr(config.webhook, "allowed_hosts", [])
+    resolved = []
+    
+    async def resolve(hostname, port):
+        resolved.append(hostname)
+        return ["127.0.0.1"]
+    
+    # Адрес приёмника считается публичным; имя hooks.example системный DNS не знает,
+    # поэтому доставка возможна только на адрес, прошедший проверку
+    monkeypatch.setattr(webhook_service, "_resolve", resolve)
+    monkeypatch.setattr(webhook_service, "_is_public_address", lambda address: True)
+    
+    assert _deliver(f"http://hooks.example:{receiver.port}/hook")
+    assert resolved == ["hooks.example"]
+    assert receiver.requests[0][0]["Host"] == f"hooks.example:{receiver.port}"
+
+
+def test_pinned_https_keeps_hostname_for_tls():
+    assert webhook_service._pin_address("https://user@hooks.example:8443/hook?a=1", "2001:db8::1") == (
+        "https://user@[2001:db8::1]:8443/hook?a=1",
+        "hooks.example:8443",
+        {"sni_hostname": "hooks.example"},
+    )
+
+
+def test_attempts_logged(database, receiver):
+    receiver.responses = [502]
+    task_id = str(uuid.uuid4())
+    service = WebhookService(AsyncWebhookDeliveryRepository())
+    
+    async def scenario():
+        try:
+            payload = WebhookService.build_payload(task_id, "failed", error="boom")
+            assert await service.deliver(task_id, receiver.url, payload, CustomLogger("webhook"))
+            deliveries = await AsyncWebhookDeliveryRepository.get_by_task(task_id)
+            assert [(d.attempt, d.status_code, d.delivered, d.event) for d in deliveries] == [
+                (1, 502, False, "task.failed"), (2, 200, True, "task.failed"),
+            ]
+            assert deliveries[0].error == "HTTP 502" and deliveries[1].error is None
+        finally:
+            async with get_async_db() as db:
+                await db.execute(delete(WebhookDelivery).where(WebhookDelivery.task_id == task_id))
+    
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+"""
+Белый фон из библиотеки на реальном PostgreSQL: несколько фото одного артикула
+не подменяют друг друга, повтор того же файла отдаётся без Pixian.
+"""
+import asyncio
+import io
+import pytest
+from fastapi import UploadFile
+from white.config import Config
+from api.processors.async_white_processor import AsyncWhiteProcessor
+from api.repositories import AsyncAssetRepository
+
+_SKU = "987650"
+
+
+@pytest.fixture
+def processor(database, monkeypatch):
+    monkeypatch.setattr(Config, "PIXIAN_API_USER", "test")
+    monkeypatch.setattr(Config, "PIXIAN_API_KEY", "test")
+    monkeypatch.setattr(Config, "PREPROCESS", False)
+    processor = AsyncWhiteProcessor(reuse_assets=True)
+    processor.uploaded = []
+    
+    async def remove_background(image_data, logger, content_type="image/jpeg"):
+        processor.uploaded.append(image_data)
+        return True, b"cut " + image_data, None
+    
+    monkeypatch.setattr(processor.pixian_client, "remove_background", remove_background)
+    return processor
+
+
+async def _process(processor, filename: str, content: bytes) -> bytes:
+    upload = UploadFile(file=io.BytesIO(content), filename=filename)
+    data, _ = await processor.process_single(upload)
+    return data
+
+
+def test_photos_of_one_sku_kept_apart(processor):
+    async def scenario():
+        try:
+            assert await _process(processor, f"{_SKU}_1.jpg", b"front") == b"cut front"
+            assert await _process(processor, f"{_SKU}_2.jpg", b"side") == b"cut side"
+            
+            # Повтор фото отдаётся из библиотеки, второе фото не затёрло первое
+            assert await _process(processor, f"{_SKU}_1.jpg", b"front") == b"cut front"
+            assert processor.uploaded == [b"front", b"side"]
+            
+            assets = await AsyncAssetRepository.list_by_sku(_SKU, "white")
+            assert sorted(asset.source_filename for asset in assets) == [f"{_SKU}_1.jpg", f"{_SKU}_2.jpg"]
+        finally:
+            await AsyncAssetRepository.delete_by_sku(_SKU)
+    
+    asyncio.run(scenario())
+
+
+def test_changed_photo_not_served_from_library(processor):
+    async def scenario():
+        try:
+            await _process(processor, f"{_SKU}.jpg", b"old")
+            assert await _process(processor, f"{_SKU}.jpg", b"new") == b"cut new"
+            assert processor.uploaded == [b"old", b"new"]
+        finally:
+            await AsyncAssetRepository.delete_by_sku(_SKU)
+    
+    asyncio.run(scenario())
@@ -1,8 +1,12 @@
 import aiohttp
 import asyncio
+import time
 from typing import Optional, Tuple
 from white.config import Config
 from api.logging import CustomLogger
+from api.metrics import record_upstream
+from api import deadline
+from api.deadline import DeadlineExceeded
 
 class AsyncPixianClient:
     """Асинхронный клиент для Pixian.AI API"""
@@ -13,32 +17,45 @@ class AsyncPixianClient:
             login=Config.PIXIAN_API_USER,
             password=Config.PIXIAN_API_KEY
         )
-        self.timeout = aiohttp.ClientTimeout(total=Config.TIMEOUT)
     
-    async def remove_background(self, image_data: bytes, logger: CustomLogger) -> Tuple[bool, Optional[bytes], Optional[str]]:
+    async def remove_background(
+        self,
+        image_data: bytes,
+        logger: CustomLogger,
+        content_type: str = "image/jpeg"
+    ) -> Tuple[bool, Optional[bytes], Optional[str]]:
         """
         Асинхронно удаляет фон изображения
         
         Args:
             image_data: Данные изображения в bytes
             logger: Логгер для записи сообщений
+            content_type: MIME-тип передаваемого изображения
             
         Returns:
             tuple: (success, image_data, error_message)
+        
+        Raises:
+            DeadlineExceeded: дедлайн запроса или задачи истёк до ответа Pixian
         """
+        # Общий таймаут Pixian, но не дольше остатка дедлайна
+        request_timeout = deadline.timeout(Config.TIMEOUT, "pixian")
+        started = time.perf_counter()
         try:
             form_data = aiohttp.FormData()
-            form_data.add_field('image', image_data, filename='image.jpg', content_type='image/jpeg')
+            filename = 'image.png' if content_type == 'image/png' else 'image.jpg'
+            form_data.add_field('image', image_data, filename=filename, content_type=content_type)
             form_data.add_field('background.color', Config.BACKGROUND_COLOR)
             form_data.add_field('result.target_size', Config.TARGET_SIZE)
             form_data.add_field('test', Config.TEST_MODE)
             
-            async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=request_timeout)) as session:
                 async with session.post(
                     self.api_url,
                     data=form_data,
                     auth=self.auth
                 ) as response:
+                    record_upstream("pixian", time.perf_counter() - started, status_code=response.status)
                     
                     if response.status == 200:
                         processed_data = await response.read()
@@ -47,9 +64,13 @@ class AsyncPixianClient:
                         error_text = await response.text()
                         return False, None, f"HTTP {response.status}: {error_text}"
                         
-        except asyncio.TimeoutError:
+        except asyncio.TimeoutError as e:
+            record_upstream("pixian", time.perf_counter() - started, outcome="timeout")
+            if request_timeout < Config.TIMEOUT:
+                raise DeadlineExceeded("pixian") from e
             return False, None, "Request timeout"
         except aiohttp.ClientError as e:
+            record_upstream("pixian", time.perf_counter() - started, outcome="network_error")
             return False, None, f"Client error: {str(e)}"
         except Exception as e:
             return False, None, f"Unexpected error: {str(e)}"
\ No newline at end of file
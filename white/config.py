@@ -21,6 +21,8 @@ class Config:
     TEST_MODE = config.pixian.test_mode
     TIMEOUT = config.pixian.timeout
     TARGET_SIZE = config.pixian.target_size
+    PREPROCESS = config.pixian.preprocess
+    UPLOAD_QUALITY = config.pixian.upload_quality
     
     @classmethod
     def validate_config(cls):
@@ -0,0 +1,69 @@
+import io
+from typing import Tuple
+from PIL import Image, ImageOps, ExifTags
+
+
+class ImagePreprocessor:
+    """Подготовка изображения перед отправкой в Pixian"""
+
+    @staticmethod
+    def parse_target_size(target_size: str) -> Tuple[int, int]:
+        """Разбирает строку вида "1800 2400" в (ширина, высота)"""
+        width, height = target_size.split()
+        return int(width), int(height)
+
+    @staticmethod
+    def prepare_for_upload(image_data: bytes, target_size: str, quality: int = 95) -> Tuple[bytes, str]:
+        """
+        Применяет EXIF-ориентацию, удаляет метаданные, уменьшает изображение
+        и перекодирует его перед загрузкой.
+
+        Pixian вписывает результат в result.target_size, поэтому изображение
+        уменьшается до размера, вписанного в target_size: больше пикселей
+        результат всё равно не использует. Изображения с прозрачностью
+        сохраняются в PNG, остальные — в JPEG.
+
+        Returns:
+            tuple: (image_data, content_type)
+        """
+        target_width, target_height = ImagePreprocessor.parse_target_size(target_size)
+
+        with Image.open(io.BytesIO(image_data)) as img:
+            source_format = img.format
+            rotated = img.getexif().get(ExifTags.Base.Orientation, 1) != 1
+            oriented = ImageOps.exif_transpose(img)
+
+            width, height = oriented.size
+            scale = min(target_width / width, target_height / height)
+            resized = scale < 1
+            if resized:
+                oriented = oriented.resize(
+                    (max(1, round(width * scale)), max(1, round(height * scale))),
+                    Image.LANCZOS
+                )
+
+            has_alpha = oriented.mode in ("RGBA", "LA", "PA") or (
+                oriented.mode == "P" and "transparency" in oriented.info
+            )
+            icc_profile = img.info.get("icc_profile")
+
+            buffer = io.BytesIO()
+            if has_alpha:
+                if oriented.mode != "RGBA":
+                    oriented = oriented.convert("RGBA")
+                oriented.save(buffer, format="PNG", icc_profile=icc_profile, compress_level=3)
+                content_type = "image/png"
+            else:
+                if oriented.mode != "RGB":
+                    oriented = oriented.convert("RGB")
+                oriented.save(buffer, format="JPEG", quality=quality, icc_profile=icc_profile)
+                content_type = "image/jpeg"
+
+        prepared = buffer.getvalue()
+
+        # Без поворота и ресайза перекодирование не даёт выигрыша,
+        # если файл получился больше исходного — отправляем оригинал
+        if not rotated and not resized and len(prepared) >= len(image_data):
+            return image_data, Image.MIME.get(source_format, content_type)
+
+        return prepared, content_type